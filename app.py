@@ -1,226 +1,788 @@
-from flask import Flask, Response, render_template, request, jsonify, send_file
-import cv2
-import numpy as np
-import yaml
+import time
+# Startup is timed from here, before anything heavy is imported
+STARTED = time.monotonic()
+
+from flask import Flask, Response, render_template, request, jsonify, send_file, g
 import os
 import subprocess
 from datetime import datetime
 import threading
-import time
 import zipfile
 import io
 import shutil
-from PIL import Image
+import signal
+import jpeg_writer
+import retention
+import storage
+import uploader
+import continuous
+import timelapse
+import clip_export
+import events
+import recorders
+import configuration
+import cameras
+import live_stream
+import governor
+import change_detection
+import proxies
+import tracing
+
+# Load configuration, validated and with defaults filled in
+config = configuration.load()
+
+# Set DEBUG_MODE to True for testing without Picamera2, it picks the
+# synthetic camera unless camera.backend says otherwise
+DEBUG_MODE = config['debug_mode']
+
+# Initialize Flask app
+app = Flask(__name__)
 
-# Load configuration
-def load_config():
+# Resolution presets
+resolution_presets = configuration.resolution_presets(config)
+
+# File types kept in the media folders
+PICTURE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.h264', '.txt')
+
+# Media folders, keyed by media kind
+PICTURES_DIR = config['paths']['pictures']
+VIDEOS_DIR = config['paths']['videos']
+PROXIES_DIR = config['paths']['proxies']
+MEDIA_ROOTS = {'pictures': PICTURES_DIR, 'videos': VIDEOS_DIR}
+
+def make_camera(camera_config, is_default):
+    """
+    Builds the state of one configured camera.
+
+    The default camera keeps its media directly in the media folders, other
+    cameras get a subfolder named after them, e.g. pictures/usb/2025/01/31.
+    """
+    name = camera_config['name']
+    cam = {
+        'name': name,
+        'config': camera_config,
+        # Camera backend (see cameras.py), created in the background once the server is up
+        'backend': None,
+        # Current camera settings
+        'settings': dict(resolution_presets[camera_config['resolution']]),
+        # Video recording state
+        'recording': {
+            'is_recording': False,
+            'output_path': None,
+        },
+        'roots': dict(MEDIA_ROOTS) if is_default else
+                 {kind: os.path.join(root, name) for kind, root in MEDIA_ROOTS.items()},
+        'ready': threading.Event(),
+        'status': 'pending',
+        'error': None,
+    }
+    cam['stream'] = live_stream.LiveStream(name, lambda: cam['backend'].frame_view(),
+                                           lambda: config['stream']['jpeg_quality'])
+    return cam
+
+# Configured cameras by name, in config order, the first one is the default
+cams = {}
+for number, camera_config in enumerate(config['cameras']):
+    cams[camera_config['name']] = make_camera(camera_config, number == 0)
+DEFAULT_CAMERA = config['cameras'][0]['name']
+
+def folder_name(cam, kind):
+    """Returns the retention folder of a camera's media, e.g. 'pictures' or 'pictures:usb'."""
+    return kind if cam['name'] == DEFAULT_CAMERA else f"{kind}:{cam['name']}"
+
+def camera_of(kind, filepath):
+    """Returns the camera whose media folder holds filepath."""
+    path = os.path.abspath(filepath)
+    found = cams[DEFAULT_CAMERA]
+    for cam in cams.values():
+        root = os.path.abspath(cam['roots'][kind])
+        if path.startswith(root + os.sep) and len(root) > len(os.path.abspath(found['roots'][kind])):
+            found = cam
+    return found
+
+def encoder_camera(cam):
+    """Returns the Picamera2 instance if the backend has a hardware encoder, else None."""
+    return cam['backend'].picam2 if cam['backend'].has_encoder else None
+
+def camera_busy(cam):
+    """True while a continuous recording or timelapse runs on the camera."""
+    return any(mode.is_active() and mode.state['camera'] == cam['name'] for mode in (continuous, timelapse))
+
+# Burst capture limits
+MAX_BURST_FRAMES = 100
+MIN_BURST_FPS = 0.5
+MAX_BURST_FPS = 30
+# A burst holds its request thread for count / fps seconds
+MAX_BURST_SECONDS = 30
+# Upper bound for raw frames held in memory during one burst
+MAX_BURST_BYTES = 256 * 1024 * 1024
+
+# Filepaths handed out but not yet written to disk
+reserved_filepaths = set()
+reserved_filepaths_lock = threading.Lock()
+
+def reserve_filepath(directory, stem, extension):
+    """
+    Returns a filepath in directory that is not used by an existing file or
+    by another pending capture, appending a sequence number if needed.
+
+    Call release_filepath() once the file has been written.
+    """
+    with reserved_filepaths_lock:
+        filepath = os.path.join(directory, f'{stem}{extension}')
+        sequence = 1
+        while filepath in reserved_filepaths or os.path.exists(filepath):
+            filepath = os.path.join(directory, f'{stem}_{sequence}{extension}')
+            sequence += 1
+        reserved_filepaths.add(filepath)
+        return filepath
+
+def release_filepath(filepath):
+    with reserved_filepaths_lock:
+        reserved_filepaths.discard(filepath)
+
+def capture_frame(cam, label=None):
+    """
+    Grabs the current frame of the camera's running video pipeline as a BGR array.
+    """
+    return cam['backend'].capture_frame(label)
+
+def capture_still(cam, label=None):
+    """
+    Grabs a full quality still frame as a BGR array, returning to the live
+    stream configuration afterwards.
+    """
+    if camera_busy(cam):
+        # Switching modes would interrupt the running encoder or timelapse
+        return capture_frame(cam, label)
+    return cam['backend'].capture_still(label)
+
+def media_info(filepath):
+    stat = os.stat(filepath)
+    return {
+        'filename': os.path.basename(filepath),
+        'size': stat.st_size,
+        'created': datetime.fromtimestamp(stat.st_ctime).isoformat()
+    }
+
+def media_added(kind, filepath):
+    """Called whenever a finished picture or video lands in its folder."""
+    cam = camera_of(kind, filepath)
+    retention.add_file(folder_name(cam, kind), filepath)
+    # The remote key keeps the camera subfolder
+    uploader.enqueue(kind, filepath, MEDIA_ROOTS[kind])
+    if kind == 'videos':
+        proxies.enqueue(filepath)
+    events.publish('media-added', {'kind': kind, 'camera': cam['name'], **media_info(filepath)})
+
+def media_removed(kind, filepath):
+    """Called whenever a picture or video is deleted."""
+    cam = camera_of(kind, filepath)
+    retention.remove_file(folder_name(cam, kind), filepath)
+    if kind == 'videos':
+        proxies.remove(filepath)
+    events.publish('media-deleted', {'kind': kind, 'camera': cam['name'],
+                                     'filename': os.path.basename(filepath)})
+
+def media_evicted(folder, filepath):
+    media_removed(folder.partition(':')[0], filepath)
+
+def media_busy(filepath):
+    """Files retention limits leave alone until they are uploaded and transcoded."""
+    return uploader.is_pending(filepath) or proxies.is_pending(filepath)
+
+def recordings_changed():
+    """Holds proxy transcoding while any camera records, so encoders get the CPU."""
+    proxies.set_paused(any(cam['recording']['is_recording'] for cam in cams.values())
+                       or continuous.is_active() or timelapse.is_active())
+
+def recording_started(cam, filepath, mode='clip'):
+    cam['recording']['is_recording'] = True
+    cam['recording']['output_path'] = filepath
+    recordings_changed()
+    events.publish('recording-started', {'mode': mode, 'camera': cam['name'],
+                                         'filename': os.path.basename(filepath)})
+
+def recording_finished(cam, mode='clip'):
+    if not cam['recording']['is_recording']:
+        return
+    filename = os.path.basename(cam['recording']['output_path'])
+    cam['recording']['is_recording'] = False
+    cam['recording']['output_path'] = None
+    recordings_changed()
+    events.publish('recording-finished', {'mode': mode, 'camera': cam['name'], 'filename': filename})
+
+def picture_saved(filepath, error):
+    release_filepath(filepath)
+    if error is None:
+        media_added('pictures', filepath)
+
+def picture_traced(trace, filepath, error):
+    trace.mark('written')
+    if error is not None:
+        trace.fields['outcome'] = 'error'
+        trace.fields['error'] = str(error)
     try:
-        with open('config.yml', 'r') as file:
-            return yaml.safe_load(file)
-    except FileNotFoundError:
-        return {'name': 'mintcam'}  # Default fallback
+        picture_saved(filepath, error)
+    finally:
+        trace.release()
+
+def picture_written(cam_name, reference, trace, filepath, error):
+    """JPEG writer callback of /take_picture."""
+    if error is None and reference is not None:
+        # Only a picture that reached the disk is compared against next time
+        change_detection.commit(cam_name, *reference)
+    if trace is not None:
+        picture_traced(trace, filepath, error)
+    else:
+        picture_saved(filepath, error)
+
+def estimate_video_bytes(cam, duration):
+    # H.264 at roughly 0.1 bits per pixel
+    settings = cam['settings']
+    bits_per_second = settings['width'] * settings['height'] * settings['fps'] * 0.1
+    return int(bits_per_second * duration / 8)
+
+def uploaded_file_deleted(kind, filepath):
+    storage.remove_empty_dirs(camera_of(kind, filepath)['roots'][kind], filepath)
+    media_removed(kind, filepath)
+
+# Startup progress, the server answers requests while this is still running
+startup = {
+    'storage': 'pending',
+    'error': None,
+    'timings': {},
+}
+storage_ready = threading.Event()
 
-config = load_config()
+# Routes that need a running camera, answered with 503 until it is ready
+CAMERA_ENDPOINTS = {'take_picture', 'burst', 'record_video', 'start_continuous',
+                    'start_timelapse', 'set_resolution', 'snapshot'}
 
-# Set DEBUG_MODE to True for testing without Picamera2
-DEBUG_MODE = bool(config.get("debug_mode", True))
-# Generate more useful demo images for demo
-DEMO_LIVE_VIDEO = False
+def startup_step(name):
+    elapsed = round(time.monotonic() - STARTED, 3)
+    startup['timings'][name] = elapsed
+    print(f"Startup: {name} after {elapsed:.2f}s")
 
-if not DEBUG_MODE:
-    from picamera2 import Picamera2
+def init_camera(cam):
+    cam['status'] = 'starting'
+    try:
+        backend = cameras.create(cam['config']['backend'], cam['config'])
+        backend.start(cam['settings'])
+        cam['backend'] = backend
+        cam['status'] = 'ready'
+        cam['ready'].set()
+        startup_step(f"camera {cam['name']}")
+    except Exception as e:
+        cam['status'] = 'failed'
+        cam['error'] = str(e)
+        print(f"Error initializing camera {cam['name']}: {e}")
 
-# Initialize Flask app
-app = Flask(__name__)
+def init_storage():
+    startup['storage'] = 'starting'
+    try:
+        for cam in cams.values():
+            # Move captures from the old flat folders into the YYYY/MM/DD layout
+            for kind, extensions in (('pictures', PICTURE_EXTENSIONS), ('videos', VIDEO_EXTENSIONS)):
+                root = cam['roots'][kind]
+                moved = storage.migrate(root, extensions)
+                if moved:
+                    print(f"Moved {moved} files in {root}/ into date folders")
+
+                # Storage retention, deletes the oldest media once quotas are exceeded
+                retention.register_folder(folder_name(cam, kind), root, extensions)
+        retention.configure(config['retention'])
+        retention.start(on_evict=media_evicted, is_busy=media_busy)
+
+        # Background upload of finished media to the remote archive
+        uploader.configure(config['upload'])
+        uploader.start(on_deleted=uploaded_file_deleted)
+
+        # Low bitrate copies of the videos for phones, transcoded in the background
+        proxies.register_root(VIDEOS_DIR, PROXIES_DIR)
+        proxies.configure(config['proxies'])
+        if config['proxies']['enabled']:
+            for cam in cams.values():
+                proxies.scan(cam['roots']['videos'])
+            proxies.prune(VIDEOS_DIR)
+        proxies.start()
+
+        startup['storage'] = 'ready'
+        storage_ready.set()
+        startup_step('storage')
+    except Exception as e:
+        startup['storage'] = 'failed'
+        startup['error'] = str(e)
+        print(f"Error initializing storage: {e}")
+
+startup_step('imports')
+# Thermal governor, lowers live stream quality before the Pi throttles
+governor.configure(config['governor'])
+governor.start(on_change=lambda decision: events.publish('governor-changed', decision))
+change_detection.configure(config['change_detection'])
+# Per capture latency log, written in batches
+tracing.configure(config['tracing'])
+tracing.start()
+# Each camera starts, and later captures, on its own threads
+for cam in cams.values():
+    threading.Thread(target=init_camera, args=(cam,), name=f"init-{cam['name']}", daemon=True).start()
+threading.Thread(target=init_storage, name='init-storage', daemon=True).start()
+
+def requested_camera_name():
+    if request.view_args and request.view_args.get('camera'):
+        return request.view_args['camera']
+    data = request.get_json(silent=True) if request.is_json else None
+    return request.values.get('camera') or (data or {}).get('camera')
+
+# Captures and recordings traced from trigger to file, endpoint -> trace kind
+TRACED_ENDPOINTS = {'take_picture': 'picture', 'burst': 'burst', 'record_video': 'video'}
+
+@app.before_request
+def start_trace():
+    # Runs first, so time spent waiting for a camera counts too
+    kind = TRACED_ENDPOINTS.get(request.endpoint)
+    if kind is not None and tracing.settings['enabled']:
+        g.trace = tracing.from_headers(request.headers, kind)
+        g.trace.mark('received')
+
+@app.after_request
+def finish_trace(response):
+    trace = g.pop('trace', None)
+    if trace is not None:
+        trace.mark('responded')
+        if response.status_code >= 400:
+            trace.fields['outcome'] = 'error'
+            trace.fields['status'] = response.status_code
+        if g.get('camera') is not None:
+            trace.fields['camera'] = g.camera['name']
+        response.headers[tracing.ID_HEADER] = trace.id
+        trace.release()
+    return response
+
+def trace_mark(stage):
+    trace = g.get('trace')
+    if trace is not None:
+        trace.mark(stage)
+
+@app.before_request
+def select_camera():
+    # Routes act on ?camera=<name> (or a camera field in the body), the default camera otherwise
+    name = requested_camera_name()
+    g.camera = cams.get(name or DEFAULT_CAMERA)
+    if g.camera is None:
+        return jsonify({
+            'success': False,
+            'message': f'Unknown camera: {name}'
+        }), 404
+    if request.endpoint in CAMERA_ENDPOINTS and not g.camera['ready'].is_set():
+        return jsonify({
+            'success': False,
+            'message': f"Camera {g.camera['name']} is not ready yet ({g.camera['status']})"
+        }), 503
 
-# Current camera settings
-camera_settings = {
-    'width': 640,
-    'height': 480,
-    'fps': 30,
-    'hdr': False
-}
+# How long a live viewer connecting during startup waits for its camera
+LIVE_WAIT_SECONDS = 30
 
-# Video recording state
-video_recording = {
-    'is_recording': False,
-    'output_path': None,
-    'recorder': None
-}
+# Generator for MJPEG stream
+def gen_frames(cam):
+    # Viewers connecting during startup get frames once the camera is up. A
+    # camera that failed never becomes ready, so stop instead of holding the
+    # server thread
+    deadline = time.monotonic() + LIVE_WAIT_SECONDS
+    while not cam['ready'].wait(1):
+        if cam['status'] == 'failed' or time.monotonic() > deadline:
+            return
+    # Frames are captured and encoded once per camera and shared by all viewers.
+    # The JPEG is sent as its own chunk rather than copied into one part
+    for frame_bytes in cam['stream'].frames():
+        yield b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n' % len(frame_bytes)
+        yield frame_bytes
+        yield b'\r\n'
+
+def camera_status(cam):
+    return {
+        'name': cam['name'],
+        'backend': cam['config']['backend'],
+        'status': cam['status'],
+        'error': cam['error'],
+        'settings': cam['settings'],
+        'recording': cam['recording']['is_recording'],
+        'viewers': cam['stream'].viewer_count(),
+    }
+
+@app.route('/ready')
+def ready():
+    is_ready = storage_ready.is_set() and all(cam['ready'].is_set() for cam in cams.values())
+    return jsonify({
+        'success': True,
+        'ready': is_ready,
+        'uptime': round(time.monotonic() - STARTED, 3),
+        'cameras': {cam['name']: cam['status'] for cam in cams.values()},
+        **startup
+    }), 200 if is_ready else 503
+
+@app.route('/cameras')
+def list_cameras():
+    return jsonify({
+        'success': True,
+        'default': DEFAULT_CAMERA,
+        'cameras': [camera_status(cam) for cam in cams.values()]
+    })
+
+@app.route('/health')
+def health():
+    """Node summary in one request, polled by the fleet aggregator (fleet.py)."""
+    # Recordings fill the videos folder's filesystem first
+    disk = retention.disk_usage(VIDEOS_DIR)
+    upload = uploader.status()
+    return jsonify({
+        'success': True,
+        'name': config['name'],
+        'ready': storage_ready.is_set() and all(cam['ready'].is_set() for cam in cams.values()),
+        'uptime': round(time.monotonic() - STARTED, 3),
+        'cameras': [camera_status(cam) for cam in cams.values()],
+        'continuous': continuous.is_active(),
+        'timelapse': timelapse.is_active(),
+        'disk_free': disk.free,
+        'disk_total': disk.total,
+        'uploads_pending': upload['pending_count'],
+        'governor': {key: governor.state[key] for key in ('level', 'temperature', 'load', 'reason')},
+    })
+
+@app.route('/snapshot')
+def snapshot():
+    """
+    Returns the current frame as a single JPEG.
+
+    Supports ?width=N to get a smaller frame, e.g. for dashboards showing
+    many cameras.
+    """
+    try:
+        cam = g.camera
+        width = request.args.get('width', type=int)
+        # Reuse the live stream's frame while it is being watched
+        jpeg = None if width else cam['stream'].latest()
+        if jpeg is None:
+            with cam['backend'].frame_view() as frame:
+                if width and width < frame.shape[1]:
+                    step = -(-frame.shape[1] // width)
+                    frame = frame[::step, ::step]
+                jpeg = jpeg_writer.encode_jpeg(frame, config['stream']['jpeg_quality'], 'BGR')
+
+        return Response(jpeg, mimetype='image/jpeg', headers={'Cache-Control': 'no-store'})
 
-# Resolution presets
-resolution_presets = {
-    '640x480x30': {'width': 640, 'height': 480, 'fps': 30, 'hdr': False},
-    '1536x864x30': {'width': 1536, 'height': 864, 'fps': 30, 'hdr': False},
-    '2304x1296x30': {'width': 2304, 'height': 1296, 'fps': 30, 'hdr': False},
-    '4608x2592x30': {'width': 4608, 'height': 2592, 'fps': 30, 'hdr': False},
-}
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error taking snapshot: {str(e)}'
+        }), 500
+
+# Live views and /events hold a server thread each for as long as they are
+# open, a browser tab holds two. Under waitress the pool is fixed, so these
+# are capped to leave threads for ordinary requests
+RESERVED_THREADS = 4
+long_lived = {'limit': None, 'open': 0}
+long_lived_lock = threading.Lock()
+
+def long_lived_response(body, **kwargs):
+    """
+    Wraps a streaming body, or returns 503 once the streams would take the
+    threads reserved for other requests.
+    """
+    with long_lived_lock:
+        if long_lived['limit'] is not None and long_lived['open'] >= long_lived['limit']:
+            body.close()
+            return jsonify({
+                'success': False,
+                'message': f"Too many open live views and event streams ({long_lived['open']}), "
+                           f"raise server.threads"
+            }), 503
+        long_lived['open'] += 1
 
-if not DEBUG_MODE:
-    # Initialize Picamera2
-    picam2 = Picamera2()
-    picam_config = picam2.create_video_configuration(
-        main={'format': 'RGB888', 'size': (camera_settings['width'], camera_settings['height'])}
-    )
-    picam2.configure(picam_config)
-    picam2.start()
+    def closed():
+        with long_lived_lock:
+            long_lived['open'] -= 1
 
-# Generator for MJPEG stream
-def gen_frames():
-    global camera_settings
-    while True:
-        if DEBUG_MODE:
-            # Create a synthetic frame with current resolution
-            width, height = camera_settings['width'], camera_settings['height']
-            frame = np.zeros((height, width, 3), dtype=np.uint8)
-            if DEMO_LIVE_VIDEO:
-                settings_text = f"{width}x{height} {camera_settings['fps']}fps"
-                if camera_settings['hdr']:
-                    settings_text += " HDR"
-                cv2.putText(frame, 'DEBUG MODE', (width//10, height//2),
-                           cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 255, 0), 2)
-                cv2.putText(frame, settings_text, (width//10, height//2 + 40),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            img = Image.fromarray(frame, 'RGB')
-            img_buffer = io.BytesIO()
-            img.save(img_buffer, format='JPEG', quality=85)
-            frame_bytes = img_buffer.getvalue()
-        else:
-            frame = picam2.capture_array('main')
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(frame_rgb, 'RGB')
-            img_buffer = io.BytesIO()
-            img.save(img_buffer, format='JPEG', quality=85)
-            frame_bytes = img_buffer.getvalue()
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+    response = Response(body, **kwargs)
+    # Runs even if the client left before the first chunk
+    response.call_on_close(closed)
+    return response
+
+@app.route('/events')
+def event_stream():
+    return long_lived_response(events.stream(), mimetype='text/event-stream',
+                               headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/live_video_feed')
-def live_video_feed():
-    return Response(gen_frames(),
-                    mimetype='multipart/x-mixed-replace; boundary=frame')
+@app.route('/live_video_feed/<camera>')
+def live_video_feed(camera=None):
+    if g.camera['status'] == 'failed':
+        return jsonify({
+            'success': False,
+            'message': f"Camera {g.camera['name']} failed to start: {g.camera['error']}"
+        }), 503
+    return long_lived_response(gen_frames(g.camera),
+                               mimetype='multipart/x-mixed-replace; boundary=frame')
 
 @app.route('/')
 def index():
-    return render_template('index.html', config=config)
+    return render_template('index.html', config=config, resolution_presets=resolution_presets,
+                           cameras=list(cams.values()), camera_settings=cams[DEFAULT_CAMERA]['settings'])
+
+def apply_resolution(cam, new_settings):
+    """
+    Switches a camera to new settings, restarting it only if the frame size
+    changes.
+    """
+    old_settings = cam['settings']
+    cam['settings'] = new_settings
+
+    # Before startup finishes the camera picks up its settings by itself
+    if cam['ready'].is_set() and new_settings != old_settings:
+        cam['backend'].reconfigure(new_settings)
+
+        # Configure HDR if needed
+        #if camera_settings['hdr']:
+        #    picam2.set_controls({"HighDynamicRangeMode": 1})
+        #else:
+        #    picam2.set_controls({"HighDynamicRangeMode": 0})
 
 @app.route('/set_resolution', methods=['POST'])
 def set_resolution():
-    global camera_settings
-
     resolution_key = request.form.get('resolution', '640x480x30')
+    cam = g.camera
 
-    if resolution_key in resolution_presets:
-        new_settings = resolution_presets[resolution_key]
-        camera_settings = new_settings
-
-        if not DEBUG_MODE:
-            # Reconfigure the camera with new settings
-            picam2.stop()
-            picam_config = picam2.create_video_configuration(
-                main={'format': 'RGB888', 'size': (camera_settings['width'], camera_settings['height'])}
-            )
-            # Configure HDR if needed
-            #if camera_settings['hdr']:
-            #    picam2.set_controls({"HighDynamicRangeMode": 1})
-            #else:
-            #    picam2.set_controls({"HighDynamicRangeMode": 0})
+    if continuous.is_active() and continuous.state['camera'] == cam['name']:
+        return jsonify({
+            'success': False,
+            'message': 'Stop continuous recording before changing the resolution'
+        }), 400
 
-            # Set framerate
-            picam2.set_controls({"FrameRate": camera_settings['fps']})
+    if timelapse.is_active() and timelapse.state['camera'] == cam['name']:
+        return jsonify({
+            'success': False,
+            'message': 'Stop the timelapse before changing the resolution'
+        }), 400
 
-            picam2.configure(picam_config)
-            picam2.start()
+    if resolution_key in resolution_presets:
+        apply_resolution(cam, dict(resolution_presets[resolution_key]))
 
-    return jsonify({'success': True, 'settings': camera_settings})
+    return jsonify({'success': True, 'camera': cam['name'], 'settings': cam['settings']})
 
 @app.route('/take_picture', methods=['POST'])
 def take_picture():
+    filepath = None
     try:
-        # Create pictures directory if it doesn't exist
-        pictures_dir = 'pictures'
-        if not os.path.exists(pictures_dir):
-            os.makedirs(pictures_dir)
+        now = datetime.now()
+        timestamp = now.strftime('%Y%m%d_%H%M%S')
+
+        # Only the capture happens on the request thread, encoding and writing
+        # are handed to the JPEG worker pool
+        frame = capture_still(g.camera, f'Debug Image {timestamp}')
+        trace_mark('captured')
+
+        # Scheduled pictures (callback.py) can skip frames identical to the last one
+        action = None
+        # (thumbnail, time) of a changed frame, the reference once it is written
+        reference = None
+        data = (request.get_json(silent=True) or {}) if request.is_json else request.form
+        if change_detection.settings['enabled'] and str(data.get('skip_unchanged', '')).lower() in ('1', 'true'):
+            checked = time.time()
+            action, diff, thumbnail = change_detection.check(g.camera['name'], frame, checked)
+            if action is None:
+                reference = (thumbnail, checked)
+            if action == 'skip':
+                if g.get('trace') is not None:
+                    g.trace.fields['outcome'] = 'skipped'
+                return jsonify({
+                    'success': True,
+                    'skipped': True,
+                    'message': f'Picture unchanged ({diff:.2f}% difference), not saved',
+                    'difference': diff
+                })
+
+        # Pictures are stored in YYYY/MM/DD folders
+        pictures_dir = storage.media_dir(g.camera['roots']['pictures'], now)
 
         # Generate filename with timestamp
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'picture_{timestamp}.jpg'
-        filepath = os.path.join(pictures_dir, filename)
+        stem = f'picture_{timestamp}_unchanged' if action == 'mark' else f'picture_{timestamp}'
+        filepath = reserve_filepath(pictures_dir, stem, '.jpg')
+        filename = os.path.basename(filepath)
+
+        # The trace stays open until the JPEG is on disk
+        trace = g.get('trace')
+        if trace is not None:
+            trace.hold()
+        cam_name = g.camera['name']
+        on_done = lambda saved_filepath, error: picture_written(cam_name, reference, trace, saved_filepath, error)
+
+        try:
+            jpeg_writer.submit(frame, filepath, quality=config['capture']['jpeg_quality'], on_done=on_done)
+        except jpeg_writer.QueueFull as e:
+            release_filepath(filepath)
+            if trace is not None:
+                trace.release()
+            return jsonify({
+                'success': False,
+                'message': f'Camera is busy saving pictures, try again: {str(e)}'
+            }), 503
 
-        if DEBUG_MODE:
-            # Create a synthetic image for debug mode
-            width, height = camera_settings['width'], camera_settings['height']
-            frame = np.zeros((height, width, 3), dtype=np.uint8)
-            # Add some visual content to the debug image
-            cv2.putText(frame, f'Debug Image {timestamp}', (50, height//2),
-                        cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-            # Use PIL to save image directly from RGB format
-            img = Image.fromarray(frame, 'RGB')
-            img.save(filepath, format='JPEG', quality=95)
-            success = True
-        else:
-            # Temporarily switch to still configuration for highest quality RGB capture
-            picam2.stop()
+        return jsonify({
+            'success': True,
+            'message': 'Picture taken successfully',
+            'filename': filename,
+            'filepath': filepath,
+            'unchanged': action == 'mark'
+        })
 
-            # Configure for still image capture
-            still_config = picam2.create_still_configuration(
-                main={'format': 'RGB888', 'size': (camera_settings['width'], camera_settings['height'])}
-            )
-            picam2.configure(still_config)
-            picam2.start()
+    except Exception as e:
+        release_filepath(filepath)
+        return jsonify({
+            'success': False,
+            'message': f'Error taking picture: {str(e)}'
+        }), 500
 
-            # Capture high-quality still image
-            picam2.capture_file(filepath)
+@app.route('/burst', methods=['POST'])
+def burst():
+    try:
+        data = request.get_json(silent=True) or {}
+        count = int(data.get('count', 10))
+        fps = float(data.get('fps', 10))
 
-            # Switch back to video configuration for live stream
-            picam2.stop()
-            picam_config = picam2.create_video_configuration(
-                main={'format': 'RGB888', 'size': (camera_settings['width'], camera_settings['height'])}
-            )
-            picam2.configure(picam_config)
-            picam2.start()
+        if not (1 <= count <= MAX_BURST_FRAMES):
+            return jsonify({
+                'success': False,
+                'message': f'Count must be between 1 and {MAX_BURST_FRAMES}'
+            }), 400
 
-            success = True
+        if not (MIN_BURST_FPS <= fps <= MAX_BURST_FPS):
+            return jsonify({
+                'success': False,
+                'message': f'FPS must be between {MIN_BURST_FPS:g} and {MAX_BURST_FPS}'
+            }), 400
 
-        if success:
+        if count / fps > MAX_BURST_SECONDS:
             return jsonify({
-                'success': True,
-                'message': 'Picture taken successfully',
-                'filename': filename,
-                'filepath': filepath
-            })
-        else:
+                'success': False,
+                'message': f'A burst can last at most {MAX_BURST_SECONDS} seconds, '
+                           f'take at most {int(MAX_BURST_SECONDS * fps)} frames at {fps:g} fps'
+            }), 400
+
+        settings = g.camera['settings']
+        frame_bytes = settings['width'] * settings['height'] * 3
+        if count * frame_bytes > MAX_BURST_BYTES:
             return jsonify({
                 'success': False,
-                'message': 'Failed to save picture'
-            }), 500
+                'message': f'At most {MAX_BURST_BYTES // frame_bytes} frames fit in memory at this resolution'
+            }), 400
+
+        # Grab all frames from the running pipeline first, encoding happens afterwards
+        now = datetime.now()
+        pictures_dir = storage.media_dir(g.camera['roots']['pictures'], now)
+        timestamp = now.strftime('%Y%m%d_%H%M%S')
+        interval = 1.0 / fps
+        frames = []
+        next_capture = time.monotonic()
+        for sequence in range(count):
+            delay = next_capture - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            frames.append(capture_frame(g.camera, f'Burst {timestamp} #{sequence}'))
+            next_capture += interval
+        trace_mark('captured')
+
+        # The trace stays open until the last JPEG is on disk
+        trace = g.get('trace')
+        on_done = picture_saved
+        if trace is not None:
+            on_done = lambda saved_filepath, error: picture_traced(trace, saved_filepath, error)
+        filenames = []
+        for sequence, frame in enumerate(frames):
+            filepath = reserve_filepath(pictures_dir, f'burst_{timestamp}_{sequence:03d}', '.jpg')
+            filenames.append(os.path.basename(filepath))
+            if trace is not None:
+                trace.hold()
+            try:
+                # Blocks while the writer pool is saturated
+                jpeg_writer.submit(frame, filepath, quality=config['capture']['jpeg_quality'], timeout=30, on_done=on_done)
+            except jpeg_writer.QueueFull:
+                release_filepath(filepath)
+                filenames.pop()
+                if trace is not None:
+                    trace.release()
+                break
+
+        return jsonify({
+            'success': True,
+            'message': f'Captured {count} frames, saving {len(filenames)} in background',
+            'filenames': filenames,
+            'count': count,
+            'fps': fps
+        })
 
     except Exception as e:
         return jsonify({
             'success': False,
-            'message': f'Error taking picture: {str(e)}'
+            'message': f'Error capturing burst: {str(e)}'
         }), 500
 
+def list_media(root, extensions):
+    """
+    Lists media under root newest first.
+
+    Supports ?date=YYYY-MM-DD to read a single day folder and ?limit=N to
+    stop walking once the newest N files have been found.
+    """
+    date = request.args.get('date')
+    limit = request.args.get('limit', type=int)
+
+    if date:
+        entries = storage.scan_dir(storage.day_dir(root, date), extensions)
+    else:
+        entries = []
+        for _, directory in storage.iter_days(root):
+            entries.extend(storage.scan_dir(directory, extensions))
+            if limit and len(entries) >= limit:
+                break
+        else:
+            # Files from before the YYYY/MM/DD layout
+            entries.extend(storage.scan_dir(root, extensions))
+
+    items = []
+    for entry in entries:
+        stat = entry.stat()
+        items.append({
+            'filename': entry.name,
+            'size': stat.st_size,
+            'created': datetime.fromtimestamp(stat.st_ctime).isoformat()
+        })
+
+    # Sort by creation time, newest first
+    items.sort(key=lambda x: x['created'], reverse=True)
+    if limit:
+        items = items[:limit]
+    return items
+
+def delete_all_media(root, extensions):
+    deleted_count = 0
+    for entry in list(storage.iter_files(root, extensions)):
+        try:
+            os.remove(entry.path)
+            deleted_count += 1
+        except Exception as e:
+            print(f"Error deleting {entry.name}: {e}")
+    storage.prune_empty_dirs(root)
+    return deleted_count
+
 @app.route('/pictures', methods=['GET'])
 def list_pictures():
     try:
-        pictures_dir = 'pictures'
+        pictures_dir = g.camera['roots']['pictures']
         if not os.path.exists(pictures_dir):
             return jsonify({'success': True, 'pictures': []})
 
-        pictures = []
-        for filename in os.listdir(pictures_dir):
-            if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
-                filepath = os.path.join(pictures_dir, filename)
-                stat = os.stat(filepath)
-                pictures.append({
-                    'filename': filename,
-                    'size': stat.st_size,
-                    'created': datetime.fromtimestamp(stat.st_ctime).isoformat()
-                })
-
-        # Sort by creation time, newest first
-        pictures.sort(key=lambda x: x['created'], reverse=True)
+        pictures = list_media(pictures_dir, PICTURE_EXTENSIONS)
 
         return jsonify({
             'success': True,
@@ -228,6 +790,12 @@ def list_pictures():
             'count': len(pictures)
         })
 
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': f'Invalid date, expected YYYY-MM-DD: {str(e)}'
+        }), 400
+
     except Exception as e:
         return jsonify({
             'success': False,
@@ -237,8 +805,13 @@ def list_pictures():
 @app.route('/pictures/<filename>')
 def serve_picture(filename):
     try:
-        pictures_dir = 'pictures'
-        filepath = os.path.join(pictures_dir, filename)
+        if not storage.is_safe_filename(filename):
+            return jsonify({
+                'success': False,
+                'message': 'Invalid filename'
+            }), 400
+
+        filepath = storage.media_path(g.camera['roots']['pictures'], filename)
 
         if not os.path.exists(filepath):
             return jsonify({
@@ -264,14 +837,14 @@ def serve_picture(filename):
 def delete_picture(filename):
     try:
         # Security: Prevent path traversal attacks
-        if '..' in filename or '/' in filename or '\\' in filename:
+        if not storage.is_safe_filename(filename):
             return jsonify({
                 'success': False,
                 'message': 'Invalid filename'
             }), 400
 
-        pictures_dir = 'pictures'
-        filepath = os.path.join(pictures_dir, filename)
+        pictures_dir = g.camera['roots']['pictures']
+        filepath = storage.media_path(pictures_dir, filename)
 
         # Security: Ensure file is actually in the pictures directory
         if not os.path.commonpath([os.path.abspath(pictures_dir), os.path.abspath(filepath)]) == os.path.abspath(pictures_dir):
@@ -287,7 +860,7 @@ def delete_picture(filename):
             }), 404
 
         # Verify it's an image file
-        if not filename.lower().endswith(('.jpg', '.jpeg', '.png')):
+        if not filename.lower().endswith(PICTURE_EXTENSIONS):
             return jsonify({
                 'success': False,
                 'message': 'Invalid file type'
@@ -295,6 +868,8 @@ def delete_picture(filename):
 
         # Delete the file
         os.remove(filepath)
+        storage.remove_empty_dirs(pictures_dir, filepath)
+        media_removed('pictures', filepath)
 
         return jsonify({
             'success': True,
@@ -310,7 +885,7 @@ def delete_picture(filename):
 @app.route('/delete_all_pictures', methods=['DELETE'])
 def delete_all_pictures():
     try:
-        pictures_dir = 'pictures'
+        pictures_dir = g.camera['roots']['pictures']
         if not os.path.exists(pictures_dir):
             return jsonify({
                 'success': True,
@@ -318,15 +893,9 @@ def delete_all_pictures():
                 'deleted_count': 0
             })
 
-        deleted_count = 0
-        for filename in os.listdir(pictures_dir):
-            if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
-                filepath = os.path.join(pictures_dir, filename)
-                try:
-                    os.remove(filepath)
-                    deleted_count += 1
-                except Exception as e:
-                    print(f"Error deleting {filename}: {e}")
+        deleted_count = delete_all_media(pictures_dir, PICTURE_EXTENSIONS)
+        retention.rescan(folder_name(g.camera, 'pictures'))
+        events.publish('media-cleared', {'kind': 'pictures', 'camera': g.camera['name']})
 
         return jsonify({
             'success': True,
@@ -342,65 +911,64 @@ def delete_all_pictures():
 
 @app.route('/record_video', methods=['POST'])
 def record_video():
-    global video_recording
+    cam = g.camera
+    camera = cam['backend']
+    camera_settings = cam['settings']
 
     try:
         data = request.get_json() or {}
         duration = min(int(data.get('duration', 30)), 600)  # Max 10 minutes
 
-        if video_recording['is_recording']:
+        if cam['recording']['is_recording'] or camera_busy(cam):
             return jsonify({
                 'success': False,
                 'message': 'Video recording already in progress'
             }), 400
 
-        # Create videos directory if it doesn't exist
-        videos_dir = 'videos'
-        if not os.path.exists(videos_dir):
-            os.makedirs(videos_dir)
+        # Make room before starting, a full SD card would fail mid-clip
+        if not retention.ensure_free_space(estimate_video_bytes(cam, duration), cam['roots']['videos']):
+            return jsonify({
+                'success': False,
+                'message': 'Not enough free disk space for this recording'
+            }), 507
+
+        # Videos are stored in YYYY/MM/DD folders
+        now = datetime.now()
+        videos_dir = storage.media_dir(cam['roots']['videos'], now)
 
         # Generate filename with timestamp
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        timestamp = now.strftime('%Y%m%d_%H%M%S')
         filename = f'video_{timestamp}.mp4'
         filepath = os.path.join(videos_dir, filename)
 
-        if DEBUG_MODE:
-            # Create a synthetic video for debug mode
+        if not camera.has_encoder:
+            import cv2
+
+            # No hardware encoder, write the backend's frames in software
             width, height = camera_settings['width'], camera_settings['height']
 
-            video_recording['is_recording'] = True
-            video_recording['output_path'] = filepath
+            recording_started(cam, filepath)
 
             try:
                 # Try OpenCV method first (more reliable)
                 fourcc = cv2.VideoWriter_fourcc(*'mp4v')
                 out = cv2.VideoWriter(filepath, fourcc, camera_settings['fps'], (width, height))
+                trace_mark('recording_started')
 
+                # capture_frame() waits for each new frame, so this takes duration seconds
                 total_frames = duration * camera_settings['fps']
-                timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
                 for frame_num in range(total_frames):
-                    # Create a blue frame
-                    frame = np.full((height, width, 3), (255, 0, 0), dtype=np.uint8)
-
-                    # Add text overlay
-                    cv2.putText(frame, 'DEBUG MODE', (50, 50),
-                               cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-                    cv2.putText(frame, f'Recording: {timestamp}', (50, 100),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-                    cv2.putText(frame, f'Frame: {frame_num}/{total_frames}', (50, 150),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-
-                    out.write(frame)
+                    out.write(capture_frame(cam))
 
                 out.release()
+                trace_mark('written')
 
-                video_recording['is_recording'] = False
-                video_recording['output_path'] = None
+                recording_finished(cam)
+                media_added('videos', filepath)
 
                 return jsonify({
                     'success': True,
-                    'message': f'Debug video recorded successfully ({duration}s)',
+                    'message': f'Video recorded successfully ({duration}s, {camera.name} camera)',
                     'filename': filename,
                     'filepath': filepath,
                     'duration': duration
@@ -420,8 +988,8 @@ def record_video():
                         result = subprocess.run(ffmpeg_cmd, capture_output=True, text=True)
 
                         if result.returncode == 0:
-                            video_recording['is_recording'] = False
-                            video_recording['output_path'] = None
+                            recording_finished(cam)
+                            media_added('videos', filepath)
 
                             return jsonify({
                                 'success': True,
@@ -434,15 +1002,13 @@ def record_video():
                             raise Exception(f'FFmpeg failed: {result.stderr}')
 
                     except Exception as ffmpeg_error:
-                        video_recording['is_recording'] = False
-                        video_recording['output_path'] = None
+                        recording_finished(cam)
                         return jsonify({
                             'success': False,
                             'message': f'Debug video creation failed. OpenCV error: {opencv_error}. FFmpeg error: {ffmpeg_error}'
                         }), 500
                 else:
-                    video_recording['is_recording'] = False
-                    video_recording['output_path'] = None
+                    recording_finished(cam)
                     # Final fallback - create a simple text file as placeholder
                     try:
                         fallback_timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -453,6 +1019,7 @@ def record_video():
                             f.write(f"FPS: {camera_settings['fps']}\n")
                             f.write(f"Timestamp: {fallback_timestamp}\n")
                             f.write(f"Note: OpenCV and FFmpeg both unavailable\n")
+                        media_added('videos', filepath.replace('.mp4', '.txt'))
 
                         return jsonify({
                             'success': True,
@@ -467,38 +1034,37 @@ def record_video():
                             'message': f'All debug methods failed. OpenCV: {opencv_error}. File write: {file_error}'
                         }), 500
         else:
-            # Record video using picamera2
+            # Record video using the picamera2 hardware encoder
+            picam2 = encoder_camera(cam)
             from picamera2.encoders import H264Encoder
             from picamera2.outputs import FileOutput
 
-            video_recording['is_recording'] = True
-            video_recording['output_path'] = filepath
+            recording_started(cam, filepath)
 
             # Create temporary H264 file
             h264_filepath = filepath.replace('.mp4', '.h264')
 
+            encoder = None
             try:
-                # Stop the current video stream temporarily
-                picam2.stop()
-
-                # Configure for video recording
-                video_config = picam2.create_video_configuration(
-                    main={'format': 'RGB888', 'size': (camera_settings['width'], camera_settings['height'])}
-                )
-                picam2.configure(video_config)
+                # The live stream already runs the video configuration, so the
+                # encoder can be attached without stopping the camera
+                camera.configure('video')
+                trace_mark('configured')
 
                 # Create encoder and output for H264 format
                 encoder = H264Encoder()
                 output = FileOutput(h264_filepath)
 
                 # Start recording
-                picam2.start_recording(encoder, output)
+                picam2.start_encoder(encoder, output)
+                trace_mark('recording_started')
 
                 # Record for the specified duration
                 time.sleep(duration)
 
                 # Stop recording
-                picam2.stop_recording()
+                picam2.stop_encoder(encoder)
+                trace_mark('recording_finished')
 
                 # Convert H264 to MP4 using ffmpeg
                 convert_success = False
@@ -530,16 +1096,10 @@ def record_video():
                 # Final check - ensure we have a video file
                 if not os.path.exists(filepath):
                     raise Exception("Video file was not created successfully")
+                trace_mark('written')
 
-                # Restart the video stream for live feed
-                stream_config = picam2.create_video_configuration(
-                    main={'format': 'RGB888', 'size': (camera_settings['width'], camera_settings['height'])}
-                )
-                picam2.configure(stream_config)
-                picam2.start()
-
-                video_recording['is_recording'] = False
-                video_recording['output_path'] = None
+                recording_finished(cam)
+                media_added('videos', filepath)
 
                 return jsonify({
                     'success': True,
@@ -557,18 +1117,18 @@ def record_video():
                     except:
                         pass
 
-                # Ensure we restart the stream even if recording fails
+                # Ensure the stream is running even if recording fails
                 try:
-                    stream_config = picam2.create_video_configuration(
-                        main={'format': 'RGB888', 'size': (camera_settings['width'], camera_settings['height'])}
-                    )
-                    picam2.configure(stream_config)
-                    picam2.start()
+                    if encoder is not None:
+                        try:
+                            picam2.stop_encoder(encoder)
+                        except Exception:
+                            pass
+                    camera.reset()
                 except Exception as stream_error:
                     print(f"Failed to restart video stream: {stream_error}")
 
-                video_recording['is_recording'] = False
-                video_recording['output_path'] = None
+                recording_finished(cam)
 
                 # Provide more detailed error message
                 error_msg = f"Video recording failed: {str(e)}"
@@ -587,33 +1147,328 @@ def record_video():
                 }), 500
 
     except Exception as e:
-        video_recording['is_recording'] = False
-        video_recording['output_path'] = None
+        recording_finished(cam)
         return jsonify({
             'success': False,
             'message': f'Error recording video: {str(e)}'
         }), 500
 
+# Traces of continuous segments by filepath, from the segment's start until
+# it is indexed
+segment_traces = {}
+segment_traces_lock = threading.Lock()
+
+def close_segment_traces():
+    with segment_traces_lock:
+        for trace in segment_traces.values():
+            if 'closed' not in trace.stages:
+                trace.mark('closed')
+
+def segment_path(cam, start_time):
+    # Runs on the encoder's output thread between two segments, so it only
+    # picks the filename. Space is freed by segment_finished()
+    filepath = reserve_filepath(storage.media_dir(cam['roots']['videos'], start_time),
+                                f"video_{start_time.strftime('%Y%m%d_%H%M%S')}", '.mp4')
+    release_filepath(filepath)
+    # A new segment starts when the previous one is closed
+    close_segment_traces()
+    if tracing.settings['enabled']:
+        trace = tracing.Trace('continuous', 'segment')
+        trace.mark('started', start_time.timestamp())
+        trace.fields['camera'] = cam['name']
+        with segment_traces_lock:
+            segment_traces[filepath] = trace
+    return filepath
+
+def segment_finished(filepath):
+    media_added('videos', filepath)
+    with segment_traces_lock:
+        trace = segment_traces.pop(filepath, None)
+    if trace is not None:
+        trace.mark('written')
+        trace.release()
+    # Make room for the next segment in the background, the current one is
+    # already being written
+    cam = camera_of('videos', filepath)
+    retention.request_free_space(2 * estimate_video_bytes(cam, continuous.state['segment_seconds']),
+                                 cam['roots']['videos'])
+
+@app.route('/start_continuous', methods=['POST'])
+def start_continuous():
+    try:
+        data = request.get_json(silent=True) or {}
+        segment_seconds = int(data.get('segment_seconds', 300))
+
+        if not (continuous.MIN_SEGMENT_SECONDS <= segment_seconds <= continuous.MAX_SEGMENT_SECONDS):
+            return jsonify({
+                'success': False,
+                'message': f'Segment length must be between {continuous.MIN_SEGMENT_SECONDS} '
+                           f'and {continuous.MAX_SEGMENT_SECONDS} seconds'
+            }), 400
+
+        cam = g.camera
+        if cam['recording']['is_recording'] or continuous.is_active():
+            # One continuous recording at a time, on any camera
+            return jsonify({
+                'success': False,
+                'message': 'Video recording already in progress'
+            }), 400
+
+        if timelapse.is_active() and timelapse.state['camera'] == cam['name']:
+            return jsonify({
+                'success': False,
+                'message': 'Stop the timelapse before recording continuously'
+            }), 400
+
+        # Room for the first two segments, later ones are freed as segments finish
+        if not retention.ensure_free_space(2 * estimate_video_bytes(cam, segment_seconds), cam['roots']['videos']):
+            return jsonify({
+                'success': False,
+                'message': 'Not enough free disk space for this recording'
+            }), 507
+
+        cam['backend'].configure('video')
+
+        continuous.start(encoder_camera(cam), cam['settings'], segment_seconds,
+                         lambda start_time: segment_path(cam, start_time), segment_finished,
+                         capture_frame=lambda label=None: capture_frame(cam, label), camera=cam['name'])
+        recordings_changed()
+        events.publish('recording-started', {'mode': 'continuous', 'camera': cam['name'],
+                                             'segment_seconds': segment_seconds})
+
+        return jsonify({
+            'success': True,
+            'message': f'Continuous recording started ({segment_seconds}s segments)',
+            'status': continuous.status()
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error starting continuous recording: {str(e)}'
+        }), 500
+
+@app.route('/stop_continuous', methods=['POST'])
+def stop_continuous():
+    try:
+        name = continuous.state['camera']
+        # stop() also cleans up after a recording whose thread died
+        cam = cams.get(name)
+        close_segment_traces()
+        if not continuous.stop(encoder_camera(cam) if cam is not None else None):
+            return jsonify({
+                'success': False,
+                'message': 'Continuous recording is not running'
+            }), 400
+
+        recordings_changed()
+        events.publish('recording-finished', {'mode': 'continuous', 'camera': name})
+
+        return jsonify({
+            'success': True,
+            'message': 'Continuous recording stopped',
+            'status': continuous.status()
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error stopping continuous recording: {str(e)}'
+        }), 500
+
+@app.route('/continuous_status', methods=['GET'])
+def continuous_status():
+    return jsonify({
+        'success': True,
+        'status': continuous.status()
+    })
+
+def timelapse_finished(filepath):
+    recordings_changed()
+    media_added('videos', filepath)
+
+def timelapse_picture(cam, frame, when):
+    filepath = reserve_filepath(storage.media_dir(cam['roots']['pictures'], when),
+                                f"picture_{when.strftime('%Y%m%d_%H%M%S')}", '.jpg')
+    try:
+        jpeg_writer.submit(frame, filepath, quality=config['capture']['jpeg_quality'], on_done=picture_saved)
+    except jpeg_writer.QueueFull:
+        release_filepath(filepath)
+        print(f"Skipped timelapse picture {filepath}, JPEG queue is full")
+
+@app.route('/start_timelapse', methods=['POST'])
+def start_timelapse():
+    try:
+        defaults = config['timelapse']
+        data = request.get_json(silent=True) or {}
+        interval = float(data.get('interval', defaults.get('interval', 10)))
+        fps = int(data.get('fps', defaults.get('fps', 25)))
+        save_pictures = bool(data.get('save_pictures', defaults.get('save_pictures', False)))
+        lock_exposure = bool(data.get('lock_exposure', defaults.get('lock_exposure', True)))
+
+        if not (timelapse.MIN_INTERVAL <= interval <= timelapse.MAX_INTERVAL):
+            return jsonify({
+                'success': False,
+                'message': f'Interval must be between {timelapse.MIN_INTERVAL} '
+                           f'and {timelapse.MAX_INTERVAL} seconds'
+            }), 400
+
+        if not (1 <= fps <= 60):
+            return jsonify({
+                'success': False,
+                'message': 'Frame rate must be between 1 and 60'
+            }), 400
+
+        if timelapse.is_active():
+            # One timelapse at a time, on any camera
+            return jsonify({
+                'success': False,
+                'message': 'Timelapse already in progress'
+            }), 400
+
+        cam = g.camera
+        if continuous.is_active() and continuous.state['camera'] == cam['name']:
+            return jsonify({
+                'success': False,
+                'message': 'Stop the continuous recording before starting a timelapse'
+            }), 400
+
+        # Room for the first hour of frames, retention keeps min_free_mb after that
+        if not retention.ensure_free_space(estimate_video_bytes(cam, 3600 / interval / cam['settings']['fps']),
+                                           cam['roots']['videos']):
+            return jsonify({
+                'success': False,
+                'message': 'Not enough free disk space for this timelapse'
+            }), 507
+
+        cam['backend'].configure('video')
+
+        now = datetime.now()
+        filepath = reserve_filepath(storage.media_dir(cam['roots']['videos'], now),
+                                    f"timelapse_{now.strftime('%Y%m%d_%H%M%S')}", '.mp4')
+        release_filepath(filepath)
+
+        on_frame = None
+        if save_pictures:
+            on_frame = lambda frame, when: timelapse_picture(cam, frame, when)
+        timelapse.start(encoder_camera(cam), cam['settings'], interval, fps,
+                        lambda label=None: capture_frame(cam, label), filepath, timelapse_finished,
+                        on_frame=on_frame, exposure_locked=lock_exposure, camera=cam['name'])
+        recordings_changed()
+        events.publish('recording-started', {'mode': 'timelapse', 'camera': cam['name'],
+                                             'filename': os.path.basename(filepath)})
+
+        return jsonify({
+            'success': True,
+            'message': f'Timelapse started (one frame every {interval:g}s)',
+            'status': timelapse.status()
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error starting timelapse: {str(e)}'
+        }), 500
+
+@app.route('/stop_timelapse', methods=['POST'])
+def stop_timelapse():
+    try:
+        name = timelapse.state['camera']
+        if not timelapse.stop():
+            return jsonify({
+                'success': False,
+                'message': 'Timelapse is not running'
+            }), 400
+
+        recordings_changed()
+        events.publish('recording-finished', {'mode': 'timelapse', 'camera': name})
+
+        return jsonify({
+            'success': True,
+            'message': 'Timelapse stopped',
+            'status': timelapse.status()
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error stopping timelapse: {str(e)}'
+        }), 500
+
+@app.route('/timelapse_status', methods=['GET'])
+def timelapse_status():
+    return jsonify({
+        'success': True,
+        'status': timelapse.status()
+    })
+
+def trace_filters():
+    """Reads ?source=, ?kind=, ?hours= and ?history= of the trace routes."""
+    hours = request.args.get('hours', type=float)
+    return {
+        'source': request.args.get('source'),
+        'kind': request.args.get('kind'),
+        'since': time.time() - hours * 3600 if hours else None,
+        # Only ?history=true reads the log files, otherwise the newest traces in memory are used
+        'history': request.args.get('history', '').lower() in ('1', 'true'),
+    }
+
+@app.route('/traces', methods=['GET'])
+def list_traces():
+    try:
+        limit = request.args.get('limit', 50, type=int)
+        traces = tracing.read(**trace_filters())
+        traces.reverse()
+        return jsonify({
+            'success': True,
+            'traces': traces[:limit],
+            'count': len(traces)
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error reading traces: {str(e)}'
+        }), 500
+
+@app.route('/trace_stats', methods=['GET'])
+def trace_stats():
+    try:
+        return jsonify({
+            'success': True,
+            'sources': tracing.stats(**trace_filters())
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error reading traces: {str(e)}'
+        }), 500
+
+@app.route('/change_detection_status', methods=['GET'])
+def change_detection_status():
+    return jsonify({
+        'success': True,
+        'status': change_detection.status()
+    })
+
+@app.route('/proxy_status', methods=['GET'])
+def proxy_status():
+    return jsonify({
+        'success': True,
+        'status': proxies.status()
+    })
+
 @app.route('/videos', methods=['GET'])
 def list_videos():
     try:
-        videos_dir = 'videos'
+        videos_dir = g.camera['roots']['videos']
         if not os.path.exists(videos_dir):
             return jsonify({'success': True, 'videos': []})
 
-        videos = []
-        for filename in os.listdir(videos_dir):
-            if filename.lower().endswith(('.mp4', '.avi', '.mov', '.h264', '.txt')):
-                filepath = os.path.join(videos_dir, filename)
-                stat = os.stat(filepath)
-                videos.append({
-                    'filename': filename,
-                    'size': stat.st_size,
-                    'created': datetime.fromtimestamp(stat.st_ctime).isoformat()
-                })
-
-        # Sort by creation time, newest first
-        videos.sort(key=lambda x: x['created'], reverse=True)
+        videos = list_media(videos_dir, VIDEO_EXTENSIONS)
+        for video in videos:
+            video['proxy'] = proxies.existing_proxy(storage.media_path(videos_dir, video['filename'])) is not None
 
         return jsonify({
             'success': True,
@@ -621,6 +1476,12 @@ def list_videos():
             'count': len(videos)
         })
 
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': f'Invalid date, expected YYYY-MM-DD: {str(e)}'
+        }), 400
+
     except Exception as e:
         return jsonify({
             'success': False,
@@ -630,8 +1491,13 @@ def list_videos():
 @app.route('/videos/<filename>')
 def serve_video(filename):
     try:
-        videos_dir = 'videos'
-        filepath = os.path.join(videos_dir, filename)
+        if not storage.is_safe_filename(filename):
+            return jsonify({
+                'success': False,
+                'message': 'Invalid filename'
+            }), 400
+
+        filepath = storage.media_path(g.camera['roots']['videos'], filename)
 
         if not os.path.exists(filepath):
             return jsonify({
@@ -642,6 +1508,19 @@ def serve_video(filename):
         # Check if download parameter is present
         download = request.args.get('download', 'false').lower() == 'true'
 
+        # ?quality=proxy serves the low bitrate copy once it exists
+        quality = request.args.get('quality', 'original').lower()
+        if quality not in ('original', 'proxy'):
+            return jsonify({
+                'success': False,
+                'message': 'Quality must be original or proxy'
+            }), 400
+        proxy_path = proxies.existing_proxy(filepath) if quality == 'proxy' else None
+        if proxy_path is not None:
+            response = send_file(proxy_path, mimetype='video/mp4', as_attachment=download, download_name=filename)
+            response.headers['X-Video-Quality'] = 'proxy'
+            return response
+
         # Determine mimetype based on file extension
         if filename.lower().endswith('.h264'):
             mimetype = 'video/h264'
@@ -655,9 +1534,11 @@ def serve_video(filename):
             mimetype = 'video/mp4'
 
         if download:
-            return send_file(filepath, mimetype=mimetype, as_attachment=True, download_name=filename)
+            response = send_file(filepath, mimetype=mimetype, as_attachment=True, download_name=filename)
         else:
-            return send_file(filepath, mimetype=mimetype)
+            response = send_file(filepath, mimetype=mimetype)
+        response.headers['X-Video-Quality'] = 'original'
+        return response
 
     except Exception as e:
         return jsonify({
@@ -669,14 +1550,14 @@ def serve_video(filename):
 def delete_video(filename):
     try:
         # Security: Prevent path traversal attacks
-        if '..' in filename or '/' in filename or '\\' in filename:
+        if not storage.is_safe_filename(filename):
             return jsonify({
                 'success': False,
                 'message': 'Invalid filename'
             }), 400
 
-        videos_dir = 'videos'
-        filepath = os.path.join(videos_dir, filename)
+        videos_dir = g.camera['roots']['videos']
+        filepath = storage.media_path(videos_dir, filename)
 
         # Security: Ensure file is actually in the videos directory
         if not os.path.commonpath([os.path.abspath(videos_dir), os.path.abspath(filepath)]) == os.path.abspath(videos_dir):
@@ -692,7 +1573,7 @@ def delete_video(filename):
             }), 404
 
         # Verify it's a video file or debug file
-        if not filename.lower().endswith(('.mp4', '.avi', '.mov', '.h264', '.txt')):
+        if not filename.lower().endswith(VIDEO_EXTENSIONS):
             return jsonify({
                 'success': False,
                 'message': 'Invalid file type'
@@ -700,6 +1581,8 @@ def delete_video(filename):
 
         # Delete the file
         os.remove(filepath)
+        storage.remove_empty_dirs(videos_dir, filepath)
+        media_removed('videos', filepath)
 
         return jsonify({
             'success': True,
@@ -715,7 +1598,7 @@ def delete_video(filename):
 @app.route('/delete_all_videos', methods=['DELETE'])
 def delete_all_videos():
     try:
-        videos_dir = 'videos'
+        videos_dir = g.camera['roots']['videos']
         if not os.path.exists(videos_dir):
             return jsonify({
                 'success': True,
@@ -723,15 +1606,10 @@ def delete_all_videos():
                 'deleted_count': 0
             })
 
-        deleted_count = 0
-        for filename in os.listdir(videos_dir):
-            if filename.lower().endswith(('.mp4', '.avi', '.mov', '.h264', '.txt')):
-                filepath = os.path.join(videos_dir, filename)
-                try:
-                    os.remove(filepath)
-                    deleted_count += 1
-                except Exception as e:
-                    print(f"Error deleting {filename}: {e}")
+        deleted_count = delete_all_media(videos_dir, VIDEO_EXTENSIONS)
+        retention.rescan(folder_name(g.camera, 'videos'))
+        proxies.prune(VIDEOS_DIR)
+        events.publish('media-cleared', {'kind': 'videos', 'camera': g.camera['name']})
 
         return jsonify({
             'success': True,
@@ -745,10 +1623,52 @@ def delete_all_videos():
             'message': f'Error deleting videos: {str(e)}'
         }), 500
 
+@app.route('/export_clip')
+def export_clip():
+    try:
+        try:
+            start = datetime.fromisoformat(request.args.get('start', ''))
+            end = datetime.fromisoformat(request.args.get('end', ''))
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'message': 'start and end must be ISO timestamps, e.g. 2025-01-31T14:25:00'
+            }), 400
+
+        if not shutil.which('ffmpeg'):
+            return jsonify({
+                'success': False,
+                'message': 'Clip export requires ffmpeg. Install ffmpeg: sudo apt install ffmpeg'
+            }), 500
+
+        try:
+            clip = clip_export.export_clip(g.camera['roots']['videos'], start, end)
+        except clip_export.NoRecordingsFound as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 404
+        except clip_export.ClipError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
+
+        clip_filename = f"clip_{start.strftime('%Y%m%d_%H%M%S')}_{end.strftime('%H%M%S')}.mp4"
+        return Response(clip, mimetype='video/mp4', headers={
+            'Content-Disposition': f'attachment; filename={clip_filename}'
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error exporting clip: {str(e)}'
+        }), 500
+
 @app.route('/download_all_pictures')
 def download_all_pictures():
     try:
-        pictures_dir = 'pictures'
+        pictures_dir = g.camera['roots']['pictures']
         if not os.path.exists(pictures_dir):
             return jsonify({
                 'success': False,
@@ -758,14 +1678,16 @@ def download_all_pictures():
         # Create a zip file in memory
         memory_file = io.BytesIO()
 
+        # ?skip_unchanged=true leaves out pictures marked by change detection
+        skip_unchanged = request.args.get('skip_unchanged', 'false').lower() == 'true'
+
         with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
             file_count = 0
-            for filename in os.listdir(pictures_dir):
-                if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
-                    filepath = os.path.join(pictures_dir, filename)
-                    if os.path.exists(filepath):
-                        zf.write(filepath, filename)
-                        file_count += 1
+            for entry in storage.iter_files(pictures_dir, PICTURE_EXTENSIONS):
+                if skip_unchanged and '_unchanged.' in entry.name:
+                    continue
+                zf.write(entry.path, entry.name)
+                file_count += 1
 
             if file_count == 0:
                 return jsonify({
@@ -795,7 +1717,7 @@ def download_all_pictures():
 @app.route('/download_all_videos')
 def download_all_videos():
     try:
-        videos_dir = 'videos'
+        videos_dir = g.camera['roots']['videos']
         if not os.path.exists(videos_dir):
             return jsonify({
                 'success': False,
@@ -807,12 +1729,9 @@ def download_all_videos():
 
         with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
             file_count = 0
-            for filename in os.listdir(videos_dir):
-                if filename.lower().endswith(('.mp4', '.avi', '.mov')):
-                    filepath = os.path.join(videos_dir, filename)
-                    if os.path.exists(filepath):
-                        zf.write(filepath, filename)
-                        file_count += 1
+            for entry in storage.iter_files(videos_dir, ('.mp4', '.avi', '.mov')):
+                zf.write(entry.path, entry.name)
+                file_count += 1
 
             if file_count == 0:
                 return jsonify({
@@ -839,6 +1758,87 @@ def download_all_videos():
             'message': f'Error creating videos archive: {str(e)}'
         }), 500
 
+@app.route('/storage_stats', methods=['GET'])
+def storage_stats():
+    try:
+        return jsonify({
+            'success': True,
+            'stats': retention.stats()
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error reading storage stats: {str(e)}'
+        }), 500
+
+@app.route('/upload_status', methods=['GET'])
+def upload_status():
+    try:
+        return jsonify({
+            'success': True,
+            'status': uploader.status()
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error reading upload status: {str(e)}'
+        }), 500
+
+@app.route('/upload_retry', methods=['POST'])
+def upload_retry():
+    try:
+        uploader.retry_all()
+        return jsonify({
+            'success': True,
+            'message': 'Retrying failed uploads'
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error retrying uploads: {str(e)}'
+        }), 500
+
+@app.route('/governor', methods=['GET'])
+def governor_status():
+    return jsonify({
+        'success': True,
+        'status': governor.status()
+    })
+
+@app.route('/governor', methods=['POST'])
+def governor_simulate():
+    try:
+        data = request.get_json(silent=True) or {}
+        if 'simulated_temperature' not in data:
+            return jsonify({
+                'success': False,
+                'message': 'Expected simulated_temperature (°C, or null for the real sensor)'
+            }), 400
+
+        temperature = data['simulated_temperature']
+        governor.simulate_temperature(None if temperature is None else float(temperature))
+        # Evaluate right away instead of waiting for the next interval
+        governor.update()
+
+        return jsonify({
+            'success': True,
+            'message': 'Using the real temperature sensor' if temperature is None
+                       else f'Simulating {float(temperature):g}°C',
+            'status': governor.status()
+        })
+
+    except (TypeError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'message': f'Invalid temperature: {str(e)}'
+        }), 400
+
+def recorders_changed():
+    events.publish('recorder-changed', {'recorders': recorders.list_recorders()})
+
 @app.route('/create_recorder', methods=['POST'])
 def create_recorder():
     try:
@@ -855,26 +1855,27 @@ def create_recorder():
                 'message': 'Hour and minute are required'
             }), 400
 
-        # Call schedule.py script with record type and duration
-        cmd_args = ['python3', 'schedule.py', str(hour), str(minute), record_type]
         if record_type == 'video' and duration:
-            cmd_args.append(str(min(int(duration), 30)))  # Max 30 seconds
-
-        result = subprocess.run(cmd_args, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+            duration = min(int(duration), 30)  # Max 30 seconds
 
-        if result.returncode == 0:
-            return jsonify({
-                'success': True,
-                'message': f'Recorder "{name}" scheduled successfully',
-                'hour': hour,
-                'minute': minute,
-                'cron_output': result.stdout
-            })
-        else:
+        try:
+            recorder = recorders.create(int(hour), int(minute), record_type, duration)
+        except ValueError as e:
             return jsonify({
                 'success': False,
-                'message': f'Failed to schedule recorder: {result.stderr}'
-            }), 500
+                'message': f'Failed to schedule recorder: {str(e)}'
+            }), 400
+
+        recorders_changed()
+
+        return jsonify({
+            'success': True,
+            'message': f'Recorder "{name}" scheduled successfully',
+            'id': recorder['id'],
+            'hour': hour,
+            'minute': minute,
+            'recorder': recorder
+        })
 
     except Exception as e:
         return jsonify({
@@ -886,53 +1887,34 @@ def create_recorder():
 def delete_recorder():
     try:
         data = request.get_json()
-        hour = data.get('hour')
-        minute = data.get('minute')
+        recorder_id = data.get('id')
 
-        if hour is None or minute is None:
-            return jsonify({
-                'success': False,
-                'message': 'Hour and minute are required'
-            }), 400
+        if recorder_id is None:
+            # Older clients identify recorders by hour and minute
+            hour = data.get('hour')
+            minute = data.get('minute')
 
-        # Find and delete the recorder with matching hour and minute
-        # We need to get the full comment first since it may include type and duration
-        cron_result = subprocess.run([
-            'crontab', '-l'
-        ], capture_output=True, text=True)
+            if hour is None or minute is None:
+                return jsonify({
+                    'success': False,
+                    'message': 'Recorder id (or hour and minute) is required'
+                }), 400
 
-        matching_comment = None
-        if cron_result.returncode == 0:
-            lines = cron_result.stdout.strip().split('\n')
-            for line in lines:
-                if f'recorder h={hour} m={minute}' in line and 'callback.py' in line:
-                    comment_start = line.find('#')
-                    if comment_start != -1:
-                        matching_comment = line[comment_start + 1:].strip()
-                        break
+            recorder_id = recorders.find(hour, minute)
 
-        if not matching_comment:
+        if recorder_id is None or not recorders.delete(str(recorder_id)):
             return jsonify({
                 'success': False,
                 'message': 'Recorder not found'
             }), 404
 
-        # Call unschedule.py script with the full matching comment
-        result = subprocess.run([
-            'python3', 'unschedule.py', matching_comment
-        ], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        recorders_changed()
 
-        if result.returncode == 0:
-            return jsonify({
-                'success': True,
-                'message': f'Recorder deleted successfully',
-                'unschedule_output': result.stdout
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'message': f'Failed to delete recorder: {result.stderr}'
-            }), 500
+        return jsonify({
+            'success': True,
+            'message': f'Recorder deleted successfully',
+            'id': recorder_id
+        })
 
     except Exception as e:
         return jsonify({
@@ -943,49 +1925,12 @@ def delete_recorder():
 @app.route('/list_recorders', methods=['GET'])
 def list_recorders():
     try:
-        # Get current user's crontab
-        result = subprocess.run([
-            'crontab', '-l'
-        ], capture_output=True, text=True)
-
-        recorders = []
-        if result.returncode == 0:
-            lines = result.stdout.strip().split('\n')
-            for line in lines:
-                if 'recorder h=' in line and 'callback.py' in line:
-                    # Parse the comment to extract hour, minute, and recording details
-                    comment_start = line.find('#')
-                    if comment_start != -1:
-                        comment = line[comment_start + 1:].strip()
-                        # Extract h=, m=, type=, and duration= values
-                        import re
-                        h_match = re.search(r'h=(\d+)', comment)
-                        m_match = re.search(r'm=(\d+)', comment)
-                        type_match = re.search(r'type=(\w+)', comment)
-                        duration_match = re.search(r'duration=(\d+)', comment)
-
-                        if h_match and m_match:
-                            hour = int(h_match.group(1))
-                            minute = int(m_match.group(1))
-                            record_type = type_match.group(1) if type_match else 'picture'
-                            duration = int(duration_match.group(1)) if duration_match else None
-
-                            cron_parts = line.split('#')[0].strip().split()
-                            if len(cron_parts) >= 5:
-                                recorder_data = {
-                                    'hour': hour,
-                                    'minute': minute,
-                                    'record_type': record_type,
-                                    'cron_expression': ' '.join(cron_parts[:5]),
-                                    'comment': comment
-                                }
-                                if duration:
-                                    recorder_data['duration'] = duration
-                                recorders.append(recorder_data)
+        # Served from the cached crontab, ?refresh=true picks up external edits
+        refresh = request.args.get('refresh', 'false').lower() == 'true'
 
         return jsonify({
             'success': True,
-            'recorders': recorders
+            'recorders': recorders.list_recorders(refresh=refresh)
         })
 
     except Exception as e:
@@ -994,5 +1939,134 @@ def list_recorders():
             'message': f'Error listing recorders: {str(e)}'
         }), 500
 
+# Serializes config reloads from the endpoint and SIGHUP
+config_lock = threading.Lock()
+
+def camera_layout(config):
+    """Returns the cameras of a config without their resolutions."""
+    return [{key: value for key, value in camera.items() if key != 'resolution'}
+            for camera in config['cameras']]
+
+def reload_config():
+    """
+    Re-reads config.yml and applies what changed without a restart.
+
+    Sections are applied one by one, the camera is only touched when the
+    camera section changes.
+
+    Returns:
+        tuple: (changed sections, sections that only apply after a restart)
+
+    Raises:
+        configuration.ConfigError: If config.yml is invalid, nothing is applied
+    """
+    global config, resolution_presets
+    with config_lock:
+        new_config = configuration.load()
+        changed = configuration.changed_sections(config, new_config)
+
+        if 'camera' in changed or 'cameras' in changed:
+            resolution_presets = configuration.resolution_presets(new_config)
+            for camera_config in new_config['cameras']:
+                cam = cams.get(camera_config['name'])
+                if cam is None or camera_config['resolution'] == cam['config']['resolution']:
+                    continue
+                if camera_busy(cam):
+                    print(f"Not changing the resolution of camera {cam['name']} while recording continuously")
+                    continue
+                apply_resolution(cam, dict(resolution_presets[camera_config['resolution']]))
+                cam['config']['resolution'] = camera_config['resolution']
+        if 'retention' in changed:
+            retention.configure(new_config['retention'])
+        if 'upload' in changed:
+            uploader.configure(new_config['upload'])
+        if 'governor' in changed:
+            governor.configure(new_config['governor'])
+        if 'change_detection' in changed:
+            change_detection.configure(new_config['change_detection'])
+        if 'tracing' in changed:
+            tracing.configure(new_config['tracing'])
+        if 'proxies' in changed:
+            proxies.configure(new_config['proxies'])
+            if new_config['proxies']['enabled']:
+                for cam in cams.values():
+                    proxies.scan(cam['roots']['videos'])
+
+        # Resolutions were applied above, other camera changes need a restart
+        restart_required = [section for section in changed
+                            if section in configuration.RESTART_REQUIRED and section != 'cameras']
+        for field in configuration.CAMERA_RESTART_FIELDS:
+            if new_config['camera'][field] != config['camera'][field]:
+                restart_required.append(f'camera.{field}')
+        if not any(item.startswith('camera.') for item in restart_required) \
+                and camera_layout(new_config) != camera_layout(config):
+            restart_required.append('cameras')
+        config = new_config
+        events.publish('config-reloaded', {'changed': changed, 'restart_required': restart_required})
+        return changed, restart_required
+
+@app.route('/reload_config', methods=['POST'])
+def reload_config_route():
+    try:
+        changed, restart_required = reload_config()
+
+        message = f"Configuration reloaded ({', '.join(changed) or 'no changes'})"
+        if restart_required:
+            message += f", restart to apply {', '.join(restart_required)}"
+
+        return jsonify({
+            'success': True,
+            'message': message,
+            'changed': changed,
+            'restart_required': restart_required
+        })
+
+    except configuration.ConfigError as e:
+        return jsonify({
+            'success': False,
+            'message': f'Invalid configuration, nothing was changed: {str(e)}',
+            'errors': e.errors
+        }), 400
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error reloading configuration: {str(e)}'
+        }), 500
+
+def reload_config_on_signal():
+    try:
+        changed, restart_required = reload_config()
+        print(f"Configuration reloaded, changed: {', '.join(changed) or 'nothing'}")
+        if restart_required:
+            print(f"Restart to apply: {', '.join(restart_required)}")
+    except Exception as e:
+        print(f"Error reloading configuration: {e}")
+
+if hasattr(signal, 'SIGHUP') and threading.current_thread() is threading.main_thread():
+    # `kill -HUP <pid>` reloads config.yml, off the signal handler so locks can't deadlock
+    signal.signal(signal.SIGHUP, lambda signum, frame: threading.Thread(
+        target=reload_config_on_signal, name='reload-config', daemon=True).start())
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=int(config.get("port", 5000)), debug=DEBUG_MODE)
+    try:
+        from waitress import serve
+    except ImportError:
+        serve = None
+        if not DEBUG_MODE:
+            print("waitress is not installed (pip install -r requirements.txt), "
+                  "falling back to Flask's development server without server.threads")
+
+    startup_step('serving')
+
+    if serve is not None and not DEBUG_MODE:
+        # Each live view and /events stream holds a thread for as long as it is open
+        long_lived['limit'] = max(1, config['server']['threads'] - RESERVED_THREADS)
+        # Without lookahead waitress doesn't read from a busy connection, so it
+        # never notices a viewer closing the tab and keeps the thread forever
+        serve(app, host='0.0.0.0', port=config['port'], threads=config['server']['threads'],
+              channel_request_lookahead=1)
+    else:
+        # The reloader would run the module, and with it camera, storage,
+        # uploader and retention startup, a second time in a child process
+        app.run(host='0.0.0.0', port=config['port'], debug=DEBUG_MODE, threaded=True, use_reloader=False)
@@ -3,8 +3,10 @@
 cd /home/pi/mintcam
 source .venv/bin/activate
 
-./autostart/update.sh
+# Updates apply on the next restart, don't hold up startup waiting for the network
+./autostart/update.sh &
 
 ./autostart/wifi.sh
 
-python app.py
+# exec so systemd signals (e.g. SIGHUP to reload config.yml) reach the app
+exec python app.py
@@ -1,10 +1,13 @@
 #!/bin/bash
 
-CONFIG_FILE="config.yml"
+# Settings are read through the validated config model
+config() {
+    python3 configuration.py get "$1"
+}
 
-wifi=$(grep "^wifi:" "$CONFIG_FILE" | awk '{print $2}')
-ssid=$(grep "^wifi_ssid:" "$CONFIG_FILE" | sed 's/wifi_ssid:[ ]*//; s/"//g')
-password=$(grep "^wifi_password:" "$CONFIG_FILE" | sed 's/wifi_password:[ ]*//; s/"//g')
+wifi=$(config wifi) || exit 1
+ssid=$(config wifi_ssid)
+password=$(config wifi_password)
 
 # debug
 echo "wifi=$wifi"
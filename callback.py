@@ -1,31 +1,76 @@
+import time
+# Taken before the other imports, importing requests alone is slow on a Pi Zero
+script_started = time.time()
+
 import requests, os, sys
 from datetime import datetime
 import json
+import uuid
 
 log_folder_path = "logs/"
 log_file_name = "log.txt"
 log_file_path = log_folder_path + log_file_name
 
+def process_start_time():
+    """Returns when this process was started, None where /proc is missing."""
+    try:
+        with open('/proc/self/stat') as file:
+            # Fields are counted after the command name, which may contain spaces
+            start_ticks = int(file.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as file:
+            uptime = float(file.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return time.time() - uptime + start_ticks / os.sysconf('SC_CLK_TCK')
+
+# Trace of this capture, continued by the app (see tracing.py). gpio_trigger.py
+# passes its own, without a terminal attached we were started by cron
+source = os.environ.get('MINTCAM_TRACE_SOURCE') or ('manual' if sys.stdin.isatty() else 'cron')
+trace_id = os.environ.get('MINTCAM_TRACE_ID') or uuid.uuid4().hex[:16]
+try:
+    stages = json.loads(os.environ.get('MINTCAM_TRACE_STAGES') or '{}')
+except ValueError:
+    stages = {}
+process_started = process_start_time()
+if process_started is not None:
+    if source == 'cron':
+        # Cron starts jobs on the minute
+        stages['scheduled'] = process_started // 60 * 60
+    stages['process_started'] = process_started
+stages['script_started'] = script_started
+
 # Get recording type from command line arguments
 record_type = sys.argv[1] if len(sys.argv) > 1 else 'picture'
 duration = int(sys.argv[2]) if len(sys.argv) > 2 else 30
 
+def trace_headers():
+    stages['request_sent'] = time.time()
+    return {
+        'X-Trace-Id': trace_id,
+        'X-Trace-Source': source,
+        'X-Trace-Stages': json.dumps(stages),
+    }
+
 # Determine URL and data based on recording type
 if record_type == 'video':
     url = 'http://localhost:5000/record_video'
     data = {'duration': duration}
-    headers = {'Content-Type': 'application/json'}
+    headers = {'Content-Type': 'application/json', **trace_headers()}
     response = requests.post(url, data=json.dumps(data), headers=headers)
     action_text = f"recorded {duration}s video"
 else:
     url = 'http://localhost:5000/take_picture'
-    data = {}
-    response = requests.post(url, data)
+    # The app may skip pictures that match the previous one (change_detection)
+    data = {'skip_unchanged': 'true'}
+    response = requests.post(url, data, headers=trace_headers())
     action_text = "took picture"
+stages['response_received'] = time.time()
 
 if response.status_code == 200:
     response_data = response.json()
     print(response_data)
+    if response_data.get('skipped'):
+        action_text = "skipped unchanged picture"
 else:
     print(f"Request failed with status code {response.status_code}")
     response_data = {"error": f"HTTP {response.status_code}"}
@@ -34,6 +79,10 @@ else:
 os.makedirs(log_folder_path, exist_ok=True)
 now = datetime.now()
 current_time = now.strftime("%H:%M:%S")
+# The app's stages are in /traces?source=<source>, these are the ones it can't see
+first_stage = min(stages.values())
+timings = ' '.join(f"{name}=+{(when - first_stage) * 1000:.0f}ms"
+                   for name, when in sorted(stages.items(), key=lambda item: item[1]))
 
 with open(log_file_path, 'a') as file:
-    file.write(f"{action_text} at {current_time} {response_data}\n")
+    file.write(f"{action_text} at {current_time} {response_data} trace={trace_id} {timings}\n")
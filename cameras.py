@@ -0,0 +1,410 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Seconds capture_frame() waits for the next frame before giving up
+FRAME_TIMEOUT = 5.0
+
+
+class CameraBackend:
+    """
+    Source of BGR frames for the live stream, pictures and recordings.
+
+    Backends without a hardware encoder (has_encoder False) are recorded by
+    writing their frames in software.
+    """
+
+    name = None
+    has_encoder = False
+
+    def __init__(self, camera_config):
+        self.camera_config = camera_config
+        self.settings = None
+
+    def start(self, settings):
+        """Opens the camera at settings (width, height, fps)."""
+        raise NotImplementedError
+
+    def reconfigure(self, settings):
+        """Switches to new settings, restarting only if the frame size changes."""
+        raise NotImplementedError
+
+    def configure(self, mode='video'):
+        """Makes sure the camera runs in mode, a no-op for most backends."""
+        return False
+
+    def reset(self):
+        """Restarts the stream after a failed recording."""
+
+    def capture_frame(self, label=None):
+        """Returns the next frame of the running stream as a BGR array."""
+        raise NotImplementedError
+
+    def capture_still(self, label=None):
+        """Returns a full quality still as a BGR array."""
+        return self.capture_frame(label)
+
+    @contextmanager
+    def frame_view(self):
+        """
+        Yields the next frame without copying it, e.g. for the live stream.
+
+        The array is only valid inside the with block and must not be modified.
+        """
+        yield self.capture_frame()
+
+    def close(self):
+        pass
+
+
+class Picamera2Backend(CameraBackend):
+    """Raspberry Pi camera through picamera2, with the hardware H.264 encoder."""
+
+    name = 'picamera2'
+    has_encoder = True
+
+    def __init__(self, camera_config):
+        super().__init__(camera_config)
+        # Importing picamera2 alone takes seconds on a Pi Zero
+        from picamera2 import Picamera2
+
+        # Boards with two CSI ports number their cameras from 0
+        self.picam2 = Picamera2(camera_config.get('camera_num', 0))
+        # Built configurations, keyed by (mode, width, height), so switching
+        # between stream and still modes doesn't rebuild identical objects
+        self.configs = {}
+        # Key of the configuration the camera is currently running with
+        self.active_key = None
+        # Serializes reconfiguration between request threads
+        self.lock = threading.RLock()
+
+    def get_config(self, mode='video'):
+        key = (mode, self.settings['width'], self.settings['height'])
+        if key not in self.configs:
+            main = {'format': 'RGB888', 'size': (self.settings['width'], self.settings['height'])}
+            if mode == 'still':
+                self.configs[key] = self.picam2.create_still_configuration(main=main)
+            else:
+                self.configs[key] = self.picam2.create_video_configuration(main=main)
+        cam_config = self.configs[key]
+        if mode == 'video':
+            # Frame rate is not part of the cache key, keep it in sync with the
+            # settings. Set as FrameDurationLimits, which picamera2 already puts
+            # in video configurations, so no FrameRate can contradict it
+            cam_config['controls']['FrameDurationLimits'] = self.frame_duration_limits()
+        return cam_config
+
+    def frame_duration_limits(self):
+        frame_duration = int(1000000 / self.settings['fps'])
+        return (frame_duration, frame_duration)
+
+    def configure(self, mode='video'):
+        """
+        Switches the camera to the given mode at the current resolution.
+
+        Does nothing if that configuration is already running, so callers can
+        invoke it freely without paying for a stop/configure/start cycle.
+
+        Returns:
+            bool: True if the camera had to be reconfigured
+        """
+        key = (mode, self.settings['width'], self.settings['height'])
+        with self.lock:
+            if self.active_key == key:
+                return False
+            if self.picam2.started:
+                self.picam2.stop()
+            self.picam2.configure(self.get_config(mode))
+            self.picam2.start()
+            self.active_key = key
+            return True
+
+    def start(self, settings):
+        self.settings = dict(settings)
+        self.configure('video')
+
+    def reconfigure(self, settings):
+        # Under the lock as a whole, so a still capture or another reconfigure
+        # never sees the new settings with the old configuration running
+        with self.lock:
+            old_settings, self.settings = self.settings, dict(settings)
+            if (settings['width'], settings['height']) != (old_settings['width'], old_settings['height']):
+                self.configure('video')
+            elif settings['fps'] != old_settings['fps']:
+                # Frame rate is a runtime control, no restart needed
+                self.get_config('video')
+                self.picam2.set_controls({'FrameDurationLimits': self.frame_duration_limits()})
+
+    def reset(self):
+        with self.lock:
+            self.active_key = None
+            self.configure('video')
+
+    def capture_frame(self, label=None):
+        # RGB888 frames are stored in BGR order
+        return self.picam2.capture_array('main')
+
+    def capture_still(self, label=None):
+        with self.lock:
+            return self.picam2.switch_mode_and_capture_array(self.get_config('still'), 'main')
+
+    @contextmanager
+    def frame_view(self):
+        # Maps the camera's own buffer instead of copying it out like
+        # capture_array(), the buffer goes back to the camera afterwards
+        from picamera2 import MappedArray
+
+        request = self.picam2.capture_request()
+        try:
+            with MappedArray(request, 'main') as mapped:
+                yield mapped.array
+        finally:
+            request.release()
+
+    def close(self):
+        self.picam2.close()
+
+
+class ThreadedBackend(CameraBackend):
+    """
+    Reads frames on a background thread and hands the newest one to every
+    caller, so several consumers share one capture loop.
+
+    Frames are shared between callers and must not be modified in place.
+    """
+
+    # Whether the reader thread sleeps to hold the configured frame rate
+    paced = False
+
+    def __init__(self, camera_config):
+        super().__init__(camera_config)
+        self._condition = threading.Condition()
+        self._frame = None
+        self._sequence = 0
+        self._thread = None
+        self._stop_event = threading.Event()
+        self.error = None
+
+    def _open(self):
+        raise NotImplementedError
+
+    def _read(self):
+        """Returns the next frame, or None if none was available."""
+        raise NotImplementedError
+
+    def _release(self):
+        pass
+
+    def _run(self):
+        next_frame = time.monotonic()
+        while not self._stop_event.is_set():
+            try:
+                frame = self._read()
+            except Exception as e:
+                frame = None
+                self.error = str(e)
+                print(f"Camera {self.name}: error reading frame: {e}")
+            if frame is None:
+                self._stop_event.wait(0.1)
+                continue
+
+            with self._condition:
+                self._frame = frame
+                self._sequence += 1
+                self._condition.notify_all()
+
+            if self.paced:
+                next_frame += 1.0 / self.settings['fps']
+                delay = next_frame - time.monotonic()
+                if delay > 0:
+                    self._stop_event.wait(delay)
+                else:
+                    # Fell behind, drop the missed frames like a sensor would
+                    next_frame = time.monotonic()
+
+    def start(self, settings):
+        self.settings = dict(settings)
+        self._open()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name=f'camera-{self.name}', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+        self._release()
+
+    def reconfigure(self, settings):
+        if (settings['width'], settings['height']) == (self.settings['width'], self.settings['height']):
+            # Only the pacing changes
+            self.settings = dict(settings)
+            self._set_frame_rate(settings['fps'])
+            return
+        self.stop()
+        self.start(settings)
+
+    def _set_frame_rate(self, fps):
+        pass
+
+    def capture_frame(self, label=None):
+        with self._condition:
+            sequence = self._sequence
+            if not self._condition.wait_for(lambda: self._sequence != sequence, timeout=FRAME_TIMEOUT):
+                raise RuntimeError(f'No frame from the {self.name} camera within {FRAME_TIMEOUT}s')
+            return self._frame
+
+    def close(self):
+        self.stop()
+
+
+class OpenCVBackend(ThreadedBackend):
+    """USB webcams and other V4L2 devices through OpenCV."""
+
+    name = 'opencv'
+
+    def __init__(self, camera_config):
+        super().__init__(camera_config)
+        self.capture = None
+
+    def _open(self):
+        import cv2
+
+        device = self.camera_config.get('device', 0)
+        api = cv2.CAP_V4L2 if os.name == 'posix' and isinstance(device, int) else cv2.CAP_ANY
+        self.capture = cv2.VideoCapture(device, api)
+        if not self.capture.isOpened():
+            raise RuntimeError(f'Could not open video device {device}')
+        self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, self.settings['width'])
+        self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, self.settings['height'])
+        self._set_frame_rate(self.settings['fps'])
+
+    def _set_frame_rate(self, fps):
+        import cv2
+
+        self.capture.set(cv2.CAP_PROP_FPS, fps)
+
+    def _read(self):
+        # Blocks until the device delivers the next frame
+        ok, frame = self.capture.read()
+        return frame if ok else None
+
+    def _release(self):
+        if self.capture is not None:
+            self.capture.release()
+            self.capture = None
+
+
+class FileBackend(ThreadedBackend):
+    """Replays a video file in a loop at the configured frame rate."""
+
+    name = 'file'
+    paced = True
+
+    def __init__(self, camera_config):
+        super().__init__(camera_config)
+        self.capture = None
+
+    def _open(self):
+        import cv2
+
+        path = self.camera_config.get('file')
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise RuntimeError(f'Could not open video file {path}')
+
+    def _read(self):
+        import cv2
+
+        ok, frame = self.capture.read()
+        if not ok:
+            # Start over at the end of the file
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self.capture.read()
+            if not ok:
+                return None
+        size = (self.settings['width'], self.settings['height'])
+        if (frame.shape[1], frame.shape[0]) != size:
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        return frame
+
+    def _release(self):
+        if self.capture is not None:
+            self.capture.release()
+            self.capture = None
+
+
+class SyntheticBackend(ThreadedBackend):
+    """
+    Moving test pattern at the configured size and frame rate.
+
+    The pattern carries gradients and fixed noise, so JPEG and H.264 sizes
+    and encoding times are close to real camera frames.
+    """
+
+    name = 'synthetic'
+    paced = True
+
+    def __init__(self, camera_config):
+        super().__init__(camera_config)
+        self.pattern = None
+        self.frame_number = 0
+
+    def _open(self):
+        import numpy as np
+
+        width, height = self.settings['width'], self.settings['height']
+        x = np.linspace(0, 255, width, dtype=np.float32)
+        y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+        pattern = np.empty((height, width, 3), dtype=np.float32)
+        pattern[..., 0] = x
+        pattern[..., 1] = y
+        pattern[..., 2] = (x + y) / 2
+        # Same noise every frame, generating it per frame would dominate the CPU
+        noise = np.random.default_rng(0).integers(-24, 24, (height, width, 3), dtype=np.int16)
+        self.pattern = np.clip(pattern + noise, 0, 255).astype(np.uint8)
+        self.frame_number = 0
+
+    def _read(self):
+        import cv2
+        import numpy as np
+
+        width, height = self.settings['width'], self.settings['height']
+        self.frame_number += 1
+        # Scroll the pattern so consecutive frames differ like real motion
+        frame = np.roll(self.pattern, (self.frame_number * 4) % width, axis=1)
+        scale = max(0.5, width / 1280)
+        cv2.putText(frame, datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3],
+                    (width // 20, height // 10), cv2.FONT_HERSHEY_SIMPLEX, scale, (255, 255, 255), 2)
+        cv2.putText(frame, f'{width}x{height} {self.settings["fps"]}fps #{self.frame_number}',
+                    (width // 20, height // 10 + int(40 * scale)), cv2.FONT_HERSHEY_SIMPLEX,
+                    scale * 0.7, (255, 255, 255), 2)
+        return frame
+
+    def capture_frame(self, label=None):
+        frame = super().capture_frame()
+        if label:
+            import cv2
+
+            # The frame is shared with other callers, draw on a copy
+            frame = frame.copy()
+            height = frame.shape[0]
+            cv2.putText(frame, label, (50, height // 2),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        return frame
+
+
+BACKENDS = {
+    'picamera2': Picamera2Backend,
+    'opencv': OpenCVBackend,
+    'file': FileBackend,
+    'synthetic': SyntheticBackend,
+}
+
+
+def create(backend, camera_config):
+    """Returns an unstarted backend by name, e.g. 'synthetic'."""
+    return BACKENDS[backend](camera_config)
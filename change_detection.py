@@ -0,0 +1,105 @@
+import threading
+import time
+
+# Size of the grayscale thumbnail frames are compared at, small enough that
+# sensor noise averages out
+THUMBNAIL_SIZE = (32, 24)
+
+settings = {
+    'enabled': False,
+    'threshold': 2.0,
+    'action': 'skip',
+    'max_interval_minutes': 60,
+}
+
+# Per camera: thumbnail and time of the last stored picture, plus counters
+_cameras = {}
+_lock = threading.Lock()
+
+
+def configure(change_config):
+    """Applies the `change_detection` section of config.yml."""
+    with _lock:
+        for key in settings:
+            if key in (change_config or {}):
+                settings[key] = change_config[key]
+
+
+def thumbnail(frame):
+    """Returns a small grayscale version of a BGR frame."""
+    import cv2
+
+    # Subsample before converting, so full sensor frames stay cheap
+    step = max(1, frame.shape[1] // (THUMBNAIL_SIZE[0] * 4))
+    small = frame[::step, ::step]
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+
+
+def difference(a, b):
+    """Returns the mean difference of two thumbnails in percent."""
+    import cv2
+
+    return float(cv2.absdiff(a, b).mean()) * 100 / 255
+
+
+def _camera(name):
+    if name not in _cameras:
+        _cameras[name] = {
+            'thumbnail': None,
+            'stored': None,
+            'checked': 0,
+            'skipped': 0,
+            'marked': 0,
+        }
+    return _cameras[name]
+
+
+def check(camera, frame, now=None):
+    """
+    Compares frame with the last stored picture of camera.
+
+    Frames count as unchanged when their thumbnails differ by less than
+    threshold percent, unless max_interval_minutes have passed since the
+    last stored picture. A changed frame only becomes the new reference
+    once it is written, through commit().
+
+    Returns:
+        tuple: (action, difference, thumbnail), action is None to store the
+            picture normally, 'skip' or 'mark'. difference is None if there
+            was no reference yet
+    """
+    now = time.time() if now is None else now
+    current = thumbnail(frame)
+    with _lock:
+        state = _camera(camera)
+        state['checked'] += 1
+        diff = None if state['thumbnail'] is None else difference(current, state['thumbnail'])
+        # Store one picture every max_interval_minutes even if nothing changes
+        max_interval = settings['max_interval_minutes']
+        overdue = bool(max_interval) and state['stored'] is not None \
+            and now - state['stored'] >= max_interval * 60
+        if diff is not None and diff < settings['threshold'] and not overdue:
+            action = settings['action']
+            state['skipped' if action == 'skip' else 'marked'] += 1
+            return action, diff, current
+        return None, diff, current
+
+
+def commit(camera, thumbnail, now):
+    """Makes a stored picture the reference for the next check() of camera."""
+    with _lock:
+        state = _camera(camera)
+        # A slower write of an older picture doesn't replace a newer reference
+        if state['stored'] is None or now >= state['stored']:
+            state['thumbnail'] = thumbnail
+            state['stored'] = now
+
+
+def status():
+    with _lock:
+        return {
+            **settings,
+            'cameras': {name: {key: value for key, value in state.items() if key != 'thumbnail'}
+                        for name, state in _cameras.items()},
+        }
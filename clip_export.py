@@ -0,0 +1,148 @@
+import os
+import subprocess
+import tempfile
+import threading
+from datetime import timedelta
+
+import storage
+
+# Containers ffmpeg can stream-copy from
+EXPORTABLE_EXTENSIONS = ('.mp4', '.mov')
+MAX_CLIP_SECONDS = 3600
+CHUNK_SIZE = 64 * 1024
+
+# Durations by (filepath, mtime), probing a file costs a process spawn
+_durations = {}
+_durations_lock = threading.Lock()
+
+
+class ClipError(Exception):
+    pass
+
+
+class NoRecordingsFound(ClipError):
+    pass
+
+
+def probe_duration(filepath):
+    """Returns the duration of a recording in seconds, or None if unknown."""
+    try:
+        mtime = os.path.getmtime(filepath)
+    except OSError:
+        return None
+    key = (filepath, mtime)
+    with _durations_lock:
+        if key in _durations:
+            return _durations[key]
+
+    result = subprocess.run([
+        'ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+        '-of', 'default=noprint_wrappers=1:nokey=1', filepath
+    ], capture_output=True, text=True)
+    try:
+        duration = float(result.stdout.strip())
+    except ValueError:
+        duration = None
+
+    with _durations_lock:
+        _durations[key] = duration
+    return duration
+
+
+def find_recordings(videos_dir, start, end):
+    """
+    Returns [(filepath, recording start, duration)] of the recordings that
+    overlap start..end, ordered by time.
+    """
+    recordings = []
+    # A recording that began the day before can still run into start
+    day = (start - timedelta(days=1)).date()
+    while day <= end.date():
+        directory = storage.day_dir(videos_dir, day.isoformat())
+        for entry in storage.scan_dir(directory, EXPORTABLE_EXTENSIONS):
+            if entry.name.startswith('timelapse_'):
+                # Timelapses don't play in real time, they can't be cut by wall clock
+                continue
+            began = storage.timestamp_from_filename(entry.name)
+            if began is None or began >= end:
+                continue
+            duration = probe_duration(entry.path)
+            if duration is None or began + timedelta(seconds=duration) <= start:
+                continue
+            recordings.append((entry.path, began, duration))
+        day += timedelta(days=1)
+    recordings.sort(key=lambda recording: recording[1])
+    return recordings
+
+
+def build_concat_list(recordings, start, end):
+    """
+    Builds an ffmpeg concat demuxer script covering start..end.
+
+    With stream copy ffmpeg starts each file at the keyframe at or before
+    inpoint, so the clip may begin slightly early but is never re-encoded.
+    """
+    lines = ['ffconcat version 1.0']
+    for filepath, began, duration in recordings:
+        path = os.path.abspath(filepath).replace("'", "'\\''")
+        lines.append(f"file '{path}'")
+        inpoint = (start - began).total_seconds()
+        outpoint = (end - began).total_seconds()
+        if inpoint > 0:
+            lines.append(f'inpoint {inpoint:.3f}')
+        if outpoint < duration:
+            lines.append(f'outpoint {outpoint:.3f}')
+    return '\n'.join(lines) + '\n'
+
+
+def export_clip(videos_dir, start, end):
+    """
+    Starts exporting start..end as a fragmented MP4.
+
+    Returns:
+        generator: Yields the MP4 bytes as ffmpeg produces them
+
+    Raises:
+        ClipError: If the range is invalid or no recording covers it
+    """
+    if end <= start:
+        raise ClipError('End must be after start')
+    if (end - start).total_seconds() > MAX_CLIP_SECONDS:
+        raise ClipError(f'Clips can be at most {MAX_CLIP_SECONDS} seconds long')
+
+    recordings = find_recordings(videos_dir, start, end)
+    if not recordings:
+        raise NoRecordingsFound('No recordings found in that time range')
+
+    list_file = tempfile.NamedTemporaryFile('w', suffix='.ffconcat', delete=False)
+    list_file.write(build_concat_list(recordings, start, end))
+    list_file.close()
+
+    # Fragmented MP4 can be written to a pipe, no seeking back for the moov atom
+    process = subprocess.Popen([
+        'ffmpeg', '-hide_banner', '-loglevel', 'error',
+        '-f', 'concat', '-safe', '0', '-i', list_file.name,
+        '-c', 'copy', '-movflags', 'frag_keyframe+empty_moov+default_base_moof',
+        '-f', 'mp4', 'pipe:1'
+    ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def generate():
+        try:
+            while True:
+                chunk = process.stdout.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+            process.wait()
+            if process.returncode != 0:
+                print(f"Clip export failed: {process.stderr.read().decode(errors='replace')}")
+        finally:
+            # Client went away or export finished
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+            process.stderr.close()
+            os.remove(list_file.name)
+
+    return generate()
@@ -0,0 +1,369 @@
+import copy
+import re
+import sys
+
+import yaml
+
+CONFIG_FILE = 'config.yml'
+
+# Sections that are only read at startup, changing them needs a restart
+RESTART_REQUIRED = ('debug_mode', 'port', 'paths', 'server', 'cameras', 'wifi', 'wifi_ssid', 'wifi_password')
+
+RESOLUTION_PATTERN = re.compile(r'^(\d+)x(\d+)x(\d+)$')
+# Camera names end up in URLs and folder names, and must not look like a year folder
+CAMERA_NAME_PATTERN = re.compile(r'^[a-z][a-z0-9_-]{0,31}$')
+
+
+class ConfigError(ValueError):
+    """Raised with the list of every invalid setting found."""
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+    def __str__(self):
+        return '; '.join(self.errors)
+
+
+# Validators take a value and return it normalized, or raise ValueError
+
+def boolean(value):
+    if not isinstance(value, bool):
+        raise ValueError('must be true or false')
+    return value
+
+
+def string(value):
+    if not isinstance(value, (str, int, float)) or isinstance(value, bool):
+        raise ValueError('must be a string')
+    return str(value)
+
+
+def integer(minimum=None, maximum=None):
+    def validate(value):
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or int(value) != value:
+            raise ValueError('must be a whole number')
+        value = int(value)
+        if minimum is not None and value < minimum:
+            raise ValueError(f'must be at least {minimum}')
+        if maximum is not None and value > maximum:
+            raise ValueError(f'must be at most {maximum}')
+        return value
+    return validate
+
+
+def number(minimum=None, maximum=None):
+    def validate(value):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError('must be a number')
+        if minimum is not None and value < minimum:
+            raise ValueError(f'must be at least {minimum}')
+        if maximum is not None and value > maximum:
+            raise ValueError(f'must be at most {maximum}')
+        return value
+    return validate
+
+
+def optional(validator):
+    def validate(value):
+        return None if value is None else validator(value)
+    return validate
+
+
+def choice(*choices):
+    def validate(value):
+        if value not in choices:
+            raise ValueError(f"must be one of {', '.join(choices)}")
+        return value
+    return validate
+
+
+def resolution(value):
+    if not isinstance(value, str) or not RESOLUTION_PATTERN.match(value):
+        raise ValueError('must look like WIDTHxHEIGHTxFPS, e.g. 640x480x30')
+    return value
+
+
+def device(value):
+    # A V4L2 index (0 for /dev/video0) or a device path / stream URL
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError('must be a device number or path')
+    return value
+
+
+def camera_name(value):
+    if not isinstance(value, str) or not CAMERA_NAME_PATTERN.match(value):
+        raise ValueError('must start with a lowercase letter and contain only a-z, 0-9, _ and -')
+    return value
+
+
+def list_of(validator):
+    def validate(value):
+        if not isinstance(value, list) or not value:
+            raise ValueError('must be a non-empty list')
+        result = []
+        errors = []
+        for number, item in enumerate(value):
+            try:
+                result.append(validator(item))
+            except ConfigError as e:
+                errors.extend(f'{number}.{error}' for error in e.errors)
+            except ValueError as e:
+                errors.append(f'{number}: {e}')
+        if errors:
+            raise ConfigError(errors)
+        return result
+    return validate
+
+
+def resolution_list(value):
+    if not isinstance(value, list) or not value:
+        raise ValueError('must be a non-empty list')
+    return [resolution(item) for item in value]
+
+
+def section(schema, allow_unknown=False):
+    """
+    Validates a mapping against schema, a dict of key -> (validator, default).
+    """
+    def validate(value):
+        if value is None:
+            value = {}
+        if not isinstance(value, dict):
+            raise ValueError('must be a mapping')
+        result = dict(value) if allow_unknown else {}
+        errors = []
+        for key in value:
+            if key not in schema and not allow_unknown:
+                errors.append(f'{key}: unknown setting')
+        for key, (validator, default) in schema.items():
+            try:
+                # Defaults go through the validator too, so nested sections get theirs
+                result[key] = validator(value[key] if key in value else copy.deepcopy(default))
+            except ConfigError as e:
+                errors.extend(f'{key}.{error}' for error in e.errors)
+            except ValueError as e:
+                errors.append(f'{key}: {e}')
+        if errors:
+            raise ConfigError(errors)
+        return result
+    return validate
+
+
+FOLDER_LIMITS = section({
+    'max_mb': (optional(number(0)), None),
+    'max_age_days': (optional(number(0)), None),
+})
+
+SCHEMA = section({
+    'name': (string, 'mintcam'),
+    'debug_mode': (boolean, True),
+    'port': (integer(1, 65535), 5000),
+    'wifi': (boolean, False),
+    'wifi_ssid': (string, 'mintcam'),
+    'wifi_password': (string, ''),
+    'camera': (section({
+        # null picks synthetic in debug mode and picamera2 otherwise
+        'backend': (optional(choice('picamera2', 'opencv', 'file', 'synthetic')), None),
+        'device': (device, 0),
+        'file': (optional(string), None),
+        'resolution': (resolution, '640x480x30'),
+        'resolutions': (resolution_list, ['640x480x30', '1536x864x30', '2304x1296x30', '4608x2592x30']),
+    }), {}),
+    # Several cameras in one process, fields left out are taken from `camera`.
+    # null means a single camera named main configured by `camera`
+    'cameras': (optional(list_of(section({
+        'name': (camera_name, None),
+        'backend': (optional(choice('picamera2', 'opencv', 'file', 'synthetic')), None),
+        'camera_num': (integer(0), 0),
+        'device': (optional(device), None),
+        'file': (optional(string), None),
+        'resolution': (optional(resolution), None),
+    }))), None),
+    'stream': (section({
+        'jpeg_quality': (integer(1, 100), 85),
+    }), {}),
+    'capture': (section({
+        'jpeg_quality': (integer(1, 100), 95),
+    }), {}),
+    'paths': (section({
+        'pictures': (string, 'pictures'),
+        'videos': (string, 'videos'),
+        'proxies': (string, 'proxies'),
+    }), {}),
+    'server': (section({
+        # Live views and /events streams hold one each while open
+        'threads': (integer(1, 64), 16),
+    }), {}),
+    'retention': (section({
+        'interval': (integer(1), 60),
+        'min_free_mb': (optional(number(0)), None),
+        'pictures': (FOLDER_LIMITS, {}),
+        'videos': (FOLDER_LIMITS, {}),
+    }), {}),
+    # Target specific keys (bucket, host, ...) are checked by the target itself
+    'upload': (section({
+        'enabled': (boolean, False),
+        'target': (choice('directory', 's3', 'sftp'), 'directory'),
+        'bandwidth_kbps': (optional(number(0)), None),
+        'chunk_mb': (number(0.0625), 4),
+        'queue_file': (string, 'uploads.json'),
+        'delete_after_upload': (boolean, False),
+        'retry_delay': (integer(1), 30),
+    }, allow_unknown=True), {}),
+    # Scheduled pictures (callback.py) that barely differ from the last stored one
+    'change_detection': (section({
+        'enabled': (boolean, False),
+        # Mean difference of downscaled grayscale frames, in percent
+        'threshold': (number(0, 100), 2.0),
+        'action': (choice('skip', 'mark'), 'skip'),
+        # Stores a picture at least this often anyway, 0 never forces one
+        'max_interval_minutes': (number(0), 60),
+    }), {}),
+    # Per capture latency from trigger to file, see /traces and /trace_stats
+    'tracing': (section({
+        'enabled': (boolean, True),
+        'path': (string, 'logs/traces.jsonl'),
+        # The log is rotated at this size, keeping backups older files
+        'max_kb': (integer(16), 1024),
+        'backups': (integer(0, 20), 3),
+        # Traces are written in one batch this often, or once flush_count are waiting
+        'flush_seconds': (number(0.1, 3600), 5),
+        'flush_count': (integer(1), 50),
+    }), {}),
+    # Low bitrate copies of finished videos for phones, ?quality=proxy
+    'proxies': (section({
+        'enabled': (boolean, True),
+        'width': (integer(160, 1920), 640),
+        # x264 constant rate factor, higher is smaller
+        'crf': (integer(0, 51), 28),
+        'pause_while_recording': (boolean, True),
+    }), {}),
+    # Lowers live stream quality before the Pi throttles, recordings are not affected
+    'governor': (section({
+        'enabled': (boolean, True),
+        'interval': (number(0.5, 3600), 5),
+        'temperature_high': (number(), 75),
+        'temperature_low': (number(), 68),
+        'load_high': (number(0), 1.5),
+        'load_low': (number(0), 1.0),
+        'encode_high': (number(0, 1), 0.8),
+        'encode_low': (number(0, 1), 0.5),
+        'recover_seconds': (number(0), 30),
+        # Pins the temperature for testing, null reads the SoC sensor
+        'simulated_temperature': (optional(number()), None),
+    }), {}),
+    'timelapse': (section({
+        'interval': (number(1, 24 * 3600), 10),
+        'fps': (integer(1, 60), 25),
+        'save_pictures': (boolean, False),
+        'lock_exposure': (boolean, True),
+    }), {}),
+}, allow_unknown=True)
+
+
+def validate(raw):
+    """
+    Checks a parsed config.yml and fills in defaults.
+
+    Raises:
+        ConfigError: Listing every invalid setting
+    """
+    config = SCHEMA(raw)
+    if config['camera']['backend'] is None:
+        config['camera']['backend'] = 'synthetic' if config['debug_mode'] else 'picamera2'
+    if config['camera']['backend'] == 'file' and not config['camera']['file']:
+        raise ConfigError(['camera.file: is required by the file backend'])
+    if config['camera']['resolution'] not in config['camera']['resolutions']:
+        raise ConfigError(['camera.resolution: must be one of camera.resolutions'])
+
+    if config['cameras'] is None:
+        config['cameras'] = [{'name': 'main', 'camera_num': 0, 'backend': None,
+                              'device': None, 'file': None, 'resolution': None}]
+    errors = []
+    for number, camera in enumerate(config['cameras']):
+        for field in ('backend', 'device', 'file', 'resolution'):
+            if camera[field] is None:
+                camera[field] = config['camera'][field]
+        if camera['resolution'] not in config['camera']['resolutions']:
+            errors.append(f'cameras.{number}.resolution: must be one of camera.resolutions')
+        if camera['backend'] == 'file' and not camera['file']:
+            errors.append(f'cameras.{number}.file: is required by the file backend')
+    names = [camera['name'] for camera in config['cameras']]
+    if len(set(names)) != len(names):
+        errors.append('cameras: names must be unique')
+    if errors:
+        raise ConfigError(errors)
+    governor = config['governor']
+    if governor['temperature_low'] >= governor['temperature_high'] \
+            or governor['load_low'] >= governor['load_high'] \
+            or governor['encode_low'] >= governor['encode_high']:
+        raise ConfigError(['governor: every *_low threshold must be below its *_high threshold'])
+    if config['wifi'] and len(config['wifi_password']) < 8:
+        raise ConfigError(['wifi_password: must be at least 8 characters for the hotspot'])
+    return config
+
+
+def load(path=CONFIG_FILE):
+    """Reads and validates config.yml, a missing file gives the defaults."""
+    try:
+        with open(path, 'r') as file:
+            raw = yaml.safe_load(file)
+    except FileNotFoundError:
+        raw = {}
+    except yaml.YAMLError as e:
+        raise ConfigError([f'{path}: {e}'])
+    return validate(raw)
+
+
+def resolution_presets(config):
+    """Returns the configured resolutions as {key: camera settings}."""
+    presets = {}
+    for key in config['camera']['resolutions']:
+        width, height, fps = (int(part) for part in RESOLUTION_PATTERN.match(key).groups())
+        presets[key] = {'width': width, 'height': height, 'fps': fps, 'hdr': False}
+    return presets
+
+
+# Camera settings that take effect when the backend is opened
+CAMERA_RESTART_FIELDS = ('backend', 'device', 'file')
+
+
+def changed_sections(old, new):
+    """Returns the top level keys whose values differ between two configs."""
+    return sorted(key for key in set(old) | set(new) if old.get(key) != new.get(key))
+
+
+def get(config, dotted_key):
+    value = config
+    for key in dotted_key.split('.'):
+        value = value[key]
+    return value
+
+
+if __name__ == '__main__':
+    # Lets shell scripts read validated settings, e.g. `python3 configuration.py get wifi_ssid`
+    usage = 'Usage: python3 configuration.py check | get <key>'
+    if len(sys.argv) < 2 or sys.argv[1] not in ('check', 'get'):
+        print(usage)
+        sys.exit(2)
+    try:
+        loaded = load()
+    except ConfigError as e:
+        for error in e.errors:
+            print(f'config.yml: {error}', file=sys.stderr)
+        sys.exit(1)
+    if sys.argv[1] == 'check':
+        print('config.yml is valid')
+    elif len(sys.argv) != 3:
+        print(usage)
+        sys.exit(2)
+    else:
+        try:
+            value = get(loaded, sys.argv[2])
+        except (KeyError, TypeError):
+            print(f'Unknown setting: {sys.argv[2]}', file=sys.stderr)
+            sys.exit(1)
+        if isinstance(value, bool):
+            value = 'true' if value else 'false'
+        print('' if value is None else value)
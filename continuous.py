@@ -0,0 +1,226 @@
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+MIN_SEGMENT_SECONDS = 10
+MAX_SEGMENT_SECONDS = 3600
+
+state = {
+    'active': False,
+    'camera': None,
+    'segment_seconds': None,
+    'started': None,
+    'segments': 0,
+    'current': None,
+    'error': None,
+}
+
+_lock = threading.Lock()
+_encoder = None
+_output = None
+_debug_thread = None
+_stop_event = threading.Event()
+# Closed segments are remuxed one at a time so they don't compete with the camera
+_finisher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='segment')
+
+
+def is_active():
+    return state['active']
+
+
+def remux_to_mp4(h264_filepath, filepath, fps):
+    """
+    Wraps a raw H.264 stream into an MP4 container without re-encoding.
+
+    Falls back to renaming the raw stream if ffmpeg is unavailable.
+    """
+    if shutil.which('ffmpeg'):
+        result = subprocess.run([
+            'ffmpeg', '-framerate', str(fps), '-i', h264_filepath, '-c', 'copy',
+            '-f', 'mp4', '-y', filepath
+        ], capture_output=True, text=True)
+        if result.returncode == 0:
+            os.remove(h264_filepath)
+            return filepath
+        print(f"FFmpeg conversion failed: {result.stderr}")
+    else:
+        print("FFmpeg not found in PATH")
+    os.rename(h264_filepath, filepath)
+    return filepath
+
+
+def _finish_segment(h264_filepath, filepath, fps, on_segment):
+    try:
+        remux_to_mp4(h264_filepath, filepath, fps)
+        on_segment(filepath)
+    except Exception as e:
+        print(f"Error finishing segment {filepath}: {e}")
+
+
+def _make_segment_output(segment_seconds, fps, segment_path, on_segment):
+    from picamera2.outputs import Output
+
+    class SegmentOutput(Output):
+        """
+        Writes the encoder's stream to consecutive files, switching to a new
+        file on the first keyframe after segment_seconds, so no frame is lost
+        between segments.
+        """
+
+        def __init__(self):
+            super().__init__()
+            self.file = None
+            self.h264_filepath = None
+            self.filepath = None
+            self.opened_at = None
+
+        def _close(self):
+            if self.file is None:
+                return
+            self.file.close()
+            _finisher.submit(_finish_segment, self.h264_filepath, self.filepath, fps, on_segment)
+            self.file = None
+
+        def _open(self):
+            now = datetime.now()
+            self.filepath = segment_path(now)
+            self.h264_filepath = os.path.splitext(self.filepath)[0] + '.h264'
+            self.file = open(self.h264_filepath, 'wb')
+            self.opened_at = time.monotonic()
+            with _lock:
+                state['current'] = self.filepath
+                state['segments'] += 1
+
+        def outputframe(self, frame, keyframe=True, timestamp=None, *args, **kwargs):
+            if self.file is None or (keyframe and time.monotonic() - self.opened_at >= segment_seconds):
+                if self.file is not None or keyframe:
+                    self._close()
+                    self._open()
+            if self.file is not None:
+                self.file.write(frame)
+
+        def stop(self):
+            super().stop()
+            self._close()
+
+    return SegmentOutput()
+
+
+def _run_debug(segment_seconds, settings, capture_frame, segment_path, on_segment):
+    import cv2
+
+    width, height, fps = settings['width'], settings['height'], settings['fps']
+    interval = 1.0 / fps
+    writer = None
+    filepath = None
+    frames_in_segment = 0
+    next_frame = time.monotonic()
+    try:
+        while not _stop_event.is_set():
+            # Segment length is counted in frames so every second is covered exactly once
+            if writer is None or frames_in_segment >= segment_seconds * fps:
+                if writer is not None:
+                    writer.release()
+                    _finisher.submit(on_segment, filepath)
+                filepath = segment_path(datetime.now())
+                writer = cv2.VideoWriter(filepath, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+                frames_in_segment = 0
+                with _lock:
+                    state['current'] = filepath
+                    state['segments'] += 1
+
+            label = f'DVR {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}'
+            writer.write(capture_frame(label))
+            frames_in_segment += 1
+
+            next_frame += interval
+            delay = next_frame - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+    except Exception as e:
+        print(f"Continuous recording failed: {e}")
+        with _lock:
+            state['error'] = str(e)
+            state['active'] = False
+    finally:
+        if writer is not None:
+            writer.release()
+            _finisher.submit(on_segment, filepath)
+
+
+def start(picam2, settings, segment_seconds, segment_path, on_segment, capture_frame=None, camera=None):
+    """
+    Starts recording back-to-back segments from a single encoder session.
+
+    Args:
+        picam2: Running Picamera2 instance, None for cameras without a
+            hardware encoder
+        settings (dict): Current camera settings (width, height, fps)
+        segment_seconds (int): Target length of each segment
+        segment_path (callable): Returns the .mp4 filepath for a segment
+            starting at the given datetime
+        on_segment (callable): Called with the filepath of each closed segment
+        capture_frame (callable, optional): Frame source used without picam2
+        camera (str, optional): Name of the recording camera, for status()
+    """
+    global _encoder, _output, _debug_thread
+    with _lock:
+        if state['active']:
+            raise RuntimeError('Continuous recording already running')
+        state.update({
+            'active': True,
+            'camera': camera,
+            'segment_seconds': segment_seconds,
+            'started': datetime.now().isoformat(),
+            'segments': 0,
+            'current': None,
+            'error': None,
+        })
+
+    try:
+        if picam2 is None:
+            _stop_event.clear()
+            _debug_thread = threading.Thread(
+                target=_run_debug, name='continuous', daemon=True,
+                args=(segment_seconds, dict(settings), capture_frame, segment_path, on_segment))
+            _debug_thread.start()
+        else:
+            from picamera2.encoders import H264Encoder
+
+            # A keyframe every second bounds how far a segment can overrun
+            _encoder = H264Encoder(iperiod=settings['fps'], repeat=True)
+            _output = _make_segment_output(segment_seconds, settings['fps'], segment_path, on_segment)
+            picam2.start_encoder(_encoder, _output)
+    except Exception:
+        with _lock:
+            state['active'] = False
+        raise
+
+
+def stop(picam2):
+    """Stops recording, the last segment is finished in the background."""
+    global _encoder, _output, _debug_thread
+    with _lock:
+        if not state['active'] and _debug_thread is None and _encoder is None:
+            return False
+        state['active'] = False
+        state['current'] = None
+
+    if _debug_thread is not None:
+        _stop_event.set()
+        _debug_thread.join()
+        _debug_thread = None
+    if _encoder is not None:
+        picam2.stop_encoder(_encoder)
+        _encoder = None
+        _output = None
+    return True
+
+
+def status():
+    with _lock:
+        return dict(state)
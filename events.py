@@ -0,0 +1,53 @@
+import json
+import queue
+import threading
+
+# Seconds between keep-alive comments, stops proxies from closing idle streams
+KEEPALIVE_INTERVAL = 15
+# Events buffered per client before a slow client starts missing events
+MAX_QUEUED_EVENTS = 100
+
+_subscribers = set()
+_lock = threading.Lock()
+
+
+def publish(event, data=None):
+    """
+    Sends an event to every connected client.
+
+    Args:
+        event (str): Event name, e.g. 'media-added'
+        data (dict, optional): JSON serializable payload
+    """
+    message = f"event: {event}\ndata: {json.dumps(data or {})}\n\n"
+    with _lock:
+        subscribers = list(_subscribers)
+    for subscriber in subscribers:
+        try:
+            subscriber.put_nowait(message)
+        except queue.Full:
+            # Client isn't reading, it resyncs when it reconnects
+            pass
+
+
+def subscriber_count():
+    with _lock:
+        return len(_subscribers)
+
+
+def stream():
+    """Yields Server-Sent Events for one client until it disconnects."""
+    subscriber = queue.Queue(maxsize=MAX_QUEUED_EVENTS)
+    with _lock:
+        _subscribers.add(subscriber)
+    try:
+        # Tell the client how long to wait before reconnecting
+        yield 'retry: 3000\n\n'
+        while True:
+            try:
+                yield subscriber.get(timeout=KEEPALIVE_INTERVAL)
+            except queue.Empty:
+                yield ': keepalive\n\n'
+    finally:
+        with _lock:
+            _subscribers.discard(subscriber)
@@ -0,0 +1,313 @@
+import asyncio
+import ipaddress
+import os
+import sys
+import time
+
+import yaml
+
+from configuration import ConfigError, integer, list_of, number, optional, section, string
+
+FLEET_FILE = 'fleet.yml'
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE = os.path.join(BASE_DIR, 'templates', 'fleet.html')
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+
+# Node endpoints polled every poll_interval, keyed by cache entry
+ENDPOINTS = {
+    'health': '/health',
+    'pictures': '/pictures?limit={limit}',
+    'videos': '/videos?limit={limit}',
+    'recorders': '/list_recorders',
+}
+
+# The snapshot wall stops polling this many seconds after its last viewer left
+WALL_IDLE_SECONDS = 30
+
+
+def url(value):
+    value = string(value).rstrip('/')
+    if not value.startswith(('http://', 'https://')):
+        raise ValueError('must start with http:// or https://')
+    return value
+
+
+def network(value):
+    try:
+        return str(ipaddress.ip_network(string(value), strict=False))
+    except ValueError:
+        raise ValueError('must be a network like 192.168.1.0/24')
+
+
+SCHEMA = section({
+    'port': (integer(1, 65535), 8000),
+    'poll_interval': (number(1), 10),
+    'snapshot_interval': (number(0.5), 2),
+    'snapshot_width': (integer(16), 480),
+    'timeout': (number(0.5), 5),
+    'gallery_limit': (integer(1, 500), 24),
+    # Open connections kept per node, requests beyond that wait for one
+    'connections_per_node': (integer(1, 16), 4),
+    'nodes': (optional(list_of(section({
+        'name': (optional(string), None),
+        'url': (url, None),
+    }))), None),
+    # Probes every address of this network for MintCam nodes at startup
+    'discover': (optional(network), None),
+    'discover_port': (integer(1, 65535), 5000),
+})
+
+
+def load(path=FLEET_FILE):
+    """Reads and validates fleet.yml."""
+    try:
+        with open(path, 'r') as file:
+            raw = yaml.safe_load(file)
+    except FileNotFoundError:
+        raw = {}
+    except yaml.YAMLError as e:
+        raise ConfigError([f'{path}: {e}'])
+    fleet_config = SCHEMA(raw)
+    if not fleet_config['nodes'] and not fleet_config['discover']:
+        raise ConfigError(['nodes: list at least one node or set discover'])
+    if fleet_config['discover'] and ipaddress.ip_network(fleet_config['discover']).num_addresses > 1024:
+        raise ConfigError(['discover: must be at most 1024 addresses, e.g. a /22'])
+    return fleet_config
+
+
+class Node:
+    """Cached state of one MintCam node."""
+
+    def __init__(self, name, url):
+        self.name = name
+        self.url = url
+        self.data = {key: None for key in ENDPOINTS}
+        self.errors = {}
+        self.polled = None
+        self.poll_seconds = None
+        self.snapshot = None
+        self.snapshot_time = None
+
+    @property
+    def online(self):
+        return self.data['health'] is not None and 'health' not in self.errors
+
+    def summary(self):
+        return {
+            'name': self.name,
+            'url': self.url,
+            'online': self.online,
+            'health': self.data['health'],
+            'errors': self.errors,
+            'polled': self.polled,
+            'poll_seconds': self.poll_seconds,
+            'snapshot_time': self.snapshot_time,
+        }
+
+
+class Fleet:
+    """
+    Polls every node's /health, /pictures, /videos and /list_recorders
+    concurrently over pooled keep-alive connections and keeps the latest
+    responses, so dashboard viewers are served from the cache and cost the
+    nodes nothing extra.
+    """
+
+    def __init__(self, fleet_config):
+        self.config = fleet_config
+        self.nodes = {}
+        for node_config in fleet_config['nodes'] or []:
+            self.add_node(node_config['url'], node_config['name'])
+        self.session = None
+        self.wall_viewed = 0.0
+        self._poll_now = None
+
+    def add_node(self, node_url, name=None):
+        # Unnamed nodes are listed by host:port
+        name = name or node_url.split('://', 1)[1]
+        if name in self.nodes or any(node.url == node_url for node in self.nodes.values()):
+            return None
+        self.nodes[name] = Node(name, node_url)
+        return self.nodes[name]
+
+    async def start(self):
+        import aiohttp
+
+        # One pool for all polling, connections stay open between polls
+        connector = aiohttp.TCPConnector(limit_per_host=self.config['connections_per_node'],
+                                         keepalive_timeout=max(60, self.config['poll_interval'] * 3))
+        self.session = aiohttp.ClientSession(
+            connector=connector, timeout=aiohttp.ClientTimeout(total=self.config['timeout']))
+        self._poll_now = asyncio.Event()
+        if self.config['discover']:
+            await self.discover()
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+    async def fetch_json(self, node, path):
+        async with self.session.get(node.url + path) as response:
+            response.raise_for_status()
+            return await response.json()
+
+    async def poll_endpoint(self, node, key):
+        path = ENDPOINTS[key].format(limit=self.config['gallery_limit'])
+        try:
+            node.data[key] = await self.fetch_json(node, path)
+            node.errors.pop(key, None)
+        except Exception as e:
+            node.errors[key] = str(e) or e.__class__.__name__
+
+    async def poll_node(self, node):
+        started = time.monotonic()
+        await asyncio.gather(*(self.poll_endpoint(node, key) for key in ENDPOINTS))
+        node.polled = time.time()
+        node.poll_seconds = round(time.monotonic() - started, 3)
+
+    async def poll_all(self):
+        await asyncio.gather(*(self.poll_node(node) for node in list(self.nodes.values())))
+
+    async def poll_loop(self):
+        while True:
+            await self.poll_all()
+            self._poll_now.clear()
+            try:
+                await asyncio.wait_for(self._poll_now.wait(), self.config['poll_interval'])
+            except asyncio.TimeoutError:
+                pass
+
+    def refresh(self):
+        """Polls all nodes now instead of at the next interval."""
+        self._poll_now.set()
+
+    async def fetch_snapshot(self, node):
+        try:
+            async with self.session.get(f"{node.url}/snapshot?width={self.config['snapshot_width']}") as response:
+                response.raise_for_status()
+                node.snapshot = await response.read()
+                node.snapshot_time = time.time()
+                node.errors.pop('snapshot', None)
+        except Exception as e:
+            node.errors['snapshot'] = str(e) or e.__class__.__name__
+
+    async def snapshot_loop(self):
+        while True:
+            # Nodes are only asked for frames while someone looks at the wall
+            if time.monotonic() - self.wall_viewed < WALL_IDLE_SECONDS:
+                await asyncio.gather(*(self.fetch_snapshot(node) for node in list(self.nodes.values())))
+            await asyncio.sleep(self.config['snapshot_interval'])
+
+    async def probe(self, host):
+        import aiohttp
+
+        node_url = f"http://{host}:{self.config['discover_port']}"
+        try:
+            async with self.session.get(node_url + '/health',
+                                        timeout=aiohttp.ClientTimeout(total=1)) as response:
+                data = await response.json()
+        except Exception:
+            return
+        if isinstance(data, dict) and data.get('success') and 'cameras' in data:
+            name = data.get('name')
+            node = self.add_node(node_url, None if name in self.nodes else name)
+            if node is not None:
+                print(f"Fleet: discovered {node.name} at {node_url}")
+
+    async def discover(self):
+        hosts = list(ipaddress.ip_network(self.config['discover']).hosts())
+        print(f"Fleet: probing {len(hosts)} addresses in {self.config['discover']}")
+        await asyncio.gather(*(self.probe(host) for host in hosts))
+
+    def gallery(self, kind, limit):
+        """Returns the newest media of all nodes merged, newest first."""
+        items = []
+        for node in self.nodes.values():
+            for item in (node.data[kind] or {}).get(kind, []):
+                items.append({**item, 'node': node.name,
+                              'url': f"{node.url}/{kind}/{item['filename']}"})
+        items.sort(key=lambda item: item['created'], reverse=True)
+        return items[:limit]
+
+    def recorders(self):
+        return {node.name: (node.data['recorders'] or {}).get('recorders')
+                for node in self.nodes.values()}
+
+
+def create_app(fleet):
+    from aiohttp import web
+
+    routes = web.RouteTableDef()
+
+    @routes.get('/')
+    async def index(request):
+        return web.FileResponse(TEMPLATE)
+
+    @routes.get('/api/nodes')
+    async def nodes(request):
+        return web.json_response({
+            'success': True,
+            'nodes': [node.summary() for node in fleet.nodes.values()]
+        })
+
+    @routes.get('/api/gallery')
+    async def gallery(request):
+        kind = request.query.get('kind', 'pictures')
+        if kind not in ('pictures', 'videos'):
+            return web.json_response({'success': False, 'message': 'kind must be pictures or videos'}, status=400)
+        try:
+            limit = int(request.query.get('limit', fleet.config['gallery_limit']))
+        except ValueError:
+            return web.json_response({'success': False, 'message': 'limit must be a number'}, status=400)
+        return web.json_response({'success': True, kind: fleet.gallery(kind, limit)})
+
+    @routes.get('/api/recorders')
+    async def recorders(request):
+        return web.json_response({'success': True, 'recorders': fleet.recorders()})
+
+    @routes.post('/api/refresh')
+    async def refresh(request):
+        fleet.refresh()
+        return web.json_response({'success': True, 'message': 'Polling all nodes'})
+
+    @routes.get('/snapshot/{name}')
+    async def snapshot(request):
+        fleet.wall_viewed = time.monotonic()
+        node = fleet.nodes.get(request.match_info['name'])
+        if node is None:
+            return web.json_response({'success': False, 'message': 'Unknown node'}, status=404)
+        if node.snapshot is None:
+            # First look at the wall, fetch instead of waiting for the loop
+            await fleet.fetch_snapshot(node)
+        if node.snapshot is None:
+            return web.json_response({'success': False, 'message': node.errors.get('snapshot')}, status=502)
+        return web.Response(body=node.snapshot, content_type='image/jpeg',
+                            headers={'Cache-Control': 'no-store'})
+
+    async def background(app):
+        await fleet.start()
+        tasks = [asyncio.create_task(fleet.poll_loop()), asyncio.create_task(fleet.snapshot_loop())]
+        yield
+        for task in tasks:
+            task.cancel()
+        await fleet.close()
+
+    app = web.Application()
+    app.add_routes(routes)
+    # Shares the node UI's stylesheet
+    app.router.add_static('/static', STATIC_DIR)
+    app.cleanup_ctx.append(background)
+    return app
+
+
+if __name__ == '__main__':
+    # One dashboard for many nodes, e.g. `python3 fleet.py fleet.yml`
+    from aiohttp import web
+
+    try:
+        fleet_config = load(sys.argv[1] if len(sys.argv) > 1 else FLEET_FILE)
+    except ConfigError as e:
+        for error in e.errors:
+            print(f'fleet.yml: {error}', file=sys.stderr)
+        sys.exit(1)
+    web.run_app(create_app(Fleet(fleet_config)), port=fleet_config['port'])
@@ -0,0 +1,256 @@
+import collections
+import os
+import threading
+import time
+from datetime import datetime
+
+THERMAL_ZONE = '/sys/class/thermal/thermal_zone0/temp'
+
+# Live stream limits per level, recordings are never touched. fps and quality
+# cap the configured values, step keeps every step-th pixel per axis
+LEVELS = [
+    {'fps': None, 'quality': None, 'step': 1},
+    {'fps': None, 'quality': 70, 'step': 1},
+    {'fps': 15, 'quality': 70, 'step': 1},
+    {'fps': 10, 'quality': 50, 'step': 1},
+    {'fps': 5, 'quality': 50, 'step': 2},
+]
+
+# Weight of the newest encode sample in the moving average
+ENCODE_SMOOTHING = 0.1
+
+settings = {
+    'enabled': True,
+    'interval': 5,
+    'temperature_high': 75.0,
+    'temperature_low': 68.0,
+    'load_high': 1.5,
+    'load_low': 1.0,
+    'encode_high': 0.8,
+    'encode_low': 0.5,
+    'recover_seconds': 30,
+}
+
+state = {
+    'level': 0,
+    'temperature': None,
+    'load': None,
+    'encode_load': None,
+    'simulated': False,
+    'reason': None,
+    'changed': None,
+}
+
+# Most recent level changes, newest last
+decisions = collections.deque(maxlen=50)
+
+_lock = threading.RLock()
+_thread = None
+_on_change = None
+# Moving average of encode time / frame cycle time, per live stream
+_encode_loads = {}
+# Monotonic time since which conditions have allowed stepping down
+_calm_since = None
+
+
+def read_temperature():
+    """Returns the SoC temperature in °C, or None where there is no sensor."""
+    try:
+        with open(THERMAL_ZONE) as f:
+            return int(f.read().strip()) / 1000
+    except (OSError, ValueError):
+        return None
+
+
+class SimulatedTemperature:
+    """Temperature source returning a fixed value, for testing without a hot Pi."""
+
+    def __init__(self, value):
+        self.value = float(value)
+
+    def __call__(self):
+        return self.value
+
+
+_temperature_source = read_temperature
+
+
+def set_temperature_source(source):
+    """
+    Replaces the temperature sensor, e.g. with SimulatedTemperature(80).
+
+    Args:
+        source (callable): Returns °C or None, None restores the sysfs sensor
+    """
+    global _temperature_source
+    with _lock:
+        _temperature_source = source or read_temperature
+        state['simulated'] = isinstance(_temperature_source, SimulatedTemperature)
+
+
+def simulate_temperature(value):
+    """Pins the temperature to value, None goes back to the real sensor."""
+    set_temperature_source(None if value is None else SimulatedTemperature(value))
+
+
+def read_load():
+    """Returns the 1 minute load average per core."""
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except OSError:
+        return None
+
+
+def report_encode(stream, encode_seconds, cycle_seconds):
+    """
+    Records how long a live stream spent encoding one frame.
+
+    Args:
+        stream (str): Name of the live stream
+        encode_seconds (float): Time spent encoding the frame
+        cycle_seconds (float): Time since the previous frame of this stream
+    """
+    if cycle_seconds <= 0:
+        return
+    sample = min(1.0, encode_seconds / cycle_seconds)
+    with _lock:
+        previous = _encode_loads.get(stream)
+        _encode_loads[stream] = sample if previous is None else \
+            previous + ENCODE_SMOOTHING * (sample - previous)
+
+
+def forget_stream(stream):
+    """Drops the encode samples of a live stream that stopped."""
+    with _lock:
+        _encode_loads.pop(stream, None)
+
+
+def configure(governor_config):
+    """Applies the `governor` section of config.yml."""
+    governor_config = governor_config or {}
+    with _lock:
+        for key in settings:
+            if key in governor_config:
+                settings[key] = governor_config[key]
+        if governor_config.get('simulated_temperature') is not None:
+            simulate_temperature(governor_config['simulated_temperature'])
+        elif state['simulated']:
+            simulate_temperature(None)
+        if not settings['enabled']:
+            _set_level(0, 'governor disabled')
+
+
+def _pressure(temperature, load, encode_load):
+    """Returns why the stream should be degraded further, or None."""
+    if temperature is not None and temperature >= settings['temperature_high']:
+        return f'temperature {temperature:.1f}°C'
+    if load is not None and load >= settings['load_high']:
+        return f'load {load:.2f} per core'
+    if encode_load is not None and encode_load >= settings['encode_high']:
+        return f'encoder busy {encode_load:.0%}'
+    return None
+
+
+def _calm(temperature, load, encode_load):
+    """True once every signal is below its lower threshold."""
+    return (temperature is None or temperature <= settings['temperature_low']) \
+        and (load is None or load <= settings['load_low']) \
+        and (encode_load is None or encode_load <= settings['encode_low'])
+
+
+def _set_level(level, reason):
+    if level == state['level']:
+        return
+    decision = {
+        'time': datetime.now().isoformat(),
+        'from': state['level'],
+        'to': level,
+        'reason': reason,
+        'temperature': state['temperature'],
+        'load': state['load'],
+        'encode_load': state['encode_load'],
+    }
+    state['level'] = level
+    state['reason'] = reason
+    state['changed'] = decision['time']
+    decisions.append(decision)
+    print(f"Governor: live stream level {decision['from']} -> {level} ({reason})")
+    if _on_change is not None:
+        try:
+            _on_change(decision)
+        except Exception as e:
+            print(f"Governor: change callback failed: {e}")
+
+
+def update(now=None):
+    """
+    Samples temperature, load and encode time and moves one level at most.
+
+    Degrades one level per call while any signal is above its upper
+    threshold, and restores one level after all of them have stayed below
+    their lower thresholds for recover_seconds. In between the level holds.
+
+    Returns:
+        int: The current level
+    """
+    global _calm_since
+    now = time.monotonic() if now is None else now
+    with _lock:
+        temperature = _temperature_source()
+        load = read_load()
+        encode_load = max(_encode_loads.values()) if _encode_loads else None
+        state['temperature'] = temperature
+        state['load'] = load
+        state['encode_load'] = encode_load
+        if not settings['enabled']:
+            return state['level']
+
+        reason = _pressure(temperature, load, encode_load)
+        if reason is not None:
+            _calm_since = None
+            if state['level'] < len(LEVELS) - 1:
+                _set_level(state['level'] + 1, reason)
+        elif _calm(temperature, load, encode_load) and state['level'] > 0:
+            if _calm_since is None:
+                _calm_since = now
+            elif now - _calm_since >= settings['recover_seconds']:
+                # Wait the full period again before the next step
+                _calm_since = now
+                _set_level(state['level'] - 1, 'conditions recovered')
+        else:
+            _calm_since = None
+        return state['level']
+
+
+def stream_limits():
+    """Returns the live stream limits of the current level, see LEVELS."""
+    return LEVELS[state['level']]
+
+
+def _run():
+    while True:
+        try:
+            update()
+        except Exception as e:
+            print(f"Governor: error sampling: {e}")
+        time.sleep(settings['interval'])
+
+
+def start(on_change=None):
+    """Starts the background governor thread (once)."""
+    global _thread, _on_change
+    _on_change = on_change
+    if _thread is None:
+        _thread = threading.Thread(target=_run, name='governor', daemon=True)
+        _thread.start()
+
+
+def status():
+    with _lock:
+        return {
+            **state,
+            'limits': dict(stream_limits()),
+            'streams': dict(_encode_loads),
+            'settings': dict(settings),
+            'decisions': list(decisions),
+        }
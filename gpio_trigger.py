@@ -1,15 +1,27 @@
 import RPi.GPIO as GPIO
 import time
 import os
+import json
+import subprocess
+import uuid
 
 def pin_change(channel):
+    # Time of the edge, the start of this recording's trace (see tracing.py)
+    edge = time.time()
     if GPIO.input(channel) == GPIO.HIGH:
         print("Pin UP")
         current_file = os.path.abspath(__file__)
         current_dir = os.path.dirname(current_file)
-        cmd_parts = f'python3 {current_dir}/callback.py video 60'
+        cmd_parts = ['python3', f'{current_dir}/callback.py', 'video', '60']
 
-        os.system(cmd_parts)
+        trace_id = uuid.uuid4().hex[:16]
+        print(f"Trace {trace_id}")
+        subprocess.run(cmd_parts, env={
+            **os.environ,
+            'MINTCAM_TRACE_ID': trace_id,
+            'MINTCAM_TRACE_SOURCE': 'gpio',
+            'MINTCAM_TRACE_STAGES': json.dumps({'edge': edge}),
+        })
     else:
         print("Pin DOWN")
 
@@ -0,0 +1,131 @@
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    # Ships with picamera2 and releases the GIL while encoding
+    import simplejpeg
+except ImportError:
+    simplejpeg = None
+
+# One worker per core, encoding releases the GIL so they run in parallel
+WORKERS = os.cpu_count() or 4
+# Frames allowed to wait for a worker before submit() blocks
+QUEUE_SIZE = WORKERS * 2
+
+_executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='jpeg')
+_slots = threading.BoundedSemaphore(WORKERS + QUEUE_SIZE)
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+class QueueFull(Exception):
+    pass
+
+
+def encode_jpeg(frame, quality=95, colorspace='BGR'):
+    """
+    Encodes an HxWx3 uint8 array to JPEG bytes.
+
+    Args:
+        frame (numpy.ndarray): Image data
+        quality (int): JPEG quality (1-100)
+        colorspace (str): Channel order of frame, 'BGR' or 'RGB'
+
+    Returns:
+        bytes: The encoded image
+    """
+    if simplejpeg is not None:
+        if frame.strides[1:] != (3, 1):
+            frame = frame.copy()
+        # Reads the array in place, including padded rows of camera buffers
+        return simplejpeg.encode_jpeg(frame, quality=quality, colorspace=colorspace)
+
+    # Only needed without simplejpeg, not loaded at startup
+    from PIL import Image
+
+    if not frame.flags['C_CONTIGUOUS']:
+        frame = frame.copy()
+    # The raw decoder reorders BGR while reading, without an intermediate RGB copy
+    height, width = frame.shape[:2]
+    image = Image.frombuffer('RGB', (width, height), frame, 'raw', colorspace, 0, 1)
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def write_jpeg(frame, filepath, quality=95, colorspace='BGR'):
+    """
+    Encodes frame and writes it to filepath.
+
+    The data goes to a temporary file that is renamed into place once it is
+    on disk, so listings never pick up half-written pictures.
+    """
+    data = encode_jpeg(frame, quality, colorspace)
+    temp_filepath = filepath + '.part'
+    with open(temp_filepath, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_filepath, filepath)
+    return filepath
+
+
+def _run(frame, filepath, quality, colorspace, on_done):
+    global _pending
+    error = None
+    try:
+        write_jpeg(frame, filepath, quality, colorspace)
+    except Exception as e:
+        error = e
+        print(f"Error saving {filepath}: {e}")
+    finally:
+        with _pending_lock:
+            _pending -= 1
+        _slots.release()
+        if on_done is not None:
+            try:
+                on_done(filepath, error)
+            except Exception as callback_error:
+                print(f"Error in JPEG callback for {filepath}: {callback_error}")
+
+
+def submit(frame, filepath, quality=95, colorspace='BGR', timeout=5.0, on_done=None):
+    """
+    Queues frame to be encoded and written by the worker pool.
+
+    Blocks while the pool is full, applying back-pressure to the caller.
+
+    Args:
+        frame (numpy.ndarray): Image data, must not be modified afterwards
+        filepath (str): Destination of the JPEG file
+        quality (int): JPEG quality (1-100)
+        colorspace (str): Channel order of frame, 'BGR' or 'RGB'
+        timeout (float): Seconds to wait for a free slot, None waits forever
+        on_done (callable, optional): Called as on_done(filepath, error) when
+            the file has been written or writing failed
+
+    Returns:
+        concurrent.futures.Future: Completes when the file is written
+
+    Raises:
+        QueueFull: If no slot became free within timeout
+    """
+    global _pending
+    if not _slots.acquire(timeout=timeout):
+        raise QueueFull(f'JPEG writer queue is full ({pending()} frames pending)')
+    with _pending_lock:
+        _pending += 1
+    try:
+        return _executor.submit(_run, frame, filepath, quality, colorspace, on_done)
+    except Exception:
+        with _pending_lock:
+            _pending -= 1
+        _slots.release()
+        raise
+
+
+def pending():
+    """Returns the number of frames queued or being written."""
+    return _pending
@@ -0,0 +1,104 @@
+import threading
+import time
+
+import governor
+import jpeg_writer
+
+# Seconds a viewer waits for the next frame before the stream is dropped
+FRAME_TIMEOUT = 10.0
+
+
+class LiveStream:
+    """
+    Encodes one camera's frames to JPEG on its own thread and shares each
+    JPEG with every viewer of that camera.
+
+    Each frame is encoded once however many viewers there are, and cameras
+    encode in parallel since JPEG encoding releases the GIL. The thread only
+    runs while someone is watching.
+    """
+
+    def __init__(self, name, frame_view, quality):
+        """
+        Args:
+            name (str): Camera name, used for the thread name
+            frame_view (callable): Returns a context manager yielding the
+                next BGR frame, see CameraBackend.frame_view()
+            quality (callable): Returns the current JPEG quality
+        """
+        self.name = name
+        self.frame_view = frame_view
+        self.quality = quality
+        self._condition = threading.Condition()
+        self._jpeg = None
+        self._sequence = 0
+        self._viewers = 0
+        self._thread = None
+
+    def _run(self):
+        last_frame = time.monotonic()
+        while True:
+            with self._condition:
+                if self._viewers == 0:
+                    self._thread = None
+                    governor.forget_stream(self.name)
+                    return
+            # The governor lowers quality, size and rate when the Pi runs hot
+            limits = governor.stream_limits()
+            quality = self.quality()
+            if limits['quality'] is not None:
+                quality = min(quality, limits['quality'])
+            try:
+                # Encoded straight from the camera's buffer, the JPEG is the
+                # only allocation per frame
+                with self.frame_view() as frame:
+                    encode_started = time.monotonic()
+                    if limits['step'] > 1:
+                        frame = frame[::limits['step'], ::limits['step']]
+                    jpeg = jpeg_writer.encode_jpeg(frame, quality, 'BGR')
+            except Exception as e:
+                print(f"Live stream {self.name}: {e}")
+                time.sleep(1)
+                continue
+            now = time.monotonic()
+            governor.report_encode(self.name, now - encode_started, now - last_frame)
+            with self._condition:
+                self._jpeg = jpeg
+                self._sequence += 1
+                self._condition.notify_all()
+
+            if limits['fps'] is not None:
+                # Frames arriving before the next slot are skipped
+                delay = last_frame + 1.0 / limits['fps'] - now
+                if delay > 0:
+                    time.sleep(delay)
+            last_frame = time.monotonic() if limits['fps'] is not None else now
+
+    def latest(self):
+        """Returns the newest JPEG while someone is watching, else None."""
+        with self._condition:
+            return self._jpeg if self._thread is not None else None
+
+    def viewer_count(self):
+        with self._condition:
+            return self._viewers
+
+    def frames(self):
+        """Yields JPEG frames for one viewer until it disconnects."""
+        with self._condition:
+            self._viewers += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f'stream-{self.name}', daemon=True)
+                self._thread.start()
+            sequence = self._sequence
+        try:
+            while True:
+                with self._condition:
+                    if not self._condition.wait_for(lambda: self._sequence != sequence, timeout=FRAME_TIMEOUT):
+                        return
+                    sequence = self._sequence
+                    jpeg = self._jpeg
+                yield jpeg
+        finally:
+            with self._condition:
+                self._viewers -= 1
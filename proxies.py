@@ -0,0 +1,293 @@
+import os
+import shutil
+import signal
+import subprocess
+import threading
+import time
+
+# Only these are transcoded, .h264 and the debug .txt placeholders are served as is
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov')
+
+settings = {
+    'enabled': True,
+    'width': 640,
+    'crf': 28,
+    'pause_while_recording': True,
+}
+
+# Folders the proxies mirror: source root -> proxy root
+roots = {}
+# Videos waiting for a proxy, oldest first
+queue = []
+state = {
+    'current': None,
+    'paused': False,
+    'done': 0,
+    'skipped': 0,
+    'failed': 0,
+    'error': None,
+}
+
+_lock = threading.RLock()
+_wakeup = threading.Event()
+_resume = threading.Event()
+_resume.set()
+_thread = None
+_process = None
+
+
+def configure(proxy_config):
+    """Applies the `proxies` section of config.yml."""
+    with _lock:
+        for key in settings:
+            if key in (proxy_config or {}):
+                settings[key] = proxy_config[key]
+    _wakeup.set()
+
+
+def register_root(source_root, proxy_root):
+    """Proxies of videos below source_root go to the same place below proxy_root."""
+    with _lock:
+        roots[os.path.abspath(source_root)] = proxy_root
+
+
+def proxy_path(filepath):
+    """
+    Returns where the proxy of filepath lives, or None outside registered
+    roots. Proxies are always MP4, e.g. videos/2025/01/31/video_x.avi has
+    its proxy at proxies/2025/01/31/video_x.mp4.
+    """
+    path = os.path.abspath(filepath)
+    # Longest root first, camera subfolders are nested in the main media folder
+    for source_root in sorted(roots, key=len, reverse=True):
+        if path.startswith(source_root + os.sep):
+            relative = os.path.splitext(os.path.relpath(path, source_root))[0]
+            return os.path.join(roots[source_root], relative + '.mp4')
+    return None
+
+
+def existing_proxy(filepath):
+    """Returns the path of filepath's finished proxy, or None."""
+    path = proxy_path(filepath)
+    return path if path is not None and os.path.exists(path) else None
+
+
+def enqueue(filepath):
+    """Queues a finished video for transcoding."""
+    if not settings['enabled'] or not filepath.lower().endswith(VIDEO_EXTENSIONS):
+        return
+    with _lock:
+        if filepath not in queue and filepath != state['current']:
+            queue.append(filepath)
+    _wakeup.set()
+
+
+def is_pending(filepath):
+    """True while filepath waits for its proxy or is being transcoded."""
+    with _lock:
+        return filepath == state['current'] or filepath in queue
+
+
+def remove(filepath):
+    """Deletes the proxy of a deleted video."""
+    with _lock:
+        if filepath in queue:
+            queue.remove(filepath)
+    path = proxy_path(filepath)
+    if path is None:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    _remove_empty_parents(path)
+
+
+def _remove_empty_parents(path):
+    directory = os.path.dirname(path)
+    for proxy_root in roots.values():
+        proxy_root = os.path.abspath(proxy_root)
+        while os.path.abspath(directory).startswith(proxy_root + os.sep):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                return
+            directory = os.path.dirname(directory)
+
+
+def scan(source_root):
+    """Queues every video below source_root that has no proxy yet."""
+    import storage
+
+    for entry in storage.iter_files(source_root, VIDEO_EXTENSIONS, newest_first=False):
+        if existing_proxy(entry.path) is None:
+            enqueue(entry.path)
+
+
+def prune(source_root):
+    """Removes proxies whose video below source_root is gone."""
+    proxy_root = roots.get(os.path.abspath(source_root))
+    if proxy_root is None:
+        return
+    with _lock:
+        current = state['current'] and os.path.abspath(proxy_path(state['current']))
+    for directory, _, filenames in os.walk(proxy_root):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            # The running transcode owns its temporary file and the proxy it becomes
+            if filename.endswith('.part.mp4') or os.path.abspath(path) == current:
+                continue
+            source = os.path.splitext(os.path.join(source_root, os.path.relpath(path, proxy_root)))[0]
+            if not any(os.path.exists(source + extension) for extension in VIDEO_EXTENSIONS):
+                os.remove(path)
+                _remove_empty_parents(path)
+
+
+def set_paused(paused):
+    """Holds transcoding, e.g. while the camera is recording."""
+    with _lock:
+        paused = paused and settings['pause_while_recording']
+        if paused == state['paused']:
+            return
+        state['paused'] = paused
+        if paused:
+            _resume.clear()
+        else:
+            _resume.set()
+        # A running ffmpeg is frozen in place instead of restarted later
+        if _process is not None and _process.poll() is None:
+            _process.send_signal(signal.SIGSTOP if paused else signal.SIGCONT)
+
+
+def _frame_size(filepath):
+    import cv2
+
+    capture = cv2.VideoCapture(filepath)
+    try:
+        return int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)), int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    finally:
+        capture.release()
+
+
+def _lower_priority():
+    # Linux nice values apply per thread, ffmpeg children inherit them
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except (AttributeError, OSError):
+        pass
+
+
+def _transcode_ffmpeg(filepath, temp_path, width):
+    global _process
+    command = [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-threads', '1',
+        '-i', filepath, '-an', '-vf', f'scale={width}:-2',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-crf', str(settings['crf']),
+        '-pix_fmt', 'yuv420p', '-movflags', '+faststart', '-f', 'mp4', '-y', temp_path
+    ]
+    with _lock:
+        _process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if state['paused']:
+            _process.send_signal(signal.SIGSTOP)
+    try:
+        _, stderr = _process.communicate()
+        if _process.returncode != 0:
+            raise RuntimeError(stderr.decode(errors='replace').strip() or f'ffmpeg exited with {_process.returncode}')
+    finally:
+        with _lock:
+            _process = None
+
+
+def _transcode_opencv(filepath, temp_path, width, height):
+    import cv2
+
+    capture = cv2.VideoCapture(filepath)
+    fps = capture.get(cv2.CAP_PROP_FPS) or 25
+    size = (width, height - height % 2)
+    writer = cv2.VideoWriter(temp_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    try:
+        while True:
+            _resume.wait()
+            ok, frame = capture.read()
+            if not ok:
+                break
+            writer.write(cv2.resize(frame, size, interpolation=cv2.INTER_AREA))
+    finally:
+        capture.release()
+        writer.release()
+
+
+def transcode(filepath):
+    """
+    Writes the proxy of filepath, scaled down to settings['width'].
+
+    Returns:
+        bool: False if the video is already small enough to stream as is
+    """
+    source_width, source_height = _frame_size(filepath)
+    width = settings['width']
+    if not source_width or source_width <= width:
+        return False
+    height = round(source_height * width / source_width)
+
+    path = proxy_path(filepath)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Keeps the extension, OpenCV picks the container from it
+    temp_path = path[:-len('.mp4')] + '.part.mp4'
+    try:
+        if shutil.which('ffmpeg'):
+            _transcode_ffmpeg(filepath, temp_path, width)
+        else:
+            _transcode_opencv(filepath, temp_path, width, height)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return True
+
+
+def _run():
+    _lower_priority()
+    while True:
+        _resume.wait()
+        _wakeup.clear()
+        with _lock:
+            filepath = queue.pop(0) if queue and settings['enabled'] else None
+            state['current'] = filepath
+        if filepath is None:
+            _wakeup.wait()
+            continue
+
+        if not os.path.exists(filepath) or proxy_path(filepath) is None:
+            continue
+        started = time.monotonic()
+        try:
+            if transcode(filepath):
+                state['done'] += 1
+                print(f"Proxy of {filepath} ready after {time.monotonic() - started:.1f}s")
+            else:
+                state['skipped'] += 1
+        except Exception as e:
+            state['failed'] += 1
+            state['error'] = f'{os.path.basename(filepath)}: {e}'
+            print(f"Proxy of {filepath} failed: {e}")
+        finally:
+            with _lock:
+                state['current'] = None
+
+
+def start():
+    """Starts the single background transcoding thread (once)."""
+    global _thread
+    if _thread is None:
+        _thread = threading.Thread(target=_run, name='proxies', daemon=True)
+        _thread.start()
+
+
+def status():
+    with _lock:
+        return {
+            **state,
+            **settings,
+            'queued': len(queue),
+        }
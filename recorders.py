@@ -0,0 +1,167 @@
+import hashlib
+import os
+import re
+import threading
+import uuid
+
+CALLBACK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'callback.py')
+
+COMMENT_PATTERN = re.compile(r'^recorder\b')
+FIELD_PATTERN = re.compile(r'(\w+)=(\w+)')
+
+_lock = threading.RLock()
+_cron = None
+_recorders = None
+
+
+# TODO fix hour = 0
+def convert_to_cron(hour: int = None, minute: int = None) -> str:
+    """
+    Converts hour and/or minute interval to a cron expression.
+
+    Args:
+        hour (int, optional): Hour interval (e.g. every 2 hours)
+        minute (int, optional): Minute or minute interval (e.g. every 5 minutes or minute of the hour)
+
+    Returns:
+        str: A cron expression
+    """
+
+    # Every X minutes (e.g., every 5 minutes)
+    if (hour is None or hour == 0) and minute is not None:
+        if 1 <= minute <= 59:
+            return f"*/{minute} * * * *"
+        elif minute == 0:
+            return f"0 * * * *"
+        else:
+            raise ValueError("Minute interval must be between 1 and 59.")
+
+    # Every X hours at Y minute
+    elif hour is not None and minute is not None:
+        if not (0 <= minute <= 59):
+            raise ValueError("Minute must be between 0 and 59.")
+        if not (1 <= hour <= 23):
+            raise ValueError("Hour interval must be between 1 and 23.")
+        return f"{minute} */{hour} * * *"
+
+    else:
+        raise ValueError("Invalid input: must specify minute or both hour and minute.")
+
+
+def _open_crontab():
+    # Loaded on first use, the app doesn't need it to start serving
+    from crontab import CronTab
+
+    return CronTab(user=True)
+
+
+def _parse_job(job):
+    """Returns the recorder described by a cron job, or None for other jobs."""
+    comment = job.comment or ''
+    if not COMMENT_PATTERN.match(comment) or 'callback.py' not in job.command:
+        return None
+    fields = dict(FIELD_PATTERN.findall(comment))
+    if 'h' not in fields or 'm' not in fields:
+        return None
+
+    recorder = {
+        # Recorders created before IDs existed get one derived from their comment
+        'id': fields.get('id') or hashlib.sha1(comment.encode()).hexdigest()[:8],
+        'hour': int(fields['h']),
+        'minute': int(fields['m']),
+        'record_type': fields.get('type', 'picture'),
+        'cron_expression': ' '.join(str(job.slices).split()[:5]),
+        'comment': comment,
+    }
+    if fields.get('duration'):
+        recorder['duration'] = int(fields['duration'])
+    return recorder
+
+
+def _load():
+    global _cron, _recorders
+    _cron = _open_crontab()
+    _recorders = []
+    for job in _cron:
+        recorder = _parse_job(job)
+        if recorder is not None:
+            _recorders.append(recorder)
+
+
+def list_recorders(refresh=False):
+    """
+    Returns all scheduled recorders.
+
+    The list is cached, pass refresh=True to pick up changes made outside
+    this process. create() and delete() always re-read the crontab first.
+    """
+    with _lock:
+        if _recorders is None or refresh:
+            _load()
+        return [dict(recorder) for recorder in _recorders]
+
+
+def create(hour, minute, record_type='picture', duration=None):
+    """
+    Schedules a recorder and writes the crontab.
+
+    Raises:
+        ValueError: If hour/minute don't form a valid interval
+    """
+    hour, minute = int(hour), int(minute)
+    cron_expression = convert_to_cron(hour, minute)
+    with _lock:
+        # Writing replaces the whole crontab, start from what is installed now
+        # so jobs added by crontab -e or schedule.py survive
+        _load()
+
+        recorder_id = uuid.uuid4().hex[:8]
+        comment_parts = [f'recorder id={recorder_id} h={hour} m={minute} type={record_type}']
+        cmd_parts = [f'python3 {CALLBACK_PATH}', record_type]
+        if duration and record_type == 'video':
+            comment_parts.append(f'duration={int(duration)}')
+            cmd_parts.append(str(int(duration)))
+
+        job = _cron.new(command=' '.join(cmd_parts), comment=' '.join(comment_parts))
+        job.setall(cron_expression)
+        try:
+            _cron.write()
+        except Exception:
+            _cron.remove(job)
+            raise
+
+        recorder = _parse_job(job)
+        _recorders.append(recorder)
+        return dict(recorder)
+
+
+def delete(recorder_id):
+    """
+    Removes a recorder and writes the crontab.
+
+    Returns:
+        bool: False if no recorder has that ID
+    """
+    with _lock:
+        # Writing replaces the whole crontab, start from what is installed now
+        _load()
+        recorder = next((r for r in _recorders if r['id'] == recorder_id), None)
+        if recorder is None:
+            return False
+        _cron.remove_all(comment=recorder['comment'])
+        try:
+            _cron.write()
+        except Exception:
+            # Start over from what is actually installed
+            _load()
+            raise
+        _recorders.remove(recorder)
+        return True
+
+
+def find(hour, minute):
+    """Returns the ID of the first recorder with this hour and minute, or None."""
+    for recorder in list_recorders():
+        if recorder['hour'] == int(hour) and recorder['minute'] == int(minute):
+            return recorder['id']
+    return None
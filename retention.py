@@ -0,0 +1,377 @@
+import heapq
+import os
+import shutil
+import threading
+import time
+
+import storage
+
+MB = 1024 * 1024
+DAY = 24 * 60 * 60
+
+
+class MediaIndex:
+    """
+    Files of one media folder ordered oldest first, with their total size.
+
+    Built by a single directory scan at startup and then kept up to date by
+    add()/remove() calls, so eviction never has to list the folder again.
+    """
+
+    def __init__(self, path, extensions):
+        self.path = path
+        self.extensions = tuple(extensions)
+        self.files = {}  # filepath -> (mtime, size)
+        self.heap = []  # (mtime, filepath), may contain stale entries
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def scan(self):
+        files = {}
+        for entry in storage.iter_files(self.path, self.extensions):
+            stat = entry.stat()
+            files[entry.path] = (stat.st_mtime, stat.st_size)
+        with self.lock:
+            self.files = files
+            self.heap = [(mtime, filepath) for filepath, (mtime, _) in files.items()]
+            heapq.heapify(self.heap)
+            self.total_bytes = sum(size for _, size in files.values())
+
+    def add(self, filepath):
+        if not filepath.lower().endswith(self.extensions):
+            return
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            return
+        with self.lock:
+            previous = self.files.get(filepath)
+            if previous is not None:
+                self.total_bytes -= previous[1]
+            self.files[filepath] = (stat.st_mtime, stat.st_size)
+            self.total_bytes += stat.st_size
+            heapq.heappush(self.heap, (stat.st_mtime, filepath))
+
+    def remove(self, filepath):
+        with self.lock:
+            previous = self.files.pop(filepath, None)
+            if previous is not None:
+                self.total_bytes -= previous[1]
+            if not self.files:
+                self.heap = []
+
+    def oldest(self):
+        """Returns (filepath, mtime, size) of the oldest file, or None."""
+        with self.lock:
+            while self.heap:
+                mtime, filepath = self.heap[0]
+                current = self.files.get(filepath)
+                if current is not None and current[0] == mtime:
+                    return filepath, mtime, current[1]
+                # Removed or re-added since it was pushed
+                heapq.heappop(self.heap)
+            return None
+
+    def newest_mtime(self):
+        with self.lock:
+            if not self.files:
+                return None
+            return max(mtime for mtime, _ in self.files.values())
+
+    def count(self):
+        with self.lock:
+            return len(self.files)
+
+
+# Registered media folders by name
+folders = {}
+
+settings = {
+    'interval': 60,
+    'min_free_bytes': 0,
+}
+
+_lock = threading.RLock()
+_thread = None
+_on_evict = None
+_is_busy = None
+# Space asked for by request_free_space(), path -> bytes, freed by the thread
+_requested = {}
+_requested_lock = threading.Lock()
+_wakeup = threading.Event()
+
+
+def _megabytes(value):
+    return int(value * MB) if value else None
+
+
+def _days(value):
+    return value * DAY if value else None
+
+
+def configure(retention_config):
+    """
+    Applies the `retention` section of config.yml.
+
+    Args:
+        retention_config (dict): e.g. {'interval': 60, 'min_free_mb': 500,
+            'pictures': {'max_mb': 2048, 'max_age_days': 30}, ...}
+    """
+    retention_config = retention_config or {}
+    with _lock:
+        settings['interval'] = max(1, int(retention_config.get('interval', 60)))
+        settings['min_free_bytes'] = _megabytes(retention_config.get('min_free_mb')) or 0
+        for name, folder in folders.items():
+            # Folders of extra cameras (pictures:usb) get the limits of their kind,
+            # so every camera keeps up to max_mb of its own
+            limits = retention_config.get(name) or retention_config.get(name.partition(':')[0]) or {}
+            folder['max_bytes'] = _megabytes(limits.get('max_mb'))
+            folder['max_age'] = _days(limits.get('max_age_days'))
+
+
+def register_folder(name, path, extensions):
+    with _lock:
+        index = MediaIndex(path, extensions)
+        index.scan()
+        folders[name] = {
+            'index': index,
+            'max_bytes': None,
+            'max_age': None,
+            'evicted_count': 0,
+            'evicted_bytes': 0,
+        }
+
+
+def add_file(name, filepath):
+    if name in folders:
+        folders[name]['index'].add(filepath)
+
+
+def remove_file(name, filepath):
+    if name in folders:
+        folders[name]['index'].remove(filepath)
+
+
+def rescan(name):
+    if name in folders:
+        folders[name]['index'].scan()
+
+
+def _existing(path):
+    # Folders are created with their first file, measure their parent until then
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    return path
+
+
+def disk_usage(path='.'):
+    """Returns shutil.disk_usage() of the filesystem path is (or will be) on."""
+    return shutil.disk_usage(_existing(path))
+
+
+def free_bytes(path='.'):
+    return disk_usage(path).free
+
+
+def _filesystems():
+    """Groups folder names by the filesystem their path is on: device -> (path, names)."""
+    filesystems = {}
+    for name, folder in folders.items():
+        path = _existing(folder['index'].path)
+        device = os.stat(path).st_dev
+        filesystems.setdefault(device, (path, []))[1].append(name)
+    return filesystems
+
+
+def _delete(name, filepath, size):
+    """Deletes a file that was already taken out of its folder's index."""
+    folder = folders[name]
+    try:
+        os.remove(filepath)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Retention: error deleting {filepath}: {e}")
+        folder['index'].add(filepath)
+        return False
+    storage.remove_empty_dirs(folder['index'].path, filepath)
+    with _lock:
+        folder['evicted_count'] += 1
+        folder['evicted_bytes'] += size
+    print(f"Retention: deleted {filepath} ({size} bytes)")
+    if _on_evict is not None:
+        try:
+            _on_evict(name, filepath)
+        except Exception as e:
+            print(f"Retention: evict callback failed for {filepath}: {e}")
+    return True
+
+
+def _evict(name, filepath, size):
+    folders[name]['index'].remove(filepath)
+    return _delete(name, filepath, size)
+
+
+def _oldest_overall(names):
+    oldest = None
+    for name in names:
+        candidate = folders[name]['index'].oldest()
+        if candidate and (oldest is None or candidate[1] < oldest[2]):
+            oldest = (name, candidate[0], candidate[1], candidate[2])
+    return oldest
+
+
+def ensure_free_space(needed_bytes=0, path=None):
+    """
+    Deletes the oldest media until every filesystem holding media folders has
+    the configured minimum free, and the one holding path needed_bytes on top.
+
+    Media folders can be on different filesystems, e.g. videos on a USB disk,
+    so each one only evicts files stored on it.
+
+    Returns:
+        bool: True if enough space is available on path's filesystem, or on
+            all of them without path
+    """
+    with _lock:
+        target = os.stat(_existing(path)).st_dev if path is not None else None
+        filesystems = _filesystems()
+        if target is not None and target not in filesystems:
+            # Nothing registered there that could be deleted
+            return free_bytes(path) >= needed_bytes + settings['min_free_bytes']
+
+        enough = True
+        for device, (fs_path, names) in filesystems.items():
+            required = settings['min_free_bytes'] + (needed_bytes if device == target else 0)
+            while free_bytes(fs_path) < required:
+                oldest = _oldest_overall(names)
+                if oldest is None:
+                    break
+                name, filepath, _, size = oldest
+                if not _evict(name, filepath, size):
+                    break
+            else:
+                continue
+            if target is None or device == target:
+                enough = False
+        return enough
+
+
+def enforce():
+    """
+    Applies size and age limits to every folder, oldest files first.
+
+    Files still waiting for an upload or a proxy are kept until the next
+    run. Victims are chosen under the lock and taken out of the index, the
+    deleting happens outside it, so captures asking for space don't wait.
+    """
+    victims = []
+    with _lock:
+        now = time.time()
+        for name, folder in folders.items():
+            index = folder['index']
+            busy = []
+            busy_bytes = 0
+            while True:
+                oldest = index.oldest()
+                if oldest is None:
+                    break
+                filepath, mtime, size = oldest
+                over_size = folder['max_bytes'] is not None \
+                    and index.total_bytes + busy_bytes > folder['max_bytes']
+                over_age = folder['max_age'] is not None and now - mtime > folder['max_age']
+                if not (over_size or over_age):
+                    break
+                index.remove(filepath)
+                if _is_busy is not None and _is_busy(filepath):
+                    busy.append(filepath)
+                    busy_bytes += size
+                else:
+                    victims.append((name, filepath, size))
+            for filepath in busy:
+                index.add(filepath)
+
+    for name, filepath, size in victims:
+        _delete(name, filepath, size)
+    ensure_free_space()
+
+
+def request_free_space(needed_bytes, path):
+    """
+    Like ensure_free_space(), but returns at once and lets the retention
+    thread delete files, for callers that must not block, e.g. the encoder.
+    """
+    with _requested_lock:
+        _requested[path] = max(needed_bytes, _requested.get(path, 0))
+    _wakeup.set()
+
+
+def _run():
+    while True:
+        try:
+            with _requested_lock:
+                requested = dict(_requested)
+                _requested.clear()
+            for path, needed_bytes in requested.items():
+                if not ensure_free_space(needed_bytes, path):
+                    print(f"Retention: could not free {needed_bytes} bytes for {path}")
+            enforce()
+        except Exception as e:
+            print(f"Retention: error enforcing limits: {e}")
+        _wakeup.wait(settings['interval'])
+        _wakeup.clear()
+
+
+def start(on_evict=None, is_busy=None):
+    """
+    Starts the background retention thread (once).
+
+    Args:
+        on_evict (callable, optional): Called as on_evict(name, filepath)
+            after a file was deleted
+        is_busy (callable, optional): is_busy(filepath) is True for files
+            the limits must not delete yet, e.g. queued for upload
+    """
+    global _thread, _on_evict, _is_busy
+    _on_evict = on_evict
+    _is_busy = is_busy
+    if _thread is None:
+        _thread = threading.Thread(target=_run, name='retention', daemon=True)
+        _thread.start()
+
+
+def stats():
+    with _lock:
+        result = {
+            'disks': [],
+            'min_free': settings['min_free_bytes'],
+            'interval': settings['interval'],
+            'folders': {},
+        }
+        # One entry per filesystem holding media folders
+        for fs_path, names in _filesystems().values():
+            disk = shutil.disk_usage(fs_path)
+            result['disks'].append({
+                'path': fs_path,
+                'folders': names,
+                'total': disk.total,
+                'used': disk.used,
+                'free': disk.free,
+            })
+        for name, folder in folders.items():
+            index = folder['index']
+            oldest = index.oldest()
+            newest = index.newest_mtime()
+            result['folders'][name] = {
+                'path': index.path,
+                'count': index.count(),
+                'bytes': index.total_bytes,
+                'oldest': oldest[1] if oldest else None,
+                'newest': newest,
+                'max_bytes': folder['max_bytes'],
+                'max_age': folder['max_age'],
+                'evicted_count': folder['evicted_count'],
+                'evicted_bytes': folder['evicted_bytes'],
+            }
+        return result
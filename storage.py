@@ -0,0 +1,149 @@
+import os
+import re
+from datetime import datetime
+
+# Capture filenames carry their timestamp, e.g. picture_20250131_142501.jpg
+FILENAME_DATE = re.compile(r'_(\d{4})(\d{2})(\d{2})_\d{6}')
+FILENAME_TIMESTAMP = re.compile(r'_(\d{8}_\d{6})')
+
+
+def is_safe_filename(filename):
+    return bool(filename) and '..' not in filename and '/' not in filename and '\\' not in filename
+
+
+def shard_for_filename(filename):
+    """
+    Returns the YYYY/MM/DD shard a capture belongs to, based on the
+    timestamp in its filename, or None if the name carries no date.
+    """
+    match = FILENAME_DATE.search(filename)
+    if not match:
+        return None
+    year, month, day = match.groups()
+    try:
+        datetime(int(year), int(month), int(day))
+    except ValueError:
+        return None
+    return os.path.join(year, month, day)
+
+
+def timestamp_from_filename(filename):
+    """Returns the capture time encoded in filename as a datetime, or None."""
+    match = FILENAME_TIMESTAMP.search(filename)
+    if not match:
+        return None
+    try:
+        return datetime.strptime(match.group(1), '%Y%m%d_%H%M%S')
+    except ValueError:
+        return None
+
+
+def media_dir(root, when=None):
+    """Returns (and creates) the day directory under root for when (default now)."""
+    when = when or datetime.now()
+    directory = os.path.join(root, when.strftime('%Y'), when.strftime('%m'), when.strftime('%d'))
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def media_path(root, filename):
+    """
+    Resolves a capture filename to its location on disk.
+
+    Files are looked up in the shard named by their timestamp first, files
+    without a date in their name live directly in root.
+    """
+    shard = shard_for_filename(filename)
+    if shard is not None:
+        filepath = os.path.join(root, shard, filename)
+        if os.path.exists(filepath):
+            return filepath
+    return os.path.join(root, filename)
+
+
+def _sorted_subdirs(path, digits, reverse):
+    try:
+        names = [entry.name for entry in os.scandir(path)
+                 if entry.is_dir() and len(entry.name) == digits and entry.name.isdigit()]
+    except FileNotFoundError:
+        return []
+    return sorted(names, reverse=reverse)
+
+
+def iter_days(root, newest_first=True):
+    """Yields (date string YYYY-MM-DD, directory) for every day shard under root."""
+    for year in _sorted_subdirs(root, 4, newest_first):
+        year_dir = os.path.join(root, year)
+        for month in _sorted_subdirs(year_dir, 2, newest_first):
+            month_dir = os.path.join(year_dir, month)
+            for day in _sorted_subdirs(month_dir, 2, newest_first):
+                yield f'{year}-{month}-{day}', os.path.join(month_dir, day)
+
+
+def day_dir(root, date):
+    """Returns the directory of a YYYY-MM-DD date, raising ValueError if malformed."""
+    parsed = datetime.strptime(date, '%Y-%m-%d')
+    return os.path.join(root, parsed.strftime('%Y'), parsed.strftime('%m'), parsed.strftime('%d'))
+
+
+def scan_dir(directory, extensions):
+    """Returns os.DirEntry objects of the media files directly inside directory."""
+    try:
+        return [entry for entry in os.scandir(directory)
+                if entry.is_file() and entry.name.lower().endswith(extensions)]
+    except FileNotFoundError:
+        return []
+
+
+def iter_files(root, extensions, newest_first=True):
+    """
+    Yields os.DirEntry objects for all media under root, one day at a time,
+    followed by unsharded files kept directly in root.
+    """
+    for _, directory in iter_days(root, newest_first):
+        yield from scan_dir(directory, extensions)
+    yield from scan_dir(root, extensions)
+
+
+def _remove_empty_parents(root, directory):
+    root = os.path.abspath(root)
+    directory = os.path.abspath(directory)
+    while directory != root and directory.startswith(root + os.sep):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            break
+        directory = os.path.dirname(directory)
+
+
+def remove_empty_dirs(root, filepath):
+    """Removes the day, month and year directories of filepath once they are empty."""
+    _remove_empty_parents(root, os.path.dirname(filepath))
+
+
+def prune_empty_dirs(root):
+    """Removes all empty day, month and year directories under root."""
+    for _, directory in list(iter_days(root)):
+        _remove_empty_parents(root, directory)
+
+
+def migrate(root, extensions):
+    """
+    Moves captures stored directly in root into their date shards.
+
+    Returns:
+        int: Number of files moved
+    """
+    moved = 0
+    for entry in scan_dir(root, extensions):
+        shard = shard_for_filename(entry.name)
+        if shard is None:
+            continue
+        directory = os.path.join(root, shard)
+        os.makedirs(directory, exist_ok=True)
+        target = os.path.join(directory, entry.name)
+        if os.path.exists(target):
+            continue
+        os.rename(entry.path, target)
+        moved += 1
+    return moved
@@ -0,0 +1,34 @@
+import os
+from datetime import datetime
+
+import clip_export
+
+
+def test_concat_list_trims_the_first_and_last_recording():
+    recordings = [
+        ('videos/a.mp4', datetime(2025, 1, 31, 14, 25, 0), 60.0),
+        ('videos/b.mp4', datetime(2025, 1, 31, 14, 26, 0), 60.0),
+    ]
+    script = clip_export.build_concat_list(recordings, datetime(2025, 1, 31, 14, 25, 30),
+                                           datetime(2025, 1, 31, 14, 26, 15))
+    assert script.splitlines() == [
+        'ffconcat version 1.0',
+        f"file '{os.path.abspath('videos/a.mp4')}'",
+        'inpoint 30.000',
+        f"file '{os.path.abspath('videos/b.mp4')}'",
+        'outpoint 15.000',
+    ]
+
+
+def test_concat_list_keeps_whole_recordings_inside_the_range():
+    recordings = [('videos/a.mp4', datetime(2025, 1, 31, 14, 25, 0), 60.0)]
+    script = clip_export.build_concat_list(recordings, datetime(2025, 1, 31, 14, 0),
+                                           datetime(2025, 1, 31, 15, 0))
+    assert 'inpoint' not in script and 'outpoint' not in script
+
+
+def test_concat_list_quotes_paths():
+    recordings = [("videos/it's.mp4", datetime(2025, 1, 31, 14, 25, 0), 60.0)]
+    script = clip_export.build_concat_list(recordings, datetime(2025, 1, 31, 14, 25),
+                                           datetime(2025, 1, 31, 14, 26))
+    assert "it'\\''s.mp4'" in script
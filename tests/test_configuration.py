@@ -0,0 +1,66 @@
+import pytest
+
+import configuration
+
+
+def errors_of(raw):
+    with pytest.raises(configuration.ConfigError) as excinfo:
+        configuration.validate(raw)
+    return excinfo.value.errors
+
+
+def test_empty_config_gets_the_defaults():
+    config = configuration.validate({})
+    assert config['camera']['backend'] == 'synthetic'
+    assert config['server']['threads'] == 16
+    assert [camera['name'] for camera in config['cameras']] == ['main']
+    assert config['retention']['videos'] == {'max_mb': None, 'max_age_days': None}
+
+
+def test_production_defaults_to_the_pi_camera():
+    assert configuration.validate({'debug_mode': False})['camera']['backend'] == 'picamera2'
+
+
+def test_every_error_is_reported():
+    errors = errors_of({'port': 'x', 'retention': {'interval': 0, 'bogus': 1}})
+    assert errors == [
+        'port: must be a whole number',
+        'retention.bogus: unknown setting',
+        'retention.interval: must be at least 1',
+    ]
+
+
+def test_unknown_top_level_keys_are_kept():
+    assert configuration.validate({'custom': 1})['custom'] == 1
+
+
+def test_governor_thresholds_must_be_ordered():
+    assert errors_of({'governor': {'temperature_low': 80}}) == [
+        'governor: every *_low threshold must be below its *_high threshold'
+    ]
+
+
+def test_cameras_inherit_the_camera_section():
+    config = configuration.validate({
+        'camera': {'backend': 'opencv', 'device': 2},
+        'cameras': [{'name': 'main'}, {'name': 'usb', 'device': 1}],
+    })
+    assert [(camera['backend'], camera['device']) for camera in config['cameras']] == [('opencv', 2), ('opencv', 1)]
+
+
+@pytest.mark.parametrize('cameras, error', [
+    ([{'name': 'cam'}, {'name': 'cam'}], 'cameras: names must be unique'),
+    ([{'name': 'main', 'backend': 'file'}], 'cameras.0.file: is required by the file backend'),
+])
+def test_invalid_cameras(cameras, error):
+    assert error in errors_of({'cameras': cameras})
+
+
+def test_camera_names_cannot_look_like_a_year_folder():
+    assert errors_of({'cameras': [{'name': '2025'}]})[0].startswith('cameras.0.name:')
+
+
+def test_changed_sections():
+    old = configuration.validate({})
+    new = configuration.validate({'governor': {'interval': 10}, 'name': 'garden'})
+    assert configuration.changed_sections(old, new) == ['governor', 'name']
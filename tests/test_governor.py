@@ -0,0 +1,75 @@
+import pytest
+
+import governor
+
+
+@pytest.fixture(autouse=True)
+def reset(monkeypatch):
+    monkeypatch.setattr(governor, 'settings', dict(governor.settings, temperature_high=75.0,
+                                                   temperature_low=68.0, recover_seconds=30))
+    monkeypatch.setattr(governor, 'state', dict(governor.state, level=0))
+    monkeypatch.setattr(governor, '_calm_since', None)
+    monkeypatch.setattr(governor, '_encode_loads', {})
+    # The machine running the tests must not add pressure of its own
+    monkeypatch.setattr(governor, 'read_load', lambda: 0.0)
+    yield
+    governor.set_temperature_source(None)
+
+
+def hot(temperature):
+    governor.set_temperature_source(governor.SimulatedTemperature(temperature))
+
+
+def test_degrades_one_level_per_update_while_hot():
+    hot(80)
+    assert [governor.update(now) for now in range(3)] == [1, 2, 3]
+    assert governor.status()['simulated']
+
+
+def test_stops_at_the_last_level():
+    hot(80)
+    for now in range(len(governor.LEVELS) + 3):
+        governor.update(now)
+    assert governor.state['level'] == len(governor.LEVELS) - 1
+    assert governor.stream_limits() == governor.LEVELS[-1]
+
+
+def test_holds_between_the_thresholds():
+    hot(80)
+    governor.update(0)
+    hot(70)
+    assert [governor.update(now) for now in (10, 100, 1000)] == [1, 1, 1]
+
+
+def test_recovers_after_recover_seconds_of_calm():
+    hot(80)
+    governor.update(0)
+    governor.update(1)
+    hot(60)
+    assert governor.update(10) == 2
+    assert governor.update(39) == 2
+    assert governor.update(40) == 1
+    # Every further step waits the full period again
+    assert governor.update(69) == 1
+    assert governor.update(70) == 0
+
+
+def test_pressure_resets_the_calm_period():
+    hot(80)
+    governor.update(0)
+    hot(60)
+    governor.update(10)
+    hot(80)
+    governor.update(20)
+    hot(60)
+    governor.update(30)
+    assert governor.update(59) == 2
+    assert governor.update(60) == 1
+
+
+def test_decisions_record_the_reason():
+    hot(80)
+    governor.update(0)
+    decision = governor.decisions[-1]
+    assert (decision['from'], decision['to']) == (0, 1)
+    assert 'temperature' in decision['reason']
@@ -0,0 +1,25 @@
+import pytest
+
+import recorders
+
+
+@pytest.mark.parametrize('hour, minute, expected', [
+    (None, 5, '*/5 * * * *'),
+    (0, 15, '*/15 * * * *'),
+    (None, 0, '0 * * * *'),
+    (2, 30, '30 */2 * * *'),
+])
+def test_convert_to_cron(hour, minute, expected):
+    assert recorders.convert_to_cron(hour, minute) == expected
+
+
+@pytest.mark.parametrize('hour, minute', [
+    (None, 60),
+    (24, 0),
+    (2, -1),
+    (None, None),
+    (3, None),
+])
+def test_convert_to_cron_rejects_invalid_intervals(hour, minute):
+    with pytest.raises(ValueError):
+        recorders.convert_to_cron(hour, minute)
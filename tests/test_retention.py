@@ -0,0 +1,114 @@
+import os
+
+import pytest
+
+import retention
+
+
+@pytest.fixture(autouse=True)
+def reset(monkeypatch):
+    monkeypatch.setattr(retention, 'folders', {})
+    monkeypatch.setattr(retention, 'settings', {'interval': 60, 'min_free_bytes': 0})
+    monkeypatch.setattr(retention, '_on_evict', None)
+    monkeypatch.setattr(retention, '_is_busy', None)
+
+
+def make_file(root, name, mtime, size=1000):
+    directory = os.path.join(root, '2025', '01', '31')
+    os.makedirs(directory, exist_ok=True)
+    filepath = os.path.join(directory, name)
+    with open(filepath, 'wb') as f:
+        f.write(b'x' * size)
+    os.utime(filepath, (mtime, mtime))
+    return filepath
+
+
+def remaining(root):
+    return sorted(name for _, _, names in os.walk(root) for name in names)
+
+
+def test_index_returns_oldest_first(tmp_path):
+    root = str(tmp_path)
+    paths = [make_file(root, f'video_{i}.mp4', 1000 + i) for i in (2, 0, 1)]
+    index = retention.MediaIndex(root, ('.mp4',))
+    index.scan()
+    assert index.total_bytes == 3000
+    assert index.oldest()[0] == paths[1]
+
+    index.remove(paths[1])
+    assert index.oldest()[0] == paths[2]
+    assert index.total_bytes == 2000
+
+
+def test_index_skips_stale_entries_of_rewritten_files(tmp_path):
+    root = str(tmp_path)
+    first = make_file(root, 'video_0.mp4', 1000)
+    second = make_file(root, 'video_1.mp4', 1001)
+    index = retention.MediaIndex(root, ('.mp4',))
+    index.scan()
+
+    os.utime(first, (2000, 2000))
+    index.add(first)
+    assert index.oldest()[0] == second
+    assert index.count() == 2
+    assert index.total_bytes == 2000
+
+
+def test_index_ignores_other_extensions(tmp_path):
+    index = retention.MediaIndex(str(tmp_path), ('.jpg',))
+    index.add(make_file(str(tmp_path), 'video_0.mp4', 1000))
+    assert index.oldest() is None
+
+
+def test_enforce_deletes_oldest_until_under_quota(tmp_path):
+    root = str(tmp_path)
+    for i in range(5):
+        make_file(root, f'video_{i}.mp4', 1000 + i, size=1024 * 1024)
+    retention.register_folder('videos', root, ('.mp4',))
+    retention.configure({'videos': {'max_mb': 2}})
+
+    retention.enforce()
+
+    assert remaining(root) == ['video_3.mp4', 'video_4.mp4']
+    assert retention.folders['videos']['evicted_count'] == 3
+
+
+def test_enforce_applies_max_age(tmp_path):
+    root = str(tmp_path)
+    now = os.path.getmtime(str(tmp_path))
+    make_file(root, 'picture_old.jpg', now - 3 * retention.DAY)
+    make_file(root, 'picture_new.jpg', now)
+    retention.register_folder('pictures', root, ('.jpg',))
+    retention.configure({'pictures': {'max_age_days': 2}})
+
+    retention.enforce()
+
+    assert remaining(root) == ['picture_new.jpg']
+
+
+def test_enforce_keeps_busy_files_and_their_size(tmp_path):
+    root = str(tmp_path)
+    paths = [make_file(root, f'video_{i}.mp4', 1000 + i, size=1024 * 1024) for i in range(4)]
+    retention.register_folder('videos', root, ('.mp4',))
+    retention.configure({'videos': {'max_mb': 2}})
+    retention._is_busy = lambda filepath: filepath == paths[0]
+
+    retention.enforce()
+
+    # The busy file still counts towards the quota, so one more has to go
+    assert remaining(root) == ['video_0.mp4', 'video_3.mp4']
+    assert retention.folders['videos']['index'].oldest()[0] == paths[0]
+
+
+def test_extra_cameras_fall_back_to_the_limits_of_their_kind(tmp_path):
+    retention.register_folder('videos', str(tmp_path / 'main'), ('.mp4',))
+    retention.register_folder('videos:usb', str(tmp_path / 'usb'), ('.mp4',))
+    retention.configure({'videos': {'max_mb': 10, 'max_age_days': 1}, 'videos:usb': {'max_mb': 5}})
+
+    assert retention.folders['videos']['max_bytes'] == 10 * retention.MB
+    assert retention.folders['videos:usb']['max_bytes'] == 5 * retention.MB
+    assert retention.folders['videos:usb']['max_age'] is None
+
+    retention.configure({'videos': {'max_mb': 10, 'max_age_days': 1}})
+    assert retention.folders['videos:usb']['max_bytes'] == 10 * retention.MB
+    assert retention.folders['videos:usb']['max_age'] == retention.DAY
@@ -0,0 +1,38 @@
+import os
+from datetime import datetime
+
+import storage
+
+
+def test_shard_for_filename():
+    assert storage.shard_for_filename('picture_20250131_142501.jpg') == os.path.join('2025', '01', '31')
+    assert storage.shard_for_filename('burst_20250131_142501_003.jpg') == os.path.join('2025', '01', '31')
+
+
+def test_shard_for_filename_without_a_valid_date():
+    assert storage.shard_for_filename('notes.txt') is None
+    assert storage.shard_for_filename('picture_20250231_142501.jpg') is None
+
+
+def test_timestamp_from_filename():
+    assert storage.timestamp_from_filename('video_20250131_142501.mp4') == datetime(2025, 1, 31, 14, 25, 1)
+    assert storage.timestamp_from_filename('video.mp4') is None
+
+
+def test_media_path_prefers_the_shard(tmp_path):
+    root = str(tmp_path)
+    directory = storage.media_dir(root, datetime(2025, 1, 31))
+    open(os.path.join(directory, 'picture_20250131_142501.jpg'), 'w').close()
+
+    assert storage.media_path(root, 'picture_20250131_142501.jpg') == \
+        os.path.join(root, '2025', '01', '31', 'picture_20250131_142501.jpg')
+    # Files from the old flat layout
+    assert storage.media_path(root, 'picture_20250201_000000.jpg') == \
+        os.path.join(root, 'picture_20250201_000000.jpg')
+
+
+def test_is_safe_filename():
+    assert storage.is_safe_filename('picture_20250131_142501.jpg')
+    assert not storage.is_safe_filename('../config.yml')
+    assert not storage.is_safe_filename('2025/01/31/picture.jpg')
+    assert not storage.is_safe_filename('')
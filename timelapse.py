@@ -0,0 +1,254 @@
+import os
+import shutil
+import subprocess
+import threading
+import time
+from datetime import datetime
+
+import tracing
+
+MIN_INTERVAL = 1
+MAX_INTERVAL = 24 * 3600
+
+state = {
+    'active': False,
+    'camera': None,
+    'interval': None,
+    'fps': None,
+    'started': None,
+    'frames': 0,
+    'current': None,
+    'error': None,
+}
+
+_lock = threading.Lock()
+_thread = None
+_stop_event = threading.Event()
+
+
+def is_active():
+    return state['active']
+
+
+class EncoderSink:
+    """
+    Records the timelapse with the Pi's hardware H.264 encoder.
+
+    The encoder takes the camera's own frames and keeps one every interval
+    seconds (frame_skip_count), so frames never pass through Python. The raw
+    stream is wrapped into an MP4 at the playback frame rate on close, a
+    timelapse cut short by a power loss keeps its playable .h264.
+    """
+
+    # The encoder reads frames from the camera itself
+    needs_frames = False
+
+    def __init__(self, picam2, filepath, interval, camera_fps, fps):
+        from picamera2.encoders import H264Encoder
+        from picamera2.outputs import FileOutput
+
+        self.picam2 = picam2
+        self.filepath = filepath
+        self.fps = fps
+        self.h264_filepath = os.path.splitext(filepath)[0] + '.h264'
+        self.encoder = H264Encoder(iperiod=fps, repeat=True)
+        if not hasattr(self.encoder, 'frame_skip_count'):
+            raise RuntimeError('picamera2 is too old to skip frames in the encoder')
+        self.encoder.frame_skip_count = max(1, round(interval * camera_fps))
+        picam2.start_encoder(self.encoder, FileOutput(self.h264_filepath))
+
+    def write(self, frame):
+        pass
+
+    def close(self):
+        import continuous
+
+        self.picam2.stop_encoder(self.encoder)
+        continuous.remux_to_mp4(self.h264_filepath, self.filepath, self.fps)
+
+
+class FrameSink:
+    """
+    Appends BGR frames to an H.264 MP4 through an ffmpeg rawvideo pipe.
+
+    The MP4 is fragmented, so a timelapse cut short by a power loss is still
+    playable up to the last written fragment. Falls back to OpenCV's MPEG-4
+    writer if ffmpeg is unavailable.
+    """
+
+    needs_frames = True
+
+    def __init__(self, filepath, width, height, fps):
+        self.filepath = filepath
+        self.process = None
+        self.writer = None
+        if shutil.which('ffmpeg'):
+            self.process = subprocess.Popen([
+                'ffmpeg', '-hide_banner', '-loglevel', 'error',
+                '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}',
+                '-r', str(fps), '-i', 'pipe:0',
+                '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '23',
+                '-pix_fmt', 'yuv420p', '-g', str(fps),
+                '-movflags', 'frag_keyframe+empty_moov', '-f', 'mp4', '-y', filepath
+            ], stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        else:
+            import cv2
+
+            print("FFmpeg not found in PATH, writing timelapse with OpenCV")
+            self.writer = cv2.VideoWriter(filepath, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+
+    def write(self, frame):
+        if self.process is not None:
+            self.process.stdin.write(frame.tobytes())
+        else:
+            self.writer.write(frame)
+
+    def close(self):
+        if self.process is not None:
+            self.process.stdin.close()
+            self.process.wait()
+            if self.process.returncode != 0:
+                print(f"Timelapse encoding failed: {self.process.stderr.read().decode(errors='replace')}")
+            self.process.stderr.close()
+        else:
+            self.writer.release()
+
+
+def lock_exposure(picam2):
+    """Freezes the exposure and white balance the camera has settled on."""
+    metadata = picam2.capture_metadata()
+    controls = {'AeEnable': False, 'AwbEnable': False}
+    for name in ('ExposureTime', 'AnalogueGain', 'ColourGains'):
+        if name in metadata:
+            controls[name] = metadata[name]
+    picam2.set_controls(controls)
+
+
+def unlock_exposure(picam2):
+    picam2.set_controls({'AeEnable': True, 'AwbEnable': True})
+
+
+def open_sink(picam2, settings, interval, fps, filepath):
+    """Returns the hardware encoder sink where there is one, else FrameSink."""
+    if picam2 is not None:
+        try:
+            return EncoderSink(picam2, filepath, interval, settings['fps'], fps)
+        except Exception as e:
+            print(f"Hardware encoder unavailable for the timelapse, encoding in software: {e}")
+    return FrameSink(filepath, settings['width'], settings['height'], fps)
+
+
+def _run(picam2, settings, interval, fps, capture_frame, filepath, on_finished, on_frame, exposure_locked):
+    sink = None
+    next_frame = time.monotonic()
+    try:
+        if exposure_locked:
+            lock_exposure(picam2)
+        sink = open_sink(picam2, settings, interval, fps, filepath)
+        while not _stop_event.is_set():
+            now = datetime.now()
+            if sink.needs_frames or on_frame is not None:
+                # Frames come every few seconds, they would rotate the capture
+                # traces out of the log, so they are only kept in memory
+                trace = tracing.Trace('timelapse', 'frame', persist=False)
+                trace.fields['camera'] = state['camera']
+                trace.mark('scheduled', time.time() - (time.monotonic() - next_frame))
+                frame = capture_frame(f'TIMELAPSE {now.strftime("%Y-%m-%d %H:%M:%S")}')
+                trace.mark('captured')
+                sink.write(frame)
+                trace.mark('encoded')
+                if on_frame is not None:
+                    on_frame(frame, now)
+                trace.release()
+            with _lock:
+                state['frames'] += 1
+
+            # Keep to the schedule even if a capture was slow, skipping missed slots
+            next_frame += interval
+            while next_frame <= time.monotonic():
+                next_frame += interval
+            _stop_event.wait(next_frame - time.monotonic())
+    except Exception as e:
+        print(f"Timelapse failed: {e}")
+        with _lock:
+            state['error'] = str(e)
+            state['active'] = False
+    finally:
+        if exposure_locked:
+            try:
+                unlock_exposure(picam2)
+            except Exception as e:
+                print(f"Error restoring auto exposure: {e}")
+        if sink is not None:
+            sink.close()
+            if state['frames']:
+                on_finished(filepath)
+            elif os.path.exists(filepath):
+                os.remove(filepath)
+
+
+def start(picam2, settings, interval, fps, capture_frame, filepath, on_finished,
+          on_frame=None, exposure_locked=True, camera=None):
+    """
+    Starts grabbing a frame every interval seconds into one timelapse video.
+
+    The camera keeps running in its video configuration between frames, so
+    there is no sensor restart or AE/AWB settling per frame. With picam2 the
+    video is encoded in hardware, otherwise with libx264 or OpenCV.
+
+    Args:
+        picam2: Running Picamera2 instance, None for other camera backends
+        settings (dict): Current camera settings (width, height, fps)
+        interval (float): Seconds between frames
+        fps (int): Playback frame rate of the timelapse video
+        capture_frame (callable): Returns the current frame as a BGR array
+        filepath (str): Path of the .mp4 to write
+        on_finished (callable): Called with filepath once the video is closed
+        on_frame (callable, optional): Called with (frame, datetime) for every
+            frame, e.g. to also save it as a picture
+        exposure_locked (bool): Freeze exposure and white balance at start so
+            frames don't flicker
+        camera (str, optional): Name of the camera, for status()
+    """
+    global _thread
+    with _lock:
+        if state['active']:
+            raise RuntimeError('Timelapse already running')
+        state.update({
+            'active': True,
+            'camera': camera,
+            'interval': interval,
+            'fps': fps,
+            'started': datetime.now().isoformat(),
+            'frames': 0,
+            'current': filepath,
+            'error': None,
+        })
+
+    _stop_event.clear()
+    _thread = threading.Thread(
+        target=_run, name='timelapse', daemon=True,
+        args=(picam2, dict(settings), interval, fps, capture_frame, filepath,
+              on_finished, on_frame, exposure_locked and picam2 is not None))
+    _thread.start()
+
+
+def stop():
+    """Stops the timelapse and closes its video."""
+    global _thread
+    with _lock:
+        if not state['active'] and _thread is None:
+            return False
+        state['active'] = False
+        state['current'] = None
+
+    if _thread is not None:
+        _stop_event.set()
+        _thread.join()
+        _thread = None
+    return True
+
+
+def status():
+    with _lock:
+        return dict(state)
@@ -0,0 +1,300 @@
+import atexit
+import collections
+import json
+import math
+import os
+import threading
+import time
+import uuid
+
+# Headers callers use to hand their trace to the app
+ID_HEADER = 'X-Trace-Id'
+SOURCE_HEADER = 'X-Trace-Source'
+STAGES_HEADER = 'X-Trace-Stages'
+
+# Percentiles reported by stats()
+PERCENTILES = (50, 90, 99)
+# Newest traces kept in memory per source, stats() and read() use these
+# unless the log files are asked for
+RING_SIZE = 1000
+# Callers name their own sources, beyond this the least recent one is dropped
+MAX_SOURCES = 16
+
+settings = {
+    'enabled': True,
+    'path': 'logs/traces.jsonl',
+    'max_kb': 1024,
+    'backups': 3,
+    'flush_seconds': 5,
+    'flush_count': 50,
+}
+
+# Finished traces waiting to be written, the newest ones per source and
+# overall for status()
+_buffer = []
+_rings = {}
+_recent = collections.deque(maxlen=20)
+_lock = threading.Lock()
+# Serializes writing and rotating the log
+_write_lock = threading.Lock()
+_flush_now = threading.Event()
+_thread = None
+
+
+def new_id():
+    return uuid.uuid4().hex[:16]
+
+
+def configure(tracing_config):
+    """Applies the `tracing` section of config.yml."""
+    with _lock:
+        for key in settings:
+            if key in (tracing_config or {}):
+                settings[key] = tracing_config[key]
+
+
+class Trace:
+    """
+    Timestamps of one capture or recording, from its trigger to the file on disk.
+
+    Stages are wall clock times, so stages recorded by callback.py or
+    gpio_trigger.py line up with the app's. The trace is recorded once every
+    holder has released it, e.g. the request and the JPEG writer. Traces
+    with persist False are only kept in memory.
+    """
+
+    def __init__(self, source, kind, trace_id=None, stages=None, persist=True):
+        self.id = trace_id or new_id()
+        self.source = source
+        self.kind = kind
+        self.stages = dict(stages or {})
+        self.fields = {'outcome': 'ok'}
+        self.persist = persist
+        self._holders = 1
+        self._lock = threading.Lock()
+
+    def mark(self, stage, when=None):
+        with self._lock:
+            self.stages[stage] = time.time() if when is None else when
+
+    def hold(self):
+        """Keeps the trace open for work that outlives the request."""
+        with self._lock:
+            self._holders += 1
+
+    def release(self):
+        with self._lock:
+            self._holders -= 1
+            if self._holders > 0:
+                return
+        record(self.to_record(), self.persist)
+
+    def to_record(self):
+        with self._lock:
+            stages = sorted(self.stages.items(), key=lambda item: item[1])
+        # Time spent reaching each stage from the one before it
+        durations = {name: round((when - stages[index - 1][1]) * 1000, 1)
+                     for index, (name, when) in enumerate(stages) if index > 0}
+        return {
+            'id': self.id,
+            'source': self.source,
+            'kind': self.kind,
+            **self.fields,
+            'time': stages[0][1] if stages else None,
+            'stages': dict(stages),
+            'durations_ms': durations,
+            'total_ms': round((stages[-1][1] - stages[0][1]) * 1000, 1) if stages else None,
+        }
+
+
+def from_headers(headers, kind, default_source='api'):
+    """
+    Starts a trace for a request, continuing the caller's trace if it sent one.
+
+    X-Trace-Stages is a JSON object of stage name to epoch seconds, malformed
+    values are ignored rather than failing the capture.
+    """
+    stages = {}
+    try:
+        sent = json.loads(headers.get(STAGES_HEADER) or '{}').items()
+    except (ValueError, AttributeError):
+        sent = ()
+    for name, when in sent:
+        try:
+            when = float(when)
+        except (ValueError, TypeError):
+            continue
+        # NaN, infinity or a negative time would end up in every percentile
+        if math.isfinite(when) and when >= 0:
+            stages[str(name)] = when
+    source = (headers.get(SOURCE_HEADER) or default_source)[:32]
+    trace_id = (headers.get(ID_HEADER) or '')[:64] or None
+    return Trace(source, kind, trace_id, stages)
+
+
+def record(trace_record, persist=True):
+    """Keeps a finished trace in memory and queues it for the next batched write."""
+    if not settings['enabled']:
+        return
+    source = trace_record['source']
+    with _lock:
+        if persist:
+            _buffer.append(trace_record)
+        _recent.append(trace_record)
+        ring = _rings.pop(source, None)
+        if ring is None:
+            ring = collections.deque(maxlen=RING_SIZE)
+            if len(_rings) >= MAX_SOURCES:
+                # Sources are kept least recently recorded first
+                del _rings[next(iter(_rings))]
+        _rings[source] = ring
+        ring.append(trace_record)
+        full = len(_buffer) >= settings['flush_count']
+    if full:
+        _flush_now.set()
+
+
+def _rotate(path):
+    # traces.jsonl -> traces.jsonl.1 -> ... -> traces.jsonl.<backups>
+    for index in range(settings['backups'] - 1, 0, -1):
+        if os.path.exists(f'{path}.{index}'):
+            os.replace(f'{path}.{index}', f'{path}.{index + 1}')
+    if settings['backups'] > 0:
+        os.replace(path, f'{path}.1')
+    else:
+        os.remove(path)
+
+
+def flush():
+    """Writes all queued traces in one append, rotating the log when it is full."""
+    path = settings['path']
+    # Held from taking the batch until it is on disk, so read() sees it in one place
+    with _write_lock:
+        with _lock:
+            records = _buffer[:]
+            _buffer.clear()
+        if not records:
+            return
+        lines = ''.join(json.dumps(trace_record) + '\n' for trace_record in records)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if os.path.exists(path) and os.path.getsize(path) + len(lines) > settings['max_kb'] * 1024:
+            _rotate(path)
+        with open(path, 'a') as file:
+            file.write(lines)
+
+
+def _read_files():
+    path = settings['path']
+    records = []
+    with _write_lock:
+        for index in range(settings['backups'], -1, -1):
+            filepath = f'{path}.{index}' if index else path
+            try:
+                with open(filepath) as file:
+                    for line in file:
+                        try:
+                            records.append(json.loads(line))
+                        except ValueError:
+                            # A line cut short by a power loss
+                            pass
+            except FileNotFoundError:
+                continue
+        with _lock:
+            records.extend(_buffer)
+    return records
+
+
+def read(source=None, kind=None, since=None, history=False):
+    """
+    Returns traces oldest first.
+
+    Without history only the last RING_SIZE traces per source are searched,
+    in memory. With history they are read from the log and its backups,
+    together with the traces not written yet.
+    """
+    if history:
+        records = _read_files()
+    else:
+        with _lock:
+            rings = list(_rings.values()) if source is None else [_rings.get(source, ())]
+            records = [trace_record for ring in rings for trace_record in ring]
+        records.sort(key=lambda trace_record: trace_record.get('time') or 0)
+    return [trace_record for trace_record in records
+            if (source is None or trace_record.get('source') == source)
+            and (kind is None or trace_record.get('kind') == kind)
+            and (since is None or (trace_record.get('time') or 0) >= since)]
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return None
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def _summary(values):
+    values = sorted(values)
+    summary = {f'p{p}': percentile(values, p) for p in PERCENTILES}
+    summary['max'] = values[-1] if values else None
+    summary['count'] = len(values)
+    return summary
+
+
+def stats(source=None, kind=None, since=None, history=False):
+    """
+    Latency percentiles per trigger source, in milliseconds, see read().
+
+    Returns:
+        dict: source -> {count, outcomes, total_ms, stages_ms}, stages_ms
+            holds the time to reach each stage from the one before it
+    """
+    by_source = {}
+    for trace_record in read(source, kind, since, history):
+        entry = by_source.setdefault(trace_record['source'], {
+            'count': 0, 'outcomes': collections.Counter(), 'total': [], 'stages': {},
+        })
+        entry['count'] += 1
+        entry['outcomes'][trace_record.get('outcome', 'ok')] += 1
+        if trace_record.get('total_ms') is not None:
+            entry['total'].append(trace_record['total_ms'])
+        for stage, duration in trace_record.get('durations_ms', {}).items():
+            entry['stages'].setdefault(stage, []).append(duration)
+
+    return {
+        name: {
+            'count': entry['count'],
+            'outcomes': dict(entry['outcomes']),
+            'total_ms': _summary(entry['total']),
+            'stages_ms': {stage: _summary(values) for stage, values in entry['stages'].items()},
+        }
+        for name, entry in by_source.items()
+    }
+
+
+def _run():
+    while True:
+        _flush_now.wait(settings['flush_seconds'])
+        _flush_now.clear()
+        try:
+            flush()
+        except Exception as e:
+            print(f"Tracing: error writing {settings['path']}: {e}")
+
+
+def start():
+    """Starts the background thread writing traces in batches (once)."""
+    global _thread
+    if _thread is None:
+        _thread = threading.Thread(target=_run, name='tracing', daemon=True)
+        _thread.start()
+        # Traces still in the buffer are written on a clean shutdown
+        atexit.register(flush)
+
+
+def status():
+    with _lock:
+        return {
+            **settings,
+            'pending': len(_buffer),
+            'recent': list(_recent),
+        }
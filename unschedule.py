@@ -1,15 +1,14 @@
-from crontab import CronTab
 import sys
 
+import recorders
+
 if len(sys.argv) < 2 or not sys.argv[1]:
-    print("Usage: python3 unschedule.py <comment>")
+    print("Usage: python3 unschedule.py <recorder id>")
     exit(1)
-cron = CronTab(user=True)
-
-# Find job by comment
-cron.remove_all(comment=sys.argv[1])
 
-# Save changes
-cron.write()
+# Find recorder by id
+if not recorders.delete(sys.argv[1]):
+    print(f"No recorder with id '{sys.argv[1]}' found.")
+    exit(1)
 
-print(f"Cron job(s) with comment '{sys.argv[1]}' deleted.")
+print(f"Recorder '{sys.argv[1]}' deleted.")
@@ -0,0 +1,454 @@
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+
+MB = 1024 * 1024
+# Size of the slices the rate limiter meters, keeps the stream from bursting
+SLICE_SIZE = 64 * 1024
+# S3 requires every part except the last to be at least 5 MB
+S3_MIN_PART_SIZE = 5 * MB
+# Progress and new jobs are written to the queue file at most this often,
+# finished and failed jobs right away
+SAVE_INTERVAL = 10
+
+
+class RateLimiter:
+    """Token bucket limiting throughput to bytes_per_second (None = unlimited)."""
+
+    def __init__(self, bytes_per_second=None):
+        self.bytes_per_second = bytes_per_second
+        self.allowance = 0.0
+        self.last = time.monotonic()
+
+    def consume(self, count):
+        if not self.bytes_per_second:
+            return
+        now = time.monotonic()
+        # Allow at most one second worth of burst
+        self.allowance = min(self.bytes_per_second,
+                             self.allowance + (now - self.last) * self.bytes_per_second)
+        self.last = now
+        self.allowance -= count
+        if self.allowance < 0:
+            time.sleep(-self.allowance / self.bytes_per_second)
+
+
+def read_chunks(filepath, offset, chunk_size, limiter):
+    """Yields chunks of filepath starting at offset, paced by limiter."""
+    with open(filepath, 'rb') as f:
+        f.seek(offset)
+        while True:
+            chunk = bytearray()
+            while len(chunk) < chunk_size:
+                data = f.read(min(SLICE_SIZE, chunk_size - len(chunk)))
+                if not data:
+                    break
+                limiter.consume(len(data))
+                chunk += data
+            if not chunk:
+                return
+            yield bytes(chunk)
+
+
+class DirectoryTarget:
+    """Copies files below a local directory, e.g. an NFS or SMB mount."""
+
+    def __init__(self, upload_config):
+        self.path = upload_config['path']
+
+    def upload(self, job, chunk_size, limiter, progress):
+        destination = os.path.join(self.path, job['key'])
+        temp_destination = destination + '.part'
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+
+        # Resume from whatever already reached the target
+        offset = os.path.getsize(temp_destination) if os.path.exists(temp_destination) else 0
+        if offset > job['size']:
+            offset = 0
+        with open(temp_destination, 'r+b' if offset else 'wb') as f:
+            f.seek(offset)
+            f.truncate()
+            for chunk in read_chunks(job['filepath'], offset, chunk_size, limiter):
+                f.write(chunk)
+                offset += len(chunk)
+                progress(offset)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_destination, destination)
+
+
+class S3Target:
+    """Multipart upload to an S3 compatible endpoint such as MinIO."""
+
+    def __init__(self, upload_config):
+        import boto3
+
+        self.bucket = upload_config['bucket']
+        self.prefix = upload_config.get('prefix', '')
+        self.client = boto3.client(
+            's3',
+            endpoint_url=upload_config.get('endpoint_url'),
+            aws_access_key_id=upload_config.get('access_key'),
+            aws_secret_access_key=upload_config.get('secret_key'),
+            region_name=upload_config.get('region'),
+        )
+
+    def upload(self, job, chunk_size, limiter, progress):
+        key = self.prefix + job['key']
+        chunk_size = max(chunk_size, S3_MIN_PART_SIZE)
+
+        parts = []
+        if job.get('upload_id'):
+            # Resume: ask the server which parts it already has
+            try:
+                response = self.client.list_parts(Bucket=self.bucket, Key=key, UploadId=job['upload_id'])
+                parts = [{'PartNumber': part['PartNumber'], 'ETag': part['ETag'], 'Size': part['Size']}
+                         for part in response.get('Parts', [])]
+            except self.client.exceptions.NoSuchUpload:
+                job['upload_id'] = None
+        if not job.get('upload_id'):
+            response = self.client.create_multipart_upload(Bucket=self.bucket, Key=key)
+            job['upload_id'] = response['UploadId']
+            parts = []
+
+        # Only a contiguous run of full size parts can be resumed
+        parts.sort(key=lambda part: part['PartNumber'])
+        completed = []
+        for number, part in enumerate(parts, start=1):
+            if part['PartNumber'] != number or part['Size'] != chunk_size:
+                break
+            completed.append(part)
+        offset = len(completed) * chunk_size
+        progress(offset)
+
+        for chunk in read_chunks(job['filepath'], offset, chunk_size, limiter):
+            number = len(completed) + 1
+            response = self.client.upload_part(Bucket=self.bucket, Key=key, UploadId=job['upload_id'],
+                                               PartNumber=number, Body=chunk)
+            completed.append({'PartNumber': number, 'ETag': response['ETag'], 'Size': len(chunk)})
+            offset += len(chunk)
+            progress(offset)
+
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=key, UploadId=job['upload_id'],
+            MultipartUpload={'Parts': [{'PartNumber': part['PartNumber'], 'ETag': part['ETag']}
+                                       for part in completed]},
+        )
+
+
+class SFTPTarget:
+    """Appends files to a remote directory over SFTP."""
+
+    def __init__(self, upload_config):
+        import paramiko
+
+        self.path = upload_config.get('path', '.')
+        self.transport = paramiko.Transport((upload_config['host'], int(upload_config.get('port', 22))))
+        key = None
+        if upload_config.get('key_file'):
+            key = paramiko.RSAKey.from_private_key_file(upload_config['key_file'])
+        self.transport.connect(username=upload_config.get('username'),
+                               password=upload_config.get('password'), pkey=key)
+        self.sftp = paramiko.SFTPClient.from_transport(self.transport)
+
+    def _makedirs(self, directory):
+        parts = directory.split('/')
+        for i in range(1, len(parts) + 1):
+            current = '/'.join(parts[:i])
+            if not current:
+                continue
+            try:
+                self.sftp.stat(current)
+            except IOError:
+                self.sftp.mkdir(current)
+
+    def upload(self, job, chunk_size, limiter, progress):
+        destination = f"{self.path.rstrip('/')}/{job['key']}"
+        temp_destination = destination + '.part'
+        self._makedirs(os.path.dirname(destination))
+
+        try:
+            offset = self.sftp.stat(temp_destination).st_size
+        except IOError:
+            offset = 0
+        if offset > job['size']:
+            self.sftp.remove(temp_destination)
+            offset = 0
+
+        with self.sftp.open(temp_destination, 'ab' if offset else 'wb') as f:
+            for chunk in read_chunks(job['filepath'], offset, chunk_size, limiter):
+                f.write(chunk)
+                offset += len(chunk)
+                progress(offset)
+        self.sftp.posix_rename(temp_destination, destination)
+
+
+TARGETS = {
+    'directory': DirectoryTarget,
+    's3': S3Target,
+    'sftp': SFTPTarget,
+}
+
+settings = {
+    'enabled': False,
+    'target': 'directory',
+    'bandwidth_kbps': None,
+    'chunk_size': 4 * MB,
+    'queue_file': 'uploads.json',
+    'delete_after_upload': False,
+    'retry_delay': 30,
+}
+
+# Pending and failed jobs by id, persisted to settings['queue_file']
+jobs = {}
+# Local path -> job id, for the duplicate check in enqueue()
+_paths = {}
+counters = {'uploaded': 0, 'uploaded_bytes': 0, 'failed_attempts': 0}
+
+_lock = threading.RLock()
+_wakeup = threading.Event()
+_thread = None
+_target = None
+_upload_config = {}
+_on_uploaded = None
+_loaded = False
+# Changes not written to the queue file yet
+_dirty = False
+_last_save = 0
+
+
+def _save():
+    global _dirty, _last_save
+    _dirty = False
+    _last_save = time.monotonic()
+    temp_path = settings['queue_file'] + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(list(jobs.values()), f)
+    os.replace(temp_path, settings['queue_file'])
+
+
+def _save_soon():
+    """Saves the queue unless it was saved less than SAVE_INTERVAL ago."""
+    global _dirty
+    _dirty = True
+    if time.monotonic() - _last_save >= SAVE_INTERVAL:
+        _save()
+
+
+def _flush():
+    with _lock:
+        if _dirty:
+            _save()
+
+
+def _remove_job(job):
+    jobs.pop(job['id'], None)
+    _paths.pop(job['filepath'], None)
+
+
+def _load():
+    jobs.clear()
+    _paths.clear()
+    try:
+        with open(settings['queue_file'], 'r') as f:
+            for job in json.load(f):
+                jobs[job['id']] = job
+                _paths[job['filepath']] = job['id']
+    except FileNotFoundError:
+        pass
+    except (ValueError, KeyError) as e:
+        print(f"Upload queue file is corrupt, starting empty: {e}")
+
+
+def configure(upload_config):
+    """
+    Applies the `upload` section of config.yml. The persisted queue is loaded
+    on the first call only, a reload keeps the jobs in memory and moves them
+    to a new queue_file.
+    """
+    global _target, _upload_config, _loaded
+    upload_config = upload_config or {}
+    with _lock:
+        old_queue_file = settings['queue_file']
+        _upload_config = upload_config
+        settings['enabled'] = bool(upload_config.get('enabled', False))
+        settings['target'] = upload_config.get('target', 'directory')
+        kbps = upload_config.get('bandwidth_kbps')
+        settings['bandwidth_kbps'] = kbps
+        settings['chunk_size'] = int(float(upload_config.get('chunk_mb', 4)) * MB)
+        settings['queue_file'] = upload_config.get('queue_file', 'uploads.json')
+        settings['delete_after_upload'] = bool(upload_config.get('delete_after_upload', False))
+        settings['retry_delay'] = int(upload_config.get('retry_delay', 30))
+        if settings['target'] not in TARGETS:
+            raise ValueError(f"Unknown upload target: {settings['target']}")
+        # Targets connect lazily from the worker thread
+        _target = None
+        if not _loaded:
+            _load()
+            _loaded = True
+        elif settings['queue_file'] != old_queue_file:
+            _save()
+    _wakeup.set()
+
+
+def enqueue(kind, filepath, root):
+    """
+    Adds a finished file to the upload queue.
+
+    Args:
+        kind (str): 'pictures' or 'videos'
+        filepath (str): Local path of the file
+        root (str): Media folder filepath lives in, the remote key keeps
+            the layout below it
+    """
+    if not settings['enabled']:
+        return
+    with _lock:
+        if filepath in _paths:
+            return
+        job_id = uuid.uuid4().hex
+        jobs[job_id] = {
+            'id': job_id,
+            'kind': kind,
+            'filepath': filepath,
+            'key': f"{kind}/{os.path.relpath(filepath, root)}".replace(os.sep, '/'),
+            'size': os.path.getsize(filepath),
+            'offset': 0,
+            'attempts': 0,
+            'next_attempt': 0,
+            'error': None,
+            'queued': time.time(),
+        }
+        _paths[filepath] = job_id
+        _save_soon()
+    _wakeup.set()
+
+
+def is_pending(filepath):
+    """True while filepath is queued or being uploaded."""
+    return filepath in _paths
+
+
+def _next_job():
+    now = time.time()
+    with _lock:
+        ready = [job for job in jobs.values() if job['next_attempt'] <= now]
+        if not ready:
+            return None
+        return min(ready, key=lambda job: job['queued'])
+
+
+def _upload(job):
+    global _target
+    if _target is None:
+        _target = TARGETS[settings['target']](_upload_config)
+
+    kbps = settings['bandwidth_kbps']
+    limiter = RateLimiter(kbps * 1024 / 8 if kbps else None)
+
+    def progress(offset):
+        with _lock:
+            job['offset'] = offset
+            _save_soon()
+
+    _target.upload(job, settings['chunk_size'], limiter, progress)
+
+
+def _run():
+    global _target
+    while True:
+        _wakeup.clear()
+        job = _next_job() if settings['enabled'] else None
+        if job is None:
+            _flush()
+            _wakeup.wait(timeout=settings['retry_delay'])
+            continue
+
+        if not os.path.exists(job['filepath']):
+            # Deleted locally (e.g. by retention) before it was uploaded
+            with _lock:
+                _remove_job(job)
+                _save()
+            continue
+
+        try:
+            _upload(job)
+        except Exception as e:
+            print(f"Upload of {job['filepath']} failed: {e}")
+            with _lock:
+                job['attempts'] += 1
+                job['error'] = str(e)
+                # Back off up to an hour between attempts
+                job['next_attempt'] = time.time() + min(3600, settings['retry_delay'] * 2 ** min(job['attempts'], 7))
+                counters['failed_attempts'] += 1
+                _save()
+            # Reconnect on the next attempt
+            _target = None
+            continue
+
+        with _lock:
+            _remove_job(job)
+            counters['uploaded'] += 1
+            counters['uploaded_bytes'] += job['size']
+            _save()
+
+        if settings['delete_after_upload']:
+            try:
+                os.remove(job['filepath'])
+            except OSError as e:
+                print(f"Could not delete uploaded file {job['filepath']}: {e}")
+            else:
+                if _on_uploaded is not None:
+                    _on_uploaded(job['kind'], job['filepath'])
+
+
+def start(on_deleted=None):
+    """
+    Starts the background upload thread (once).
+
+    Args:
+        on_deleted (callable, optional): Called as on_deleted(kind, filepath)
+            when delete_after_upload removed a local file
+    """
+    global _thread, _on_uploaded
+    _on_uploaded = on_deleted
+    if _thread is None:
+        _thread = threading.Thread(target=_run, name='uploader', daemon=True)
+        _thread.start()
+        # Progress of the running upload is written on a clean shutdown
+        atexit.register(_flush)
+
+
+def retry_all():
+    """Makes every failed job eligible for an immediate retry."""
+    with _lock:
+        for job in jobs.values():
+            job['next_attempt'] = 0
+        _save()
+    _wakeup.set()
+
+
+def status():
+    with _lock:
+        pending = sorted(jobs.values(), key=lambda job: job['queued'])
+        return {
+            'enabled': settings['enabled'],
+            'target': settings['target'],
+            'bandwidth_kbps': settings['bandwidth_kbps'],
+            'pending_count': len(pending),
+            'pending_bytes': sum(job['size'] - job['offset'] for job in pending),
+            'uploaded': counters['uploaded'],
+            'uploaded_bytes': counters['uploaded_bytes'],
+            'failed_attempts': counters['failed_attempts'],
+            'jobs': [{
+                'filepath': job['filepath'],
+                'key': job['key'],
+                'size': job['size'],
+                'offset': job['offset'],
+                'attempts': job['attempts'],
+                'error': job['error'],
+            } for job in pending[:50]],
+        }